@@ -0,0 +1,29 @@
+"""add composite (site_id, library_id, createdon, id) index on library_master_data
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The library tables are created by `create_all` on app start-up (which also
+    # builds this index from the model), so tolerate both a missing table and
+    # an existing index.
+    if not sa.inspect(op.get_bind()).has_table('library_master_data'):
+        return
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_library_master_data_site_library_createdon_id "
+        "ON library_master_data (site_id, library_id, createdon, id)"
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_library_master_data_site_library_createdon_id")
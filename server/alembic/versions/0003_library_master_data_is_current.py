@@ -0,0 +1,34 @@
+"""add is_current flag and partial index for latest ledger revisions
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table('library_master_data'):
+        return
+    op.execute("ALTER TABLE library_master_data ADD COLUMN IF NOT EXISTS is_current boolean NOT NULL DEFAULT true")
+    # Any row that some other row names as its parent has been superseded
+    op.execute(
+        "UPDATE library_master_data AS p SET is_current = false "
+        "WHERE EXISTS (SELECT 1 FROM library_master_data AS c WHERE c.parent_id = p.id AND c.id <> p.id)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_library_master_data_current_site_library_createdon_id "
+        "ON library_master_data (site_id, library_id, createdon, id) "
+        "WHERE is_current AND status = 'active'"
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_library_master_data_current_site_library_createdon_id")
+    op.execute("ALTER TABLE library_master_data DROP COLUMN IF EXISTS is_current")
@@ -0,0 +1,69 @@
+"""move form-schema info blobs into a content-addressed form_schemas table
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:00.000000
+"""
+import hashlib
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+TABLES = ['library', 'library_master_data']
+
+
+def _hash(schema):
+    # Must match sql_app.library.crud.form_schema_hash
+    canonical = json.dumps(schema, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if not inspector.has_table('form_schemas'):
+        op.create_table(
+            'form_schemas',
+            sa.Column('hash', sa.String(64), primary_key=True),
+            sa.Column('schema', sa.JSON(), nullable=False),
+            sa.Column('createdon', sa.DateTime(), server_default=sa.text('now()')),
+        )
+    for table in TABLES:
+        if not inspector.has_table(table):
+            continue
+        op.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS info_hash varchar(64) REFERENCES form_schemas (hash)")
+        op.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_info_hash ON {table} (info_hash)")
+        # One pass per distinct schema (jsonb equality ignores key order and whitespace), not per row
+        distinct = bind.execute(sa.text(
+            f"SELECT DISTINCT info::jsonb FROM {table} WHERE info IS NOT NULL AND info::jsonb ? 'formElements'"
+        )).scalars().all()
+        for schema in distinct:
+            hash = _hash(schema)
+            bind.execute(
+                sa.text("INSERT INTO form_schemas (hash, schema) VALUES (:hash, CAST(:schema AS json)) ON CONFLICT DO NOTHING"),
+                {"hash": hash, "schema": json.dumps(schema)},
+            )
+            bind.execute(
+                sa.text(f"UPDATE {table} SET info_hash = :hash, info = NULL WHERE info IS NOT NULL AND info::jsonb = CAST(:schema AS jsonb)"),
+                {"hash": hash, "schema": json.dumps(schema)},
+            )
+
+
+def downgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    for table in TABLES:
+        if not inspector.has_table(table):
+            continue
+        op.execute(
+            f"UPDATE {table} AS t SET info = s.schema FROM form_schemas AS s WHERE t.info_hash = s.hash AND t.info IS NULL"
+        )
+        op.execute(f"DROP INDEX IF EXISTS ix_{table}_info_hash")
+        op.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS info_hash")
+    op.execute("DROP TABLE IF EXISTS form_schemas")
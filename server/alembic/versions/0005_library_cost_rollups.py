@@ -0,0 +1,46 @@
+"""add library_cost_rollups (site x library x vendor x month ledger totals)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table('library_master_data'):
+        return
+    op.execute(
+        "CREATE TABLE IF NOT EXISTS library_cost_rollups ("
+        "site_id integer NOT NULL, "
+        "library_id integer NOT NULL, "
+        "vendor_id integer NOT NULL, "
+        "month date NOT NULL, "
+        "entries integer NOT NULL, "
+        "quantity numeric NOT NULL, "
+        "amount numeric NOT NULL, "
+        "updatedon timestamp without time zone DEFAULT now(), "
+        "PRIMARY KEY (site_id, library_id, vendor_id, month))"
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS ix_library_cost_rollups_month ON library_cost_rollups (month)")
+    # Same totals as crud.rollup_totals_select; later writes keep them current
+    op.execute(
+        "INSERT INTO library_cost_rollups (site_id, library_id, vendor_id, month, entries, quantity, amount) "
+        "SELECT coalesce(site_id, 0), coalesce(library_id, 0), coalesce(vendor_id, 0), "
+        "date_trunc('month', createdon)::date, count(*), "
+        "sum(coalesce(quantity, 0)::numeric), sum(coalesce(quantity, 0)::numeric * coalesce(price, 0)::numeric) "
+        "FROM library_master_data WHERE is_current AND status = 'active' "
+        "GROUP BY 1, 2, 3, 4 "
+        "ON CONFLICT (site_id, library_id, vendor_id, month) DO UPDATE SET "
+        "entries = excluded.entries, quantity = excluded.quantity, amount = excluded.amount, updatedon = now()"
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS library_cost_rollups")
@@ -0,0 +1,55 @@
+"""add vendor_balance_snapshots and the (site_id, vendor_id, createdon, id) ledger index
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table('library_master_data'):
+        return
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_library_master_data_current_site_vendor_createdon_id "
+        "ON library_master_data (site_id, vendor_id, createdon, id) "
+        "WHERE is_current AND status = 'active'"
+    )
+    op.execute(
+        "CREATE TABLE IF NOT EXISTS vendor_balance_snapshots ("
+        "site_id integer NOT NULL, "
+        "vendor_id integer NOT NULL, "
+        "as_of date NOT NULL, "
+        "entries integer NOT NULL, "
+        "charges numeric NOT NULL, "
+        "credits numeric NOT NULL, "
+        "balance numeric NOT NULL, "
+        "updatedon timestamp without time zone DEFAULT now(), "
+        "PRIMARY KEY (site_id, vendor_id, as_of))"
+    )
+    # Same rows as crud.balance_snapshots_select; afterwards kept current by ledger writes and the nightly task
+    op.execute(
+        "INSERT INTO vendor_balance_snapshots (site_id, vendor_id, as_of, entries, charges, credits, balance) "
+        "SELECT site_id, vendor_id, as_of, entries, charges, credits, charges - credits FROM ("
+        "SELECT r.site_id, r.vendor_id, (r.month + interval '1 month')::date AS as_of, "
+        "sum(sum(r.entries)) OVER w AS entries, "
+        "sum(sum(CASE WHEN l.type = 'credit' THEN 0 ELSE r.amount END)) OVER w AS charges, "
+        "sum(sum(CASE WHEN l.type = 'credit' THEN r.amount ELSE 0 END)) OVER w AS credits "
+        "FROM library_cost_rollups r LEFT JOIN library l ON l.id = r.library_id "
+        "WHERE r.month < date_trunc('month', now())::date "
+        "GROUP BY r.site_id, r.vendor_id, r.month "
+        "WINDOW w AS (PARTITION BY r.site_id, r.vendor_id ORDER BY r.month)"
+        ") AS monthly "
+        "ON CONFLICT (site_id, vendor_id, as_of) DO NOTHING"
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS vendor_balance_snapshots")
+    op.execute("DROP INDEX IF EXISTS ix_library_master_data_current_site_vendor_createdon_id")
@@ -0,0 +1,110 @@
+"""partition library_master_data by month of createdon, add ledger_partition_archives
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 00:00:00.000000
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+# Months created ahead of the current one; later months come from the ensure_ledger_partitions task
+MONTHS_AHEAD = 3
+
+FOREIGN_KEYS = {
+    "library_master_data_info_hash_fkey": "FOREIGN KEY (info_hash) REFERENCES form_schemas(hash)",
+    "library_master_data_library_id_fkey": "FOREIGN KEY (library_id) REFERENCES library(id)",
+    "library_master_data_library_master_id_fkey": "FOREIGN KEY (library_master_id) REFERENCES library_master(id)",
+    "library_master_data_site_id_fkey": "FOREIGN KEY (site_id) REFERENCES library_master(id)",
+    "library_master_data_vendor_id_fkey": "FOREIGN KEY (vendor_id) REFERENCES library_master(id)",
+}
+
+INDEXES = [
+    "CREATE INDEX ix_library_master_data_info_hash ON {table} (info_hash)",
+    "CREATE INDEX ix_library_master_data_library_id ON {table} (library_id)",
+    "CREATE INDEX ix_library_master_data_library_master_id ON {table} (library_master_id)",
+    "CREATE INDEX ix_library_master_data_parent_id ON {table} (parent_id)",
+    "CREATE INDEX ix_library_master_data_site_id ON {table} (site_id)",
+    "CREATE INDEX ix_library_master_data_status ON {table} (status)",
+    "CREATE INDEX ix_library_master_data_vendor_id ON {table} (vendor_id)",
+    "CREATE INDEX ix_library_master_data_site_library_createdon_id ON {table} (site_id, library_id, createdon, id)",
+    "CREATE INDEX ix_library_master_data_current_site_library_createdon_id ON {table} (site_id, library_id, createdon, id) "
+    "WHERE is_current AND status = 'active'",
+    "CREATE INDEX ix_library_master_data_current_site_vendor_createdon_id ON {table} (site_id, vendor_id, createdon, id) "
+    "WHERE is_current AND status = 'active'",
+]
+
+
+def _add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def _swap_in(bind, partitioned, primary_key):
+    """Copy every row into the new `library_master_data_new`, then put it in place of the old table."""
+    op.execute("INSERT INTO library_master_data_new SELECT * FROM library_master_data")
+    sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence('library_master_data', 'id')")).scalar()
+    op.execute(f"ALTER SEQUENCE {sequence} OWNED BY library_master_data_new.id")
+    op.execute("DROP TABLE library_master_data")
+    op.execute("ALTER TABLE library_master_data_new RENAME TO library_master_data")
+    if partitioned:
+        op.execute("ALTER TABLE library_master_data_new_default RENAME TO library_master_data_default")
+    op.execute(f"ALTER TABLE library_master_data ADD CONSTRAINT library_master_data_pkey PRIMARY KEY ({primary_key})")
+    for name, definition in FOREIGN_KEYS.items():
+        op.execute(f"ALTER TABLE library_master_data ADD CONSTRAINT {name} {definition}")
+    for index in INDEXES:
+        op.execute(index.format(table="library_master_data"))
+
+
+def upgrade():
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table('library_master_data'):
+        return
+    op.execute(
+        "CREATE TABLE IF NOT EXISTS ledger_partition_archives ("
+        "partition varchar PRIMARY KEY, "
+        "month_from date NOT NULL, "
+        "month_to date NOT NULL, "
+        "rows integer NOT NULL, "
+        "path varchar NOT NULL, "
+        "archivedon timestamp without time zone DEFAULT now())"
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS ix_ledger_partition_archives_month_to ON ledger_partition_archives (month_to)")
+    if bind.execute(sa.text("SELECT relkind FROM pg_class WHERE oid = 'library_master_data'::regclass")).scalar() == "p":
+        # Created partitioned by create_all
+        return
+
+    op.execute(
+        "CREATE TABLE library_master_data_new (LIKE library_master_data INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        "PARTITION BY RANGE (createdon)"
+    )
+    today = datetime.date.today()
+    first = bind.execute(sa.text("SELECT date_trunc('month', min(createdon))::date FROM library_master_data")).scalar()
+    month = min(first, today.replace(day=1)) if first else today.replace(day=1)
+    last = _add_months(today.replace(day=1), MONTHS_AHEAD)
+    while month <= last:
+        # Same names as utils.ledger_partitions.partition_name
+        op.execute(
+            f"CREATE TABLE library_master_data_y{month.year}m{month.month:02d} PARTITION OF library_master_data_new "
+            f"FOR VALUES FROM ('{month}') TO ('{_add_months(month, 1)}')"
+        )
+        month = _add_months(month, 1)
+    op.execute("CREATE TABLE library_master_data_new_default PARTITION OF library_master_data_new DEFAULT")
+    _swap_in(bind, partitioned=True, primary_key="id, createdon")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table('library_master_data'):
+        return
+    if bind.execute(sa.text("SELECT relkind FROM pg_class WHERE oid = 'library_master_data'::regclass")).scalar() == "p":
+        # Archived months are not restored; see utils/ledger_partitions.py
+        op.execute("CREATE TABLE library_master_data_new (LIKE library_master_data INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        _swap_in(bind, partitioned=False, primary_key="id")
+    op.execute("DROP TABLE IF EXISTS ledger_partition_archives")
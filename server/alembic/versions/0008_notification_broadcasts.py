@@ -0,0 +1,41 @@
+"""create notification_broadcasts
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Also created by the models' create_all on app start-up
+    if sa.inspect(op.get_bind()).has_table('notification_broadcasts'):
+        return
+    op.create_table(
+        'notification_broadcasts',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('title', sa.String(255), nullable=True),
+        sa.Column('message', sa.Text, nullable=True),
+        sa.Column('data', sa.JSON, nullable=True),
+        sa.Column('filters', sa.JSON, nullable=True),
+        sa.Column('status', sa.String(50), nullable=False, server_default='pending'),
+        sa.Column('tokens', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('batches', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('batches_done', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('sent', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('failed', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('error', sa.Text, nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()')),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index('ix_notification_broadcasts_id', 'notification_broadcasts', ['id'])
+
+
+def downgrade():
+    op.drop_table('notification_broadcasts')
@@ -0,0 +1,86 @@
+"""
+Benchmark: sync (threadpool + psycopg2) vs async (asyncpg) ledger routes.
+
+Fires the same ledger listing request at `/api/library/...` and at
+`/api/async/library/...` with a fixed number of requests in flight, and
+reports requests/sec and p50/p90/p99 latency for each.
+
+Start the server with the async stack enabled first, e.g. (from server/):
+    ASYNC_DB=True uvicorn main:app --port 8000
+
+Then:
+    python server/benchmarks/bench_async_routes.py --requests 2000 --concurrency 100
+
+A token is minted with JWT_SECRET unless `--token` is given, so run this
+with the same environment as the server.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.jwt_helper import create_jwt_token  # noqa: E402
+
+
+def percentile(values, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def run(client: httpx.AsyncClient, path: str, requests: int, concurrency: int):
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started, latencies, errors
+
+
+def report(label: str, elapsed: float, latencies, errors: int):
+    ms = [latency * 1000 for latency in latencies]
+    print(f"{label:<6} {len(ms) / elapsed:>9.0f} req/s  p50 {statistics.median(ms):>8.1f}ms  "
+          f"p90 {percentile(ms, 90):>8.1f}ms  p99 {percentile(ms, 99):>8.1f}ms  errors {errors}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--token", help="bearer token; minted from JWT_SECRET when omitted")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--site-id", type=int, default=501)
+    parser.add_argument("--library-id", type=int, default=1)
+    parser.add_argument("--query", default="cursor=true&limit=50", help="query string for the listing")
+    args = parser.parse_args()
+
+    token = args.token or create_jwt_token({"sub": "benchmark"})
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, headers={"Authorization": f"Bearer {token}"}, limits=limits, timeout=60) as client:
+        suffix = f"/library/master/data/{args.site_id}/{args.library_id}?{args.query}"
+        for label, prefix in (("sync", "/api"), ("async", "/api/async")):
+            probe = await client.get(prefix + suffix)
+            if probe.status_code != 200:
+                sys.exit(f"{label}: GET {prefix + suffix} returned {probe.status_code}; is the server running with ASYNC_DB=True?")
+            # Warm up connections and pools before measuring
+            await run(client, prefix + suffix, args.concurrency, args.concurrency)
+            report(label, *await run(client, prefix + suffix, args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+"""
+Benchmark: per-row ledger writes vs. the set-based bulk upsert.
+
+Writes the same synthetic batch through `crud.create_library_master_data`
+(one `.get()` + insert/update + commit per row) and through
+`crud.bulk_upsert_library_master_data` (one transaction), for both a
+fresh-insert and a full-update pass, then deletes the rows it created.
+
+Needs a database reachable through RDS_URL with the library seeds loaded
+(`POST /api/library/seed` and `/api/library/master/seed`).
+
+Usage:
+    python server/benchmarks/bench_bulk_ingest.py --rows 1000
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sql_app.database import SessionLocal  # noqa: E402
+from sql_app.library import crud, models  # noqa: E402
+
+
+def make_rows(count: int, first_id: int, price: float):
+    createdon = datetime.datetime.now()
+    return [
+        {
+            "id": first_id + offset,
+            "quantity": 1 + offset % 10,
+            "price": price,
+            "createdon": createdon,
+            "version": 1,
+            "parent_id": 0,
+            "info": {},
+            "misc": {},
+            "status": "active",
+            "site_id": 501,
+            "vendor_id": 601,
+            "library_id": 1,
+            "library_master_id": 1,
+        }
+        for offset in range(count)
+    ]
+
+
+def per_row(rows):
+    for row in rows:
+        # A fresh session per row, as each API request gets one
+        with SessionLocal() as db:
+            crud.create_library_master_data(db=db, library_master_data=dict(row), id=row["id"])
+
+
+def bulk(rows):
+    with SessionLocal() as db:
+        crud.bulk_upsert_library_master_data(db, rows)
+
+
+def timed(label: str, fn, rows):
+    started = time.perf_counter()
+    fn(rows)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<24} {len(rows):>8} rows {elapsed:>9.3f}s {len(rows) / elapsed:>12.0f} rows/s")
+    return elapsed
+
+
+def cleanup(first_id: int, count: int):
+    db = SessionLocal()
+    db.query(models.LibraryMasterData).filter(
+        models.LibraryMasterData.id >= first_id, models.LibraryMasterData.id < first_id + count
+    ).delete(synchronize_session=False)
+    db.commit()
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--first-id", type=int, default=9_000_000, help="id range reserved for benchmark rows")
+    args = parser.parse_args()
+
+    per_row_ids, bulk_ids = args.first_id, args.first_id + args.rows
+    try:
+        results = {
+            "per-row insert": timed("per-row insert", per_row, make_rows(args.rows, per_row_ids, 100)),
+            "per-row update": timed("per-row update", per_row, make_rows(args.rows, per_row_ids, 200)),
+            "bulk insert": timed("bulk insert", bulk, make_rows(args.rows, bulk_ids, 100)),
+            "bulk update": timed("bulk update", bulk, make_rows(args.rows, bulk_ids, 200)),
+        }
+    finally:
+        cleanup(args.first_id, args.rows * 2)
+
+    print(f"speed-up insert: {results['per-row insert'] / results['bulk insert']:.1f}x, "
+          f"update: {results['per-row update'] / results['bulk update']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
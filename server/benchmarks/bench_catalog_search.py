@@ -0,0 +1,80 @@
+"""
+Benchmark: typeahead search over a large `library_master` catalog.
+
+Builds `utils.catalog_search.CatalogSearchIndex` over the seed catalog plus
+N synthetic vendors/materials/sites (no database needed), then times a mix
+of typeahead queries (1 to 3 words, last word partially typed, some typos,
+with and without a `library_id` filter) and reports the build time and the
+per-query p50/p99/max latency.
+
+Usage:
+    python server/benchmarks/bench_catalog_search.py --rows 50000 --queries 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from seeds.library import library_master  # noqa: E402
+from utils.catalog_search import CatalogSearchIndex  # noqa: E402
+
+WORDS = [
+    "Cement", "Steel", "Bricks", "Sand", "Aggregate", "Hardwares", "Traders", "Suppliers", "Builders", "Enterprises",
+    "Pipes", "Fittings", "Electricals", "Paints", "Tiles", "Granite", "Marble", "Timber", "Plywood", "Glass",
+    "Shree", "Balaji", "Ganesh", "Krishna", "Laxmi", "National", "Royal", "Modern", "Everest", "Sunrise",
+]
+PLACES = ["Gurugram", "Manesar", "Samhalka", "Sohna", "Rewari", "Faridabad", "Noida", "Delhi", "Panipat", "Rohtak"]
+
+
+def synthetic_rows(count: int, rng: random.Random):
+    rows = [dict(row) for row in library_master]
+    for index in range(count):
+        name = " ".join(rng.sample(WORDS, rng.randint(1, 3))) + f" {index:05d}"
+        rows.append({"id": 1_000_000 + index, "library_id": rng.choice([1, 2, 3, 4, 6, 7]), "name": name, "variant": rng.choice(PLACES)})
+    return rows
+
+
+def queries(count: int, rng: random.Random):
+    out = []
+    for _ in range(count):
+        words = rng.sample(WORDS + PLACES, rng.randint(1, 3))
+        words[-1] = words[-1][:rng.randint(1, len(words[-1]))]
+        text = " ".join(words)
+        if rng.random() < 0.2 and len(text) > 4:
+            # One dropped character, as a typo
+            cut = rng.randrange(len(text))
+            text = text[:cut] + text[cut + 1:]
+        out.append((text, rng.choice([None, None, 1, 7])))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000, help="synthetic catalog rows besides the seeds")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    rows = synthetic_rows(args.rows, rng)
+    started = time.perf_counter()
+    index = CatalogSearchIndex(rows)
+    print(f"built index over {len(rows)} rows, {len(index.postings)} trigrams in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    timings = []
+    for text, library_id in queries(args.queries, rng):
+        started = time.perf_counter()
+        index.search(text, library_id=library_id, limit=args.limit)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    pct = lambda p: timings[min(len(timings) - 1, int(len(timings) * p / 100))] * 1000
+    print(f"{len(timings)} queries: p50 {pct(50):.2f} ms  p90 {pct(90):.2f} ms  p99 {pct(99):.2f} ms  max {timings[-1] * 1000:.2f} ms")
+    for text in ("hard", "shree bal", "cemnt", "krishna tra"):
+        print(f"  {text!r}: " + ", ".join(f"{hit['name']} ({hit['variant']})" for hit in index.search(text, limit=3)))
+
+
+if __name__ == "__main__":
+    main()
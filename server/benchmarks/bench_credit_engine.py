@@ -0,0 +1,86 @@
+"""
+Benchmark: Credit Master deductions per bill in Python vs. the NumPy engine.
+
+Applies the Credit Master rules from the seeds (EMD, Performance Guarantee,
+Security, GST, Income Tax, GST Return) to N random bills:
+
+- per-row Python: a loop over bills and rules doing the same integer-paise
+  arithmetic (round half up) one value at a time,
+- `utils.credit_engine.CreditEngine.compute`: one (rules x N) array expression,
+- the same plus encoding the columnar result with `utils.serialization.dumps`,
+  i.e. what the `/credit/compute` route spends besides parsing the request,
+
+and checks that both computations give identical results. No database needed.
+
+Usage:
+    python server/benchmarks/bench_credit_engine.py --bills 10000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from seeds.library import credit  # noqa: E402
+from utils import serialization  # noqa: E402
+from utils.credit_engine import CreditEngine  # noqa: E402
+
+
+def per_row(engine: CreditEngine, gross: list) -> list:
+    rules = [(name, int(rate), int(flat), int(sign)) for name, rate, flat, sign in zip(engine.names, engine.rates, engine.flat, engine.signs)]
+    bills = []
+    for amount in gross:
+        paise = round(amount * 100)
+        bill = {"gross": paise / 100}
+        net = paise
+        for name, rate, flat, sign in rules:
+            value = (1 if paise >= 0 else -1) * ((rate * abs(paise) + 500_000) // 1_000_000) + flat
+            bill[name] = value / 100
+            net += sign * value
+        bill["net"] = net / 100
+        bills.append(bill)
+    return bills
+
+
+def best_of(fn, repeat: int):
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bills", type=int, nargs="+", default=[10_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per candidate; the fastest is reported")
+    args = parser.parse_args()
+
+    engine = CreditEngine(credit)
+    print("rules:", ", ".join(f"{rule['name']} {rule['value']:g}{'%' if rule['value_type'] == '%' else ''}" for rule in engine.rules))
+    rng = np.random.default_rng(1)
+    for count in args.bills:
+        gross = np.round(rng.uniform(100, 500_000, count), 2)
+        gross_list = gross.tolist()
+
+        python_time, bills = best_of(lambda: per_row(engine, gross_list), args.repeat)
+        numpy_time, result = best_of(lambda: engine.compute(gross), args.repeat)
+        encode_time, _ = best_of(lambda: serialization.dumps({"result": engine.compute(gross)}), args.repeat)
+
+        for name, column in result.items():
+            expected = np.fromiter((bill[name] for bill in bills), dtype=np.float64, count=count)
+            assert np.array_equal(column, expected), f"{name} differs"
+
+        print(f"\n{count} bills")
+        print(f"  {'per-row Python':<28} {python_time * 1000:>10.1f} ms  {count / python_time:>12,.0f} bills/s")
+        print(f"  {'CreditEngine.compute':<28} {numpy_time * 1000:>10.1f} ms  {count / numpy_time:>12,.0f} bills/s  {python_time / numpy_time:>6.1f}x")
+        print(f"  {'compute + orjson encode':<28} {encode_time * 1000:>10.1f} ms  {count / encode_time:>12,.0f} bills/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark: push notification fan-out across a user's device tokens.
+
+Sends notifications for N users with K device tokens each through a mock
+provider that sleeps a given latency (with jitter) per call and fails a
+fraction of calls, so dead tokens cost retries as they would with FCM. No
+database or network needed.
+
+Compares the previous sequential loop (one token after another, sleeping
+`backoff * attempt` after each failure) with `notification_utils.send_to_tokens`
+at each `--concurrency`, and reports per worker process: tokens/sec,
+notifications (users)/sec and p50/p99 time per notification.
+
+Usage:
+    python server/benchmarks/bench_notification_fanout.py --users 50 --tokens 5 --latency 80 --failure-rate 0.1
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.notification_utils import send_to_tokens  # noqa: E402
+
+
+class LatencyProvider:
+    """Stands in for FCM: each call sleeps `latency` (+/- `jitter`) seconds and fails with `failure_rate`."""
+
+    def __init__(self, latency: float, jitter: float, failure_rate: float, seed: int):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def __call__(self, token, title, body, data=None):
+        with self._lock:
+            self.calls += 1
+            delay = max(self.latency + self._rng.uniform(-self.jitter, self.jitter), 0)
+            failed = self._rng.random() < self.failure_rate
+        time.sleep(delay)
+        if failed:
+            raise RuntimeError("mock provider error")
+        return f"mock-{token}", {"success": True}
+
+
+def send_sequential(tokens, title, body, data, send, retries, backoff):
+    """The loop `sendMobileNotification` used before: one token at a time, blocking sleeps between attempts."""
+    results = []
+    for token in tokens:
+        error = None
+        for attempt in range(1, retries + 1):
+            try:
+                message_id, _ = send(token, title, body, data)
+                results.append({"token": token, "success": True, "message_id": message_id})
+                break
+            except Exception as exc:
+                error = exc
+                time.sleep(backoff * attempt)
+        else:
+            results.append({"token": token, "success": False, "error": str(error)})
+    return results
+
+
+def percentile(values, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(label, users, tokens_per_user, send_one):
+    durations = []
+    failed = 0
+    started = time.perf_counter()
+    for user in range(users):
+        tokens = [f"user{user}-device{device}" for device in range(tokens_per_user)]
+        began = time.perf_counter()
+        results = send_one(tokens)
+        durations.append(time.perf_counter() - began)
+        failed += sum(1 for result in results if not result["success"])
+    elapsed = time.perf_counter() - started
+    print(
+        f"{label:<18} {users * tokens_per_user / elapsed:>10.1f} {users / elapsed:>10.2f} "
+        f"{percentile(durations, 50) * 1000:>9.0f} {percentile(durations, 99) * 1000:>9.0f} {failed:>7}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50, help="notifications to send, one per user")
+    parser.add_argument("--tokens", type=int, default=5, help="device tokens per user")
+    parser.add_argument("--latency", type=float, default=80, help="provider latency per call, ms")
+    parser.add_argument("--jitter", type=float, default=20, help="+/- ms added to each call")
+    parser.add_argument("--failure-rate", type=float, default=0.1, help="fraction of calls that fail")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--backoff", type=float, default=0.5, help="seconds, multiplied by the attempt number")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--skip-sequential", action="store_true")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{args.users} users x {args.tokens} tokens, {args.latency:.0f}+/-{args.jitter:.0f} ms per call, "
+          f"{args.failure_rate:.0%} failures, {args.retries} attempts, backoff {args.backoff}s")
+    print(f"{'mode':<18} {'tokens/s':>10} {'users/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'failed':>7}")
+
+    def provider():
+        return LatencyProvider(args.latency / 1000, args.jitter / 1000, args.failure_rate, args.seed)
+
+    if not args.skip_sequential:
+        send = provider()
+        run("sequential", args.users, args.tokens,
+            lambda tokens: send_sequential(tokens, "Title", "Body", {}, send, args.retries, args.backoff))
+    for concurrency in args.concurrency:
+        send = provider()
+        run(f"concurrent x{concurrency}", args.users, args.tokens,
+            lambda tokens: send_to_tokens(tokens, "Title", "Body", {}, send=send, retries=args.retries,
+                                          backoff=args.backoff, concurrency=concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Benchmark: full ORM ledger rows vs. a `fields=` column projection.
+
+Reads the same ledger page through `crud.get_libraries_master_data` with
+and without `fields`, encodes it the way the route does, and reports the
+time per row and the peak Python memory (tracemalloc) of each.
+
+Needs a database reachable through RDS_URL with ledger rows for the site,
+e.g. from `python -m seeds.synthetic --rows 100000 --with-form-info`.
+
+Usage:
+    python server/benchmarks/bench_projection.py --site-id 100001 --limit 5000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sql_app.database import SessionLocal  # noqa: E402
+from sql_app.library import crud  # noqa: E402
+from utils import serialization  # noqa: E402
+
+
+def measure(site_id: int, limit: int, fields):
+    with SessionLocal() as db:
+        tracemalloc.start()
+        started = time.perf_counter()
+        rows = crud.get_libraries_master_data(db, page=1, limit=limit, site_id=site_id, fields=fields)
+        body = serialization.result_response(rows).body
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return len(rows), elapsed, peak, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--site-id", type=int, default=100001)
+    parser.add_argument("--limit", type=int, default=5000)
+    parser.add_argument("--fields", default="quantity,price,createdon,library_master_id", help="projection to compare against full rows")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per variant; the fastest is reported")
+    args = parser.parse_args()
+
+    for label, fields in (("full rows", None), (f"fields={args.fields}", args.fields.split(","))):
+        count, elapsed, peak, size = min((measure(args.site_id, args.limit, fields) for _ in range(args.repeat)), key=lambda run: run[1])
+        print(f"{label:<48} {count:>7} rows {elapsed * 1000:>9.1f} ms {elapsed / max(count, 1) * 1e6:>8.1f} us/row "
+              f"peak {peak / 2**20:>7.1f} MiB  body {size / 2**20:>6.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
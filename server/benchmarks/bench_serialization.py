@@ -0,0 +1,132 @@
+"""
+Microbenchmark: response serialization for ledger and catalog lists.
+
+Encodes the same in-memory ORM rows (no database needed) to response bytes
+with:
+
+- `jsonable_encoder` + `json.dumps`, i.e. `JSONResponse({"result": jsonable_encoder(rows)})`
+  as the routes did before,
+- `utils.serialization` (column attrgetter + orjson),
+- pydantic-core (`TypeAdapter.dump_json` over a from_attributes model), for reference,
+
+and checks that the first two produce the same JSON document.
+
+Payloads: a 200-row ledger page without `info`, the same page with the form
+schema in every row's `info` (as the seeds store it), and the full
+`library_master` catalog from the seeds.
+
+Usage:
+    python server/benchmarks/bench_serialization.py --repeat 50
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import timeit
+from typing import List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from pydantic import BaseModel, ConfigDict, TypeAdapter  # noqa: E402
+
+from seeds.libinfo import libinfo  # noqa: E402
+from seeds.library import library_master  # noqa: E402
+from sql_app.library import models  # noqa: E402
+from utils import serialization  # noqa: E402
+
+
+class LedgerRow(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    quantity: float
+    price: float
+    createdon: datetime.datetime
+    version: Optional[int]
+    parent_id: Optional[int]
+    is_current: bool
+    info: Optional[dict]
+    misc: Optional[dict]
+    status: Optional[str]
+    site_id: int
+    vendor_id: int
+    library_id: int
+    library_master_id: int
+
+
+class MasterRow(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    library_id: int
+    name: str
+    variant: Optional[str]
+    value: Optional[str]
+    value_type: Optional[str]
+    info: Optional[dict]
+    status: Optional[str]
+
+
+def ledger_rows(count: int, info: dict) -> List[models.LibraryMasterData]:
+    rng = random.Random(1)
+    now = datetime.datetime(2024, 4, 1, 10)
+    return [
+        models.LibraryMasterData(
+            id=10_000_000 + index, quantity=round(rng.uniform(1, 500), 2), price=round(rng.uniform(10, 5000), 2),
+            createdon=now - datetime.timedelta(minutes=index), version=1, parent_id=0, is_current=True,
+            info=info, misc={}, status="active", site_id=100001, vendor_id=200001, library_id=1, library_master_id=35,
+        )
+        for index in range(count)
+    ]
+
+
+def master_rows() -> List[models.LibraryMaster]:
+    # Every column set, as on rows loaded from the database
+    columns = [attr.key for attr in models.LibraryMaster.__mapper__.column_attrs]
+    return [
+        models.LibraryMaster(**{key: {"status": "active", **row}.get(key) for key in columns})
+        for row in library_master
+    ]
+
+
+def encode_jsonable(rows) -> bytes:
+    return JSONResponse({ "result": jsonable_encoder(rows) }).body
+
+
+def encode_fast(rows) -> bytes:
+    return serialization.result_response(rows).body
+
+
+def bench(label: str, rows, adapter: TypeAdapter, repeat: int):
+    assert json.loads(encode_jsonable(rows)) == json.loads(encode_fast(rows)), "outputs differ"
+    candidates = {
+        "jsonable_encoder": lambda: encode_jsonable(rows),
+        "orjson (serialization)": lambda: encode_fast(rows),
+        "pydantic-core": lambda: b'{"result":' + adapter.dump_json(adapter.validate_python(rows)) + b"}",
+    }
+    print(f"\n{label} ({len(rows)} rows, {len(encode_fast(rows)) / 1024:.0f} KiB)")
+    baseline = None
+    for name, fn in candidates.items():
+        best = min(timeit.repeat(fn, number=1, repeat=repeat))
+        baseline = baseline or best
+        print(f"  {name:<24} {best * 1000:>9.3f} ms  {baseline / best:>6.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200, help="ledger page size")
+    parser.add_argument("--repeat", type=int, default=50, help="runs per candidate; the best is reported")
+    args = parser.parse_args()
+
+    ledger_adapter = TypeAdapter(List[LedgerRow])
+    bench("ledger page, empty info", ledger_rows(args.rows, {}), ledger_adapter, args.repeat)
+    bench("ledger page, form schema in info", ledger_rows(args.rows, libinfo["simple"]), ledger_adapter, args.repeat)
+    bench("library_master catalog", master_rows(), TypeAdapter(List[MasterRow]), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,8 @@ Configures broker, backend, and serialization for Celery workers.
 """
 import os
 
+from celery.schedules import crontab
+
 # Redis broker and result backend
 broker_url = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
 result_backend = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
@@ -15,3 +17,28 @@ task_serializer = "json"
 result_serializer = "json"
 timezone = "UTC"
 enable_utc = True
+
+# Task modules registered on the shared app besides the notification tasks
+imports = ["tasks.celery_ledger_tasks"]
+
+# Periodic jobs run by `celery beat`
+beat_schedule = {
+    # Idempotent; daily so a missed run never leaves a month without its partition
+    "ensure-ledger-partitions": {
+        "task": "ensure_ledger_partitions",
+        "schedule": crontab(hour=0, minute=30),
+    },
+    "export-ledger-snapshots": {
+        "task": "export_ledger_snapshots",
+        "schedule": crontab(hour=1, minute=30),
+    },
+    "reconcile-ledger-rollups": {
+        "task": "reconcile_ledger_rollups",
+        "schedule": crontab(hour=2, minute=15),
+    },
+    # Reads the rollups, so runs after they are reconciled
+    "snapshot-vendor-balances": {
+        "task": "snapshot_vendor_balances",
+        "schedule": crontab(hour=2, minute=45),
+    },
+}
@@ -1,9 +1,16 @@
+import os
 from typing import Annotated, Optional
 
 from fastapi import Header, HTTPException, Request
 from fastapi import Depends
+from sqlalchemy.orm import Session
 
-from utils.jwt_helper import verify_jwt_token
+from sql_app.database import get_db
+from sql_app.users import crud as users_crud, schemas as users_schemas
+from utils import auth_cache
+
+# Users allowed to call admin-only routes, besides those with `"role": "admin"` in `users.misc`
+ADMIN_USER_IDS = {int(id) for id in os.getenv("ADMIN_USER_IDS", "").split(",") if id.strip()}
 
 
 async def get_token_header(x_token: Annotated[str, Header()]):
@@ -29,7 +36,35 @@ async def require_auth(authorization: Annotated[Optional[str], Header()] = None)
         raise HTTPException(status_code=401, detail="Invalid Authorization header")
 
     token = parts[1]
-    payload = verify_jwt_token(token)
+    # Verified once per token; later requests read the claims from the cache until `exp`
+    payload = auth_cache.verify_token(token)
     if not payload:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
     return payload
+
+
+def current_user(claims: dict = Depends(require_auth), db: Session = Depends(get_db)) -> users_schemas.User:
+    """
+    The authenticated user, usually from the per-process user cache rather
+    than the database. Raises 401 for refresh tokens and unknown users.
+    """
+    if claims.get("type") == "refresh":
+        raise HTTPException(status_code=401, detail="Invalid token type")
+    try:
+        user_id = int(claims.get("sub"))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=401, detail="Invalid token subject")
+    user = users_crud.get_user_cached(db, user_id=user_id)
+    if user is None or not user.is_active:
+        raise HTTPException(status_code=401, detail="User not found")
+    return user
+
+
+def require_admin(user: users_schemas.User = Depends(current_user)) -> users_schemas.User:
+    """
+    The authenticated user, if they are an admin: listed in ADMIN_USER_IDS or
+    carrying `"role": "admin"` in `users.misc`. Raises 403 otherwise.
+    """
+    if user.id not in ADMIN_USER_IDS and (user.misc or {}).get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
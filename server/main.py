@@ -2,9 +2,10 @@ from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dependencies import get_query_token, get_token_header, require_auth
 from internal import admin
-from routers import users, library, whatsapp, notifications
+from routers import users, library, whatsapp, notifications, metrics
 
 from dotenv import load_dotenv
+import os
 
 load_dotenv('.env')
 
@@ -24,6 +25,23 @@ app.include_router(users.router, prefix="/api")
 app.include_router(library.router, prefix="/api", dependencies=[Depends(require_auth)])
 app.include_router(whatsapp.router, prefix="/api", dependencies=[Depends(require_auth)])
 app.include_router(notifications.router, prefix="/api", dependencies=[Depends(require_auth)])
+app.include_router(metrics.router, prefix="/api", dependencies=[Depends(require_auth)])
+
+if os.getenv("ASYNC_DB", "False") == "True":
+    # Opt-in asyncpg stack for the ledger listing/history/create routes only, served side by side under /api/async
+    from routers import library_async
+    app.include_router(library_async.router, prefix="/api/async", dependencies=[Depends(require_auth)])
+
+from sql_app import profiling
+
+if profiling.ENABLED:
+    # Per-request statement counts / DB time in Server-Timing and the server.sql log
+    from sql_app.database import engine
+    profiling.install(engine)
+    if os.getenv("ASYNC_DB", "False") == "True":
+        from sql_app.async_database import async_engine
+        profiling.install(async_engine.sync_engine)
+    app.add_middleware(profiling.SQLProfilingMiddleware)
 
 app.include_router(
     admin.router,
@@ -33,6 +51,14 @@ app.include_router(
     responses={418: {"description": "I'm a teapot"}},
 )
 
+@app.on_event("startup")
+def warm_google_keys():
+    # Fetch Google's signing keys before the first login needs them
+    from utils import google_auth
+    if google_auth.GOOGLE_CLIENT_IDS:
+        google_auth.key_set.refresh_in_background()
+
+
 @app.get("/")
 async def root():
     return {"message": "Hello World"}
@@ -1,14 +1,30 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+from sqlalchemy.exc import DataError, IntegrityError
 from sqlalchemy.orm import Session
 from sql_app.library import crud, models, schemas
-from sql_app.database import get_db, engine
-from seeds.library import library as library_seed, library_master as library_master_seed, library_master_data as library_master_data_seed
-from fastapi.responses import JSONResponse
+from sql_app.database import SessionLocal, get_db, engine
+from utils import catalog_search, credit_engine, queue as task_queue, serialization
+from utils.catalog_cache import catalog_cache, etag_matches
+from utils.pagination import encode_cursor, decode_cursor, date_range_bounds
+from seeds import engine as seed_engine
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+import csv
+import datetime
+import io
 import json
+import orjson
+import os
+import re
 
 models.Base.metadata.create_all(bind=engine)
 
+BULK_MAX_ROWS = int(os.getenv("LIBRARY_BULK_MAX_ROWS", "10000"))
+CREDIT_MAX_BILLS = int(os.getenv("CREDIT_MAX_BILLS", "1000000"))
+
 
 router = APIRouter(
     prefix="/library",
@@ -18,84 +34,137 @@ router = APIRouter(
 )
 
 
+def _catalog_response(request: Request, name: str, load):
+    """
+    Serve a catalog listing from the versioned cache with a strong ETag.
+
+    `load` returns the response payload and is only called on a cache miss. A
+    matching `If-None-Match` gets an empty 304 so unchanged catalogs cost the
+    client no payload at all.
+    """
+    body, etag = catalog_cache.get(name, lambda: serialization.dumps(serialization.to_jsonable(load())))
+    headers = { "ETag": etag, "Cache-Control": "no-cache" }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _with_form_schemas(db: Session, rows, **extra) -> dict:
+    """
+    `{"result": rows, "schemas": {hash: schema}}` where `schemas` holds each
+    form schema the rows reference by `info_hash`, once per response.
+    """
+    return { "result": rows, "schemas": crud.get_form_schemas(db, crud.info_hashes(rows)), **extra }
+
+
+def _rows_response(db: Session, rows, expand: list = None, **extra):
+    payload = _with_form_schemas(db, rows, **extra)
+    if expand:
+        payload["result"] = serialization.expand_rows(rows, expand, crud.master_summary)
+    return serialization.result_response(**payload)
+
+
+def _parse_expand(expand: Optional[str], fields: Optional[list]) -> Optional[list]:
+    expand = serialization.parse_fields(expand, crud.LIBRARY_MASTER_DATA_EXPANSIONS, what="expansions")
+    if expand and fields:
+        raise HTTPException(status_code=400, detail="`expand` cannot be combined with `fields`")
+    return expand
+
+
+@router.get("/schemas/{hash}")
+def get_form_schema(hash: str, request: Request, db: Session = Depends(get_db)):
+    """A form schema by content hash; immutable, so clients and proxies may cache it forever."""
+    schema = crud.get_form_schema(db=db, hash=hash)
+    if schema is None:
+        raise HTTPException(status_code=404, detail="Form schema not found")
+    headers = { "ETag": f'"{hash}"', "Cache-Control": "public, max-age=31536000, immutable" }
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return serialization.result_response(schema, headers=headers)
+
+
 # Start :: library
 @router.get("/", response_model=schemas.Library)
 def get_libraries(
-    db: Session = Depends(get_db)
+    request: Request, db: Session = Depends(get_db)
 ):
-    result = crud.get_libraries(db=get_db())
-    # return JSONResponse({ "result": "result" })
-    return JSONResponse({ "result": jsonable_encoder(result) })
+    return _catalog_response(request, "library", lambda: _with_form_schemas(db, crud.get_libraries(db=db)))
 
 
 @router.post("/", response_model=schemas.Library)
 def create_library_for_user(
     library: schemas.LibraryCreate, db: Session = Depends(get_db)
 ):
-    return JSONResponse({ "result": jsonable_encoder(crud.create_library(db=get_db(), library=library)) })
+    return JSONResponse({ "result": jsonable_encoder(crud.create_library(db=db, library=library)) })
 
 
 @router.post("/seed")
-def seed_library(
-    # library: schemas.LibraryCreate, db: Session = Depends(get_db)
-):
-    print(library_seed, len(library_seed))
-    result = []
-    for index in range(len(library_seed)):
-        id = None
-        row_data = {}
-        for key in library_seed[index].keys():
-            if key == 'id':
-                id = library_seed[index][key]
-            else:
-                row_data[key] = library_seed[index][key]
-        result.append(crud.create_or_update_library(db=get_db(), library=row_data, id=id))
-    return JSONResponse({ "result": jsonable_encoder(result) })
+def seed_library(db: Session = Depends(get_db)):
+    return JSONResponse({ "result": seed_engine.seed(db, tables=["library"]) })
+
+
+@router.get("/{library_id}/form")
+def get_library_form(library_id: int, request: Request, site_id: Optional[int] = None, db: Session = Depends(get_db)):
+    """
+    Everything needed to open the library's entry form in one call: the form
+    schema with each dropdown's options resolved and the hidden ids prefilled.
+    Cached per catalog version, with an ETag.
+    """
+    def load():
+        form = crud.get_library_form(db=db, library_id=library_id, site_id=site_id)
+        if form is None:
+            raise HTTPException(status_code=404, detail="Form not found")
+        return { "result": form }
+
+    return _catalog_response(request, f"form:{library_id}:{site_id}", load)
 # End :: library
 
 
 # Start :: library_master
 @router.get("/master", response_model=schemas.Library)
 def get_libraries_master(
-    db: Session = Depends(get_db)
+    request: Request, db: Session = Depends(get_db)
 ):
-    result = crud.get_libraries_master(db=get_db())
-    return JSONResponse({ "result": jsonable_encoder(result) })
+    return _catalog_response(request, "library_master", lambda: { "result": crud.get_libraries_master(db=db) })
+
+
+@router.get("/master/search")
+def search_libraries_master(
+    q: str = Query(..., min_length=1, max_length=100), library_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100), db: Session = Depends(get_db)
+):
+    """
+    Typeahead over active `library_master` rows (sites, vendors, materials, ...).
+
+    Fuzzy, prefix-tolerant match of `q` against `name` + `variant`, ranked
+    best first, from an in-memory trigram index that is rebuilt when the
+    catalog changes (see utils/catalog_search.py).
+    """
+    return serialization.result_response(catalog_search.get_index(db).search(q, library_id=library_id, limit=limit))
 
 
 @router.post("/master", response_model=schemas.LibraryMaster)
 def create_library_for_user(
     library_master: schemas.LibraryMasterCreate, db: Session = Depends(get_db)
 ):
-    return JSONResponse({ "result": jsonable_encoder(crud.create_library_master(db=get_db(), library_master=library_master)) })
+    return JSONResponse({ "result": jsonable_encoder(crud.create_library_master(db=db, library_master=library_master)) })
 
 
 @router.post("/master/seed")
-def seed_library_master(
-    # library: schemas.LibraryCreate, db: Session = Depends(get_db)
-):
-    print(library_master_seed, len(library_master_seed))
-    result = []
-    for index in range(len(library_master_seed)):
-        id = None
-        row_data = {}
-        for key in library_master_seed[index].keys():
-            if key == 'id':
-                id = library_master_seed[index][key]
-            else:
-                row_data[key] = library_master_seed[index][key]
-        result.append(crud.create_or_update_library_master(db=get_db(), library_master=row_data, id=id))
-    return JSONResponse({ "result": jsonable_encoder(result) })
+def seed_library_master(db: Session = Depends(get_db)):
+    return JSONResponse({ "result": seed_engine.seed(db, tables=["library_master"]) })
 # End :: library_master
 
 
 # Start :: library_data
 @router.get("/master/data", response_model=schemas.LibraryMasterData)
 def get_libraries_master_data(
-    db: Session = Depends(get_db)
+    fields: Optional[str] = None, expand: Optional[str] = None, db: Session = Depends(get_db)
 ):
-    result = crud.get_libraries_master_data(db=get_db())
-    return JSONResponse({ "result": jsonable_encoder(result) })
+    fields = serialization.parse_fields(fields, crud.LIBRARY_MASTER_DATA_FIELDS)
+    expand = _parse_expand(expand, fields)
+    result = crud.get_libraries_master_data(db=db, fields=fields, expand=expand)
+    return _rows_response(db, result, expand=expand)
 
 
 @router.post("/master/data", response_model=schemas.LibraryMasterData)
@@ -106,30 +175,391 @@ def create_library_master_data(
     id = None
     if "id" in library_master_data_dict:
         id = library_master_data_dict["id"]
-    return JSONResponse({ "result": jsonable_encoder(crud.create_library_master_data(db=get_db(), library_master_data=library_master_data, id=id)) })
+    return JSONResponse({ "result": jsonable_encoder(crud.create_library_master_data(db=db, library_master_data=library_master_data, id=id)) })
+
+
+@router.get("/master/data/export")
+def export_library_master_data(
+    site_id: int,
+    date_from: Optional[datetime.date] = Query(None, alias="from"),
+    date_to: Optional[datetime.date] = Query(None, alias="to"),
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+):
+    """
+    Stream a site's ledger rows as NDJSON or CSV.
+
+    Rows flow from a server-side cursor through a generator straight into the
+    response, so memory use does not grow with the size of the export.
+    """
+    start, end = date_range_bounds(date_from, date_to)
+    batches = _export_batches(site_id, start, end)
+    if export_format == "csv":
+        body, media_type = _csv_chunks(batches), "text/csv"
+    else:
+        body, media_type = _ndjson_chunks(batches), "application/x-ndjson"
+    filename = f"ledger-{site_id}.{export_format}"
+    return StreamingResponse(body, media_type=media_type, headers={ "Content-Disposition": f'attachment; filename="{filename}"' })
+
+
+def _export_batches(site_id: int, start: datetime.datetime, end: datetime.datetime):
+    # The request's session is closed before the body is streamed, so the
+    # generator owns a session for as long as the response is being written.
+    db = SessionLocal()
+    try:
+        yield from crud.stream_library_master_data(db, site_id=site_id, date_from=start, date_to=end)
+    finally:
+        db.close()
+
+
+def _export_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _ndjson_chunks(batches):
+    for batch in batches:
+        yield "".join(json.dumps(dict(row), default=_export_default) + "\n" for row in batch)
+
+
+def _csv_chunks(batches):
+    columns = [column.key for column in models.LibraryMasterData.__table__.columns]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in batches:
+        for row in batch:
+            writer.writerow([
+                json.dumps(row[column]) if isinstance(row[column], (dict, list)) else _csv_value(row[column])
+                for column in columns
+            ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _csv_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+@router.post("/master/data/snapshots")
+def export_library_master_data_snapshots(
+    site_id: Optional[int] = None,
+    date_from: Optional[datetime.date] = Query(None, alias="from"),
+    date_to: Optional[datetime.date] = Query(None, alias="to"),
+    snapshot_format: str = Query("parquet", alias="format", pattern="^(parquet|arrow)$"),
+):
+    """
+    Refresh the columnar (Parquet / Arrow IPC) ledger snapshots under the data directory.
+
+    Enqueued to Celery; only days that changed since the last run are rewritten.
+    Falls back to running inline if Celery is unavailable.
+    """
+    kwargs = {
+        "site_id": site_id,
+        "since": date_from.isoformat() if date_from else None,
+        "until": (date_to + datetime.timedelta(days=1)).isoformat() if date_to else None,
+        "fmt": snapshot_format,
+    }
+    try:
+        task = task_queue.enqueue_task("export_ledger_snapshots", kwargs=kwargs)
+        return JSONResponse({ "result": { "taskId": task.id } })
+    except Exception:
+        # Fallback: synchronous execution
+        from tasks.celery_ledger_tasks import run_snapshot_export
+        return JSONResponse({ "result": run_snapshot_export(**kwargs) })
+
+
+@router.post("/master/data/bulk")
+async def bulk_create_library_master_data(request: Request, db: Session = Depends(get_db)):
+    """
+    Insert or update many ledger rows in one transaction.
+
+    Accepts a JSON array, or NDJSON (one object per line) when sent with an
+    `application/x-ndjson` content type. Every row is validated first; valid
+    rows are then written with a single set-based upsert and the response
+    reports the outcome of each input row by its index.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        payloads = [line async for line in _iter_ndjson(request)]
+    else:
+        try:
+            payloads = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array")
+        if not isinstance(payloads, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array")
+    if len(payloads) > BULK_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ROWS} rows per request")
+
+    results, rows, row_indexes = _validate_bulk_rows(payloads)
+    if rows:
+        try:
+            written = await run_in_threadpool(crud.bulk_upsert_library_master_data, db, rows)
+        except IntegrityError as exc:
+            # The driver's message names tables and constraints; clients get the row and field only
+            index, field = _integrity_error_row(exc, rows, row_indexes)
+            raise HTTPException(status_code=409, detail={ "message": "A row conflicts with existing ledger or catalog data", "index": index, "field": field })
+        except DataError:
+            # A value Postgres could not store that `_validate_bulk_rows` did not catch; nothing was written
+            raise HTTPException(status_code=422, detail={ "message": "A row holds a value the ledger cannot store" })
+        for index, (id, inserted) in zip(row_indexes, written):
+            results[index] = { "index": index, "id": id, "status": "inserted" if inserted else "updated" }
+
+    summary = { "inserted": 0, "updated": 0, "invalid": 0, "duplicate": 0 }
+    for row in results:
+        summary[row["status"]] += 1
+    return JSONResponse({ "result": { **summary, "rows": results } })
+
+
+def _integrity_error_row(exc: IntegrityError, rows: list, row_indexes: list):
+    """The input index and field of the row an IntegrityError is about, from Postgres' `Key (field)=(value)` detail."""
+    detail = getattr(getattr(exc.orig, "diag", None), "message_detail", None) or ""
+    match = re.match(r"Key \((.+?)\)=\((.*)\)", detail)
+    if not match:
+        return None, None
+    fields = [field.strip() for field in match.group(1).split(",")]
+    values = [value.strip() for value in match.group(2).split(",")]
+    for index, row in zip(row_indexes, rows):
+        if [str(row.get(field)) for field in fields] == values:
+            return index, ",".join(fields)
+    return None, ",".join(fields)
+
+
+async def _iter_ndjson(request: Request):
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+def _validate_bulk_rows(payloads: list):
+    """
+    Validate a bulk payload in one pass.
+
+    Returns the per-row result list (pre-filled for rejected rows), the rows to
+    write and, for each of those, its index in the payload. When the same `id`
+    appears more than once only the last occurrence is written.
+    """
+    results = [None] * len(payloads)
+    valid = {}
+    now = datetime.datetime.now()
+    for index, payload in enumerate(payloads):
+        try:
+            if isinstance(payload, bytes):
+                payload = json.loads(payload)
+            row = schemas.LibraryMasterDataCreateWithId.model_validate(payload)
+            data = row.model_dump(warnings=False)
+            if "createdon" not in row.model_fields_set:
+                data["createdon"] = now
+            # The schema accepts any string for ids and `createdon`; one Postgres cannot cast would fail the whole batch
+            data = crud.bind_values(models.LibraryMasterData, data)
+        except (ValueError, ValidationError) as exc:
+            errors = exc.errors(include_url=False) if isinstance(exc, ValidationError) else [{ "msg": str(exc) }]
+            results[index] = { "index": index, "id": None, "status": "invalid", "errors": jsonable_encoder(errors) }
+            continue
+        key = data["id"] if data["id"] is not None else ("new", index)
+        if key in valid:
+            previous = valid[key][0]
+            results[previous] = { "index": previous, "id": data["id"], "status": "duplicate" }
+        valid[key] = (index, data)
+    row_indexes = [index for index, _ in valid.values()]
+    rows = [data for _, data in valid.values()]
+    return results, rows, row_indexes
+
+
+@router.get("/master/data/{id}/history", response_model=schemas.LibraryMasterData)
+def get_library_master_data_history(id: int, db: Session = Depends(get_db)):
+    """All revisions in the `parent_id` chain of ledger row `id`, oldest first."""
+    result = crud.get_library_master_data_history(db=db, id=id)
+    if not result:
+        raise HTTPException(status_code=404, detail="Ledger row not found")
+    return _rows_response(db, result)
 
 
 @router.get("/master/data/{site_id}/{library_id}", response_model=schemas.LibraryMasterData)
 def get_libraries_master_data_filter(
-    site_id: int = None, library_id: int = None, page: int = 1, limit: int = 10, db: Session = Depends(get_db)
+    site_id: int = None, library_id: int = None, page: int = 1, limit: int = 10,
+    cursor: bool = False, after: Optional[str] = None, latest: bool = False, fields: Optional[str] = None,
+    expand: Optional[str] = None,
+    date_from: Optional[datetime.date] = Query(None, alias="from"),
+    date_to: Optional[datetime.date] = Query(None, alias="to"),
+    db: Session = Depends(get_db)
 ):
-    return JSONResponse({ "result": jsonable_encoder(crud.get_libraries_master_data(db=get_db(), page=page, limit=limit, site_id=site_id, library_id=library_id)) })
+    """
+    Ledger rows for a site and library.
+
+    Default mode pages with `page`/`limit`. Pass `cursor=true` (first page) or
+    `after=<next>` (following pages) to switch to keyset pagination, which
+    returns newest rows first and a `next` token that stays equally cheap to
+    follow however deep the client pages.
+
+    `latest=true` returns only the current, active revision of each entry.
+
+    `fields=quantity,price,createdon,...` returns only those columns (plus
+    `id`, and `createdon` in keyset mode), read as plain rows without loading
+    the JSON `info`/`misc` blobs or ORM objects.
+
+    `expand=site_master,vendor_master,library_master` inlines those rows'
+    `id`, `name` and `variant`, joined into the same query, so the page
+    still costs one query. Not combinable with `fields`.
+
+    Form schemas are not repeated per row: rows carry `info_hash` and the
+    response a `schemas` map with each referenced schema once.
+    """
+    start, end = date_range_bounds(date_from, date_to)
+    fields = serialization.parse_fields(fields, crud.LIBRARY_MASTER_DATA_FIELDS)
+    expand = _parse_expand(expand, fields)
+    if cursor or after:
+        result, next_after = crud.get_libraries_master_data_after(
+            db=db, limit=limit, site_id=site_id, library_id=library_id,
+            after=decode_cursor(after) if after else None, date_from=start, date_to=end, latest=latest, fields=fields,
+            expand=expand
+        )
+        return _rows_response(db, result, expand=expand, next=encode_cursor(*next_after) if next_after else None)
+    result = crud.get_libraries_master_data(db=db, page=page, limit=limit, site_id=site_id, library_id=library_id, date_from=start, date_to=end, latest=latest, fields=fields, expand=expand)
+    return _rows_response(db, result, expand=expand)
 
 
 @router.post("/master/data/seed")
-def seed_library_master_data(
-    # library: schemas.LibraryCreate, db: Session = Depends(get_db)
+def seed_library_master_data(db: Session = Depends(get_db)):
+    return JSONResponse({ "result": seed_engine.seed(db, tables=["library_master_data"]) })
+# End :: library_data
+
+# Start :: reports
+@router.get("/reports/rollup", response_model=schemas.LibraryCostRollup)
+def get_cost_rollup(
+    site_id: Optional[int] = None, library_id: Optional[int] = None, vendor_id: Optional[int] = None,
+    group_by: str = ",".join(crud.ROLLUP_KEYS),
+    month_from: Optional[datetime.date] = Query(None, alias="from"),
+    month_to: Optional[datetime.date] = Query(None, alias="to"),
+    db: Session = Depends(get_db)
 ):
-    print(library_master_data_seed, len(library_master_data_seed))
-    result = []
-    for index in range(len(library_master_data_seed)):
-        id = None
-        row_data = {}
-        for key in library_master_data_seed[index].keys():
-            if key == 'id':
-                id = library_master_data_seed[index][key]
-            else:
-                row_data[key] = library_master_data_seed[index][key]
-        result.append(crud.create_or_update_library_master_data(db=get_db(), library_master_data=row_data, id=id))
-    return JSONResponse({ "result": jsonable_encoder(result) })
-# End :: library_data
\ No newline at end of file
+    """
+    Ledger spend (`entries`, `quantity`, `amount` = sum of quantity * price)
+    over the current, active revision of each entry.
+
+    Read from the `library_cost_rollups` table rather than the ledger, so the
+    cost depends on the number of site/library/vendor/month buckets, not on the
+    number of ledger rows. `group_by` picks the dimensions to keep (any of
+    `site_id,library_id,vendor_id,month`; empty for one grand total); `from`
+    and `to` select whole months, both inclusive.
+    """
+    keys = serialization.parse_fields(group_by, crud.ROLLUP_KEYS) or []
+    return serialization.result_response(crud.get_cost_rollups(
+        db=db, group_by=keys, site_id=site_id, library_id=library_id, vendor_id=vendor_id,
+        month_from=month_from, month_to=month_to
+    ))
+
+
+@router.post("/reports/rollup/reconcile")
+def reconcile_cost_rollup(date_from: Optional[datetime.date] = Query(None, alias="from")):
+    """
+    Recompute the cost rollups from the ledger (from the month of `from` on, or
+    entirely) and report how many rows had drifted. Celery beat also runs this
+    nightly. Falls back to running inline if Celery is unavailable.
+    """
+    kwargs = { "since": date_from.isoformat() if date_from else None }
+    try:
+        task = task_queue.enqueue_task("reconcile_ledger_rollups", kwargs=kwargs)
+        return JSONResponse({ "result": { "taskId": task.id } })
+    except Exception:
+        # Fallback: synchronous execution
+        from tasks.celery_ledger_tasks import run_rollup_reconcile
+        return JSONResponse({ "result": run_rollup_reconcile(**kwargs) })
+
+
+@router.get("/reports/balance/{site_id}/{vendor_id}")
+def get_vendor_balance(site_id: int, vendor_id: int, at: Optional[datetime.datetime] = None, db: Session = Depends(get_db)):
+    """
+    What the site owes the vendor: `charges` less credit-library `credits`,
+    over the current revision of each entry before `at` (default: all).
+
+    Starts from the latest month-end checkpoint and adds only the entries
+    after it; `checkpoint` is the `as_of` date of the checkpoint used.
+    """
+    return serialization.result_response(crud.get_vendor_balance(db=db, site_id=site_id, vendor_id=vendor_id, at=at))
+
+
+@router.get("/reports/statement/{site_id}/{vendor_id}")
+def get_vendor_statement(
+    site_id: int, vendor_id: int, limit: int = Query(200, ge=1, le=5000), after: Optional[str] = None,
+    date_from: Optional[datetime.date] = Query(None, alias="from"),
+    date_to: Optional[datetime.date] = Query(None, alias="to"),
+    db: Session = Depends(get_db)
+):
+    """
+    The site's statement with the vendor, oldest first: each entry with its
+    signed `amount` (credits negative) and the running `balance` after it.
+
+    `opening` is the balance brought forward into the page, from the latest
+    checkpoint before it, so neither the first page of a date range nor a deep
+    page (`after=<next>`) re-reads the vendor's earlier history.
+    """
+    start, end = date_range_bounds(date_from, date_to)
+    opening, rows, next_after = crud.get_vendor_statement(
+        db=db, site_id=site_id, vendor_id=vendor_id, date_from=start, date_to=end,
+        after=decode_cursor(after) if after else None, limit=limit
+    )
+    return serialization.result_response(rows, opening=opening, next=encode_cursor(*next_after) if next_after else None)
+
+
+@router.get("/reports/credit/{site_id}")
+def get_site_credit_deductions(
+    site_id: int, vendor_id: Optional[int] = None,
+    date_from: Optional[datetime.date] = Query(None, alias="from"),
+    date_to: Optional[datetime.date] = Query(None, alias="to"),
+    db: Session = Depends(get_db)
+):
+    """Credit Master deductions and net payment over the site's ledger entries (each entry one bill), as totals."""
+    start, end = date_range_bounds(date_from, date_to)
+    return serialization.result_response(credit_engine.compute_ledger(db, site_id, vendor_id=vendor_id, date_from=start, date_to=end))
+# End :: reports
+
+
+# Start :: credit
+@router.get("/credit/rules")
+def get_credit_rules(db: Session = Depends(get_db)):
+    """The Credit Master rules the deduction engine applies, in order."""
+    return serialization.result_response(credit_engine.get_engine(db).rules)
+
+
+@router.post("/credit/compute")
+async def compute_credit_deductions(request: Request, db: Session = Depends(get_db)):
+    """
+    Apply the Credit Master rules to a batch of bills.
+
+    Columnar in and out: the body is `{"gross": [...]}` (or `{"quantity":
+    [...], "price": [...]}`), optionally with a `ref` array that is echoed
+    back. The result has `gross`, one array per rule (EMD, Security, ...) and
+    `net`, index-aligned with the input, plus `totals` and the `rules` used.
+    """
+    body = await request.body()
+    # Parsing, the numpy work and serializing are CPU-bound; keep them off the event loop
+    return await run_in_threadpool(_compute_credit_deductions, db, body)
+
+
+def _compute_credit_deductions(db: Session, body: bytes):
+    try:
+        payload = orjson.loads(body)
+        gross = credit_engine.bills_from_payload(payload)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if gross.size > CREDIT_MAX_BILLS:
+        raise HTTPException(status_code=413, detail=f"At most {CREDIT_MAX_BILLS} bills per request")
+    engine = credit_engine.get_engine(db)
+    result = engine.compute(gross)
+    return serialization.result_response(
+        { "ref": payload.get("ref"), **result }, totals=credit_engine.totals(result), rules=engine.rules
+    )
+# End :: credit
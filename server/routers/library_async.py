@@ -0,0 +1,84 @@
+"""
+Async variants of the ledger routes in `routers/library.py`.
+
+Mounted under `/api/async` by `main.py` when ASYNC_DB=True, so both stacks
+can run side by side and be compared (see benchmarks/bench_async_routes.py).
+Parameters and responses match the sync routes.
+
+Only the ledger listing, history and single-row create are ported. Catalog,
+form, search, bulk, export, snapshot, seed, report and credit routes are
+served by the sync router alone.
+"""
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sql_app.library import async_crud, crud, schemas
+from sql_app.async_database import get_async_db
+from utils import serialization
+from utils.pagination import encode_cursor, decode_cursor, date_range_bounds
+import datetime
+
+
+router = APIRouter(
+    prefix="/library",
+    tags=["library-async"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+async def _rows_response(db: AsyncSession, rows, expand: list = None, **extra):
+    """Rows plus a `schemas` map with each form schema they reference, as in the sync routes."""
+    schemas = await async_crud.get_form_schemas(db, crud.info_hashes(rows))
+    if expand:
+        rows = serialization.expand_rows(rows, expand, crud.master_summary)
+    return serialization.result_response(rows, schemas=schemas, **extra)
+
+
+# Start :: library_data
+@router.post("/master/data", response_model=schemas.LibraryMasterData)
+async def create_library_master_data(
+    library_master_data: schemas.LibraryMasterDataCreateWithId, db: AsyncSession = Depends(get_async_db)
+):
+    library_master_data_dict = dict(library_master_data)
+    id = library_master_data_dict.pop("id", None)
+    try:
+        result = await async_crud.create_library_master_data(db=db, library_master_data=library_master_data_dict, id=id)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=f"Invalid ledger row: {exc}")
+    return JSONResponse({ "result": jsonable_encoder(result) })
+
+
+@router.get("/master/data/{id}/history", response_model=schemas.LibraryMasterData)
+async def get_library_master_data_history(id: int, db: AsyncSession = Depends(get_async_db)):
+    result = await async_crud.get_library_master_data_history(db=db, id=id)
+    if not result:
+        raise HTTPException(status_code=404, detail="Ledger row not found")
+    return await _rows_response(db, result)
+
+
+@router.get("/master/data/{site_id}/{library_id}", response_model=schemas.LibraryMasterData)
+async def get_libraries_master_data_filter(
+    site_id: int = None, library_id: int = None, page: int = 1, limit: int = 10,
+    cursor: bool = False, after: Optional[str] = None, latest: bool = False, fields: Optional[str] = None,
+    expand: Optional[str] = None,
+    date_from: Optional[datetime.date] = Query(None, alias="from"),
+    date_to: Optional[datetime.date] = Query(None, alias="to"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    start, end = date_range_bounds(date_from, date_to)
+    fields = serialization.parse_fields(fields, crud.LIBRARY_MASTER_DATA_FIELDS)
+    expand = serialization.parse_fields(expand, crud.LIBRARY_MASTER_DATA_EXPANSIONS, what="expansions")
+    if expand and fields:
+        raise HTTPException(status_code=400, detail="`expand` cannot be combined with `fields`")
+    if cursor or after:
+        result, next_after = await async_crud.get_libraries_master_data_after(
+            db=db, limit=limit, site_id=site_id, library_id=library_id,
+            after=decode_cursor(after) if after else None, date_from=start, date_to=end, latest=latest, fields=fields,
+            expand=expand
+        )
+        return await _rows_response(db, result, expand=expand, next=encode_cursor(*next_after) if next_after else None)
+    result = await async_crud.get_libraries_master_data(db=db, page=page, limit=limit, site_id=site_id, library_id=library_id, date_from=start, date_to=end, latest=latest, fields=fields, expand=expand)
+    return await _rows_response(db, result, expand=expand)
+# End :: library_data
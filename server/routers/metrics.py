@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+
+from utils import metrics
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"],
+)
+
+
+@router.get("")
+def get_metrics():
+    """Snapshot of all in-process metrics (cache hit rates, pool usage, ...)."""
+    return metrics.snapshot()
@@ -6,8 +6,9 @@ All send operations are enqueued to Celery for async processing.
 """
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
+from dependencies import require_admin
 from sql_app.database import get_db
 from sql_app.notifications import crud as notifications_crud
 from utils import notification_utils
@@ -31,6 +32,22 @@ class RegisterDeviceRequest(BaseModel):
     platform: Optional[str] = None
 
 
+class BroadcastFilter(BaseModel):
+    """Which users a broadcast reaches; fields combine with AND, and no filter means every active user."""
+    userIds: Optional[List[int]] = None
+    platform: Optional[str] = None
+    # Matched against users.misc by containment, e.g. {"site_id": 501}
+    misc: Optional[Dict[str, Any]] = None
+
+
+class BroadcastRequest(BaseModel):
+    """Request model for broadcasting a push notification."""
+    title: str
+    body: str
+    data: Optional[Dict[str, Any]] = None
+    filter: Optional[BroadcastFilter] = None
+
+
 @router.post("/notifications/register-device")
 def register_device(req: RegisterDeviceRequest, db=Depends(get_db)):
     """Register a device token for push notifications."""
@@ -89,3 +106,56 @@ def get_status(notification_id: int, db=Depends(get_db)):
         "notification_id": obj.notification_id, 
         "created_at": obj.created_at
     }
+
+
+@router.post("/notifications/broadcast", dependencies=[Depends(require_admin)])
+def broadcast_notification(req: BroadcastRequest, db=Depends(get_db)):
+    """
+    Send a push notification to every user matching the filter.
+
+    Records the broadcast and enqueues its planner, which streams the
+    matching device tokens and dispatches multicast batches of up to
+    FCM_MULTICAST_SIZE, in Celery groups, as they arrive. Admins only. Answers
+    503 (and marks the broadcast failed) if Celery is unavailable, rather than
+    fanning out to every token in this request. Track it with
+    GET /notifications/broadcast/{id}.
+    """
+    filters = {}
+    if req.filter:
+        filters = {
+            "user_ids": req.filter.userIds,
+            "platform": req.filter.platform,
+            "misc": req.filter.misc,
+        }
+        filters = {key: value for key, value in filters.items() if value}
+    broadcast = notifications_crud.create_broadcast(db, title=req.title, message=req.body, data=req.data, filters=filters)
+
+    try:
+        task_queue.enqueue_task("plan_notification_broadcast", args=(broadcast.id,))
+    except Exception:
+        notifications_crud.fail_broadcast(db, broadcast.id, "Task queue unavailable")
+        raise HTTPException(status_code=503, detail="Broadcasts are temporarily unavailable")
+
+    return {"success": True, "broadcastId": broadcast.id}
+
+
+@router.get("/notifications/broadcast/{broadcast_id}", dependencies=[Depends(require_admin)])
+def get_broadcast_status(broadcast_id: int, db=Depends(get_db)):
+    """Progress and aggregate results of a broadcast."""
+    obj = notifications_crud.get_broadcast(db, broadcast_id)
+    if not obj:
+        raise HTTPException(status_code=404, detail="broadcast not found")
+    return {
+        "id": obj.id,
+        "status": obj.status,
+        "filters": obj.filters,
+        "tokens": obj.tokens,
+        "batches": obj.batches,
+        "batches_done": obj.batches_done,
+        "sent": obj.sent,
+        "failed": obj.failed,
+        "progress": round(obj.batches_done / obj.batches, 4) if obj.batches else (1.0 if obj.status == "completed" else 0.0),
+        "error": obj.error,
+        "created_at": obj.created_at,
+        "finished_at": obj.finished_at,
+    }
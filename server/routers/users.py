@@ -6,8 +6,12 @@ from sql_app.database import get_db, engine
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils.jwt_helper import create_jwt_token, create_refresh_token, verify_jwt_token
-import requests
+from utils.jwt_helper import create_jwt_token, create_refresh_token
+from utils import auth_cache, google_auth
+from dependencies import current_user
+from utils.http_client import CircuitOpenError, get_client
+import httpx
+import logging
 from pydantic import BaseModel
 from typing import Optional
 
@@ -15,6 +19,8 @@ from utils.jwt_helper import create_jwt_token, create_refresh_token
 
 models.Base.metadata.create_all(bind=engine)
 
+logger = logging.getLogger("users")
+
 router = APIRouter(
     prefix="/users",
     tags=["users"],
@@ -85,13 +91,16 @@ def generate_token_response(db_user, mode: str):
 
 # Helper to verify Google ID token
 def verify_google_token(id_token: str):
-    # Google's tokeninfo endpoint
-    resp = requests.get(f"https://oauth2.googleapis.com/tokeninfo?id_token={id_token}")
-    if resp.status_code != 200:
+    # Checked locally against Google's cached signing keys (utils/google_auth.py)
+    try:
+        data = google_auth.verify_id_token(id_token)
+    except google_auth.InvalidGoogleToken as exc:
+        logger.info("Rejected Google token: %s", exc)
         return None
-    data = resp.json()
-    # Basic checks (audience, etc. can be added)
-    if 'email' not in data:
+    except google_auth.GoogleKeysUnavailable:
+        raise HTTPException(status_code=503, detail="Google sign-in is temporarily unavailable")
+    # The user is looked up by email, so it must be one Google has verified
+    if 'email' not in data or data.get("email_verified") is False:
         return None
     return data
 
@@ -152,13 +161,16 @@ def facebook_login(payload: FacebookLoginRequest, db: Session = Depends(get_db))
     access_token = payload.access_token
     user_data = payload.user_data
     # Verify the token is valid with Facebook
-    resp = requests.get(
-        "https://graph.facebook.com/me",
-        params={
-            "access_token": access_token,
-            "fields": "id"  # Minimal check, we already have user data
-        },
-    )
+    try:
+        resp = get_client("facebook").get(
+            "https://graph.facebook.com/me",
+            params={
+                "access_token": access_token,
+                "fields": "id"  # Minimal check, we already have user data
+            },
+        )
+    except (CircuitOpenError, httpx.HTTPError):
+        raise HTTPException(status_code=503, detail="Facebook login is temporarily unavailable")
     print("Facebook token verification response:", resp.status_code, resp.text)
     if resp.status_code != 200:
         raise HTTPException(status_code=401, detail="Invalid Facebook token")
@@ -229,6 +241,11 @@ def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     users = crud.get_users(db, skip=skip, limit=limit)
     return users
 
+# Current user endpoint; declared before /{user_id} so "me" is not parsed as an id
+@router.get("/me", response_model=schemas.User)
+def read_current_user(user: schemas.User = Depends(current_user)):
+    return user
+
 # Read single user endpoint
 @router.get("/{user_id}", response_model=schemas.User)
 def read_user(user_id: int, db: Session = Depends(get_db)):
@@ -242,7 +259,7 @@ def read_user(user_id: int, db: Session = Depends(get_db)):
 def refresh_token(payload: RefreshTokenRequest, db: Session = Depends(get_db)):
     try:
         # Verify the refresh token
-        token_data = verify_jwt_token(payload.refresh_token)
+        token_data = auth_cache.verify_token(payload.refresh_token)
         if not token_data:
             raise HTTPException(status_code=401, detail="Invalid refresh token")
         
@@ -252,7 +269,7 @@ def refresh_token(payload: RefreshTokenRequest, db: Session = Depends(get_db)):
         
         # Get the user
         user_id = int(token_data.get("sub"))
-        db_user = crud.get_user(db, user_id=user_id)
+        db_user = crud.get_user_cached(db, user_id=user_id)
         if not db_user:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -269,7 +286,7 @@ def verify_token(payload: VerifyTokenRequest, db: Session = Depends(get_db)):
     """
     token = payload.token
     # Verify JWT token
-    token_data = verify_jwt_token(token)
+    token_data = auth_cache.verify_token(token)
     if not token_data:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
@@ -280,7 +297,7 @@ def verify_token(payload: VerifyTokenRequest, db: Session = Depends(get_db)):
     if sub:
         try:
             user_id = int(sub)
-            db_user = crud.get_user(db, user_id=user_id)
+            db_user = crud.get_user_cached(db, user_id=user_id)
             if db_user:
                 result["user"] = db_user
         except Exception:
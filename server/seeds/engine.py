@@ -0,0 +1,54 @@
+"""
+Set-based seeding for the library tables.
+
+Each seed list is written with one `INSERT ... ON CONFLICT (id) DO UPDATE`
+statement and all lists passed to `seed` share one transaction, so a seed
+run costs a handful of round trips, either fully applies or not at all, and
+can be repeated safely.
+"""
+from typing import Dict, List
+
+from sqlalchemy.orm import Session
+
+from seeds.library import library, library_master, library_master_data
+from sql_app.library import crud, models
+from utils.catalog_cache import catalog_cache
+
+# Parents before children so foreign keys resolve inside the transaction
+SEED_TABLES = [
+    ("library", models.Library, library),
+    ("library_master", models.LibraryMaster, library_master),
+    ("library_master_data", models.LibraryMasterData, library_master_data),
+]
+
+
+def seed(db: Session, tables: List[str] = None) -> Dict[str, Dict[str, int]]:
+    """
+    Upsert the seed lists for `tables` (default: all) in one transaction.
+
+    Returns per-table counts of inserted and updated rows. The caller owns
+    (and closes) `db`.
+    """
+    summary = {}
+    try:
+        for name, model, rows in SEED_TABLES:
+            if tables is not None and name not in tables:
+                continue
+            written = crud.upsert_by_id(db, model, rows)
+            inserted = sum(1 for _, was_inserted in written if was_inserted)
+            summary[name] = {"inserted": inserted, "updated": len(written) - inserted}
+        db.commit()
+        if "library" in summary or "library_master" in summary:
+            catalog_cache.bump()
+    except Exception:
+        db.rollback()
+        raise
+    return summary
+
+
+if __name__ == "__main__":
+    from sql_app.database import SessionLocal, engine
+
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        print(seed(db))
@@ -0,0 +1,154 @@
+"""
+Synthetic data generator for load testing.
+
+Creates N sites, M vendors and K ledger rows on top of the regular seeds,
+with deterministic ids and values for a given `--seed` and `--end`, so
+re-running the same command converges on the same database instead of
+duplicating rows.
+
+Rows are generated lazily and written in `--batch-size` chunks through the
+same set-based upsert as the seeding engine, one transaction per chunk, so
+memory stays flat however many rows are requested.
+
+Usage (from the server directory):
+    python -m seeds.synthetic --sites 50 --vendors 500 --rows 1000000
+"""
+import argparse
+import datetime
+import random
+import time
+from typing import Iterator, List
+
+from seeds.libinfo import libinfo
+from seeds.library import library_master
+from sql_app.library import crud, models
+
+SITE_LIBRARY_ID = 6
+VENDOR_LIBRARY_ID = 7
+SITE_ID_BASE = 100_000
+VENDOR_ID_BASE = 200_000
+LEDGER_ID_BASE = 10_000_000
+
+CITIES = ["Gurugram", "Manesar", "Samhalka", "Rewari", "Faridabad", "Sonipat", "Panipat", "Karnal", "Hisar", "Rohtak"]
+
+
+def generate_sites(count: int, rng: random.Random) -> List[dict]:
+    return [
+        {
+            "id": SITE_ID_BASE + index,
+            "library_id": SITE_LIBRARY_ID,
+            "name": f"Site {index:05d}",
+            "variant": rng.choice(CITIES),
+            "status": "active",
+            "info": {"address": rng.choice(CITIES), "owner": f"Owner {index}", "phone": f"9{rng.randrange(10**9):09d}"},
+        }
+        for index in range(1, count + 1)
+    ]
+
+
+def generate_vendors(count: int, rng: random.Random) -> List[dict]:
+    return [
+        {
+            "id": VENDOR_ID_BASE + index,
+            "library_id": VENDOR_LIBRARY_ID,
+            "name": f"Vendor {index:05d} Traders",
+            "variant": rng.choice(CITIES),
+            "status": "active",
+            "info": {"address": rng.choice(CITIES), "owner": f"Proprietor {index}", "GST": f"06AAAC{rng.randrange(10**6):06d}Z"},
+        }
+        for index in range(1, count + 1)
+    ]
+
+
+def generate_ledger(count: int, site_ids: List[int], vendor_ids: List[int], end: datetime.date, days: int,
+                    with_form_info: bool, rng: random.Random) -> Iterator[dict]:
+    """Yield `count` ledger rows spread uniformly over the `days` days before `end`."""
+    materials = [row for row in library_master if row["library_id"] in (1, 2, 3, 4)]
+    end = datetime.datetime.combine(end, datetime.time.min)
+    span = days * 24 * 3600
+    info = libinfo["simple"] if with_form_info else {}
+    for index in range(count):
+        material = rng.choice(materials)
+        yield {
+            "id": LEDGER_ID_BASE + index,
+            "quantity": round(rng.uniform(1, 500), 2),
+            "price": round(rng.uniform(10, 5000), 2),
+            "createdon": end - datetime.timedelta(seconds=rng.randrange(span)),
+            "version": 1,
+            "parent_id": 0,
+            "info": info,
+            "misc": {},
+            "status": "active",
+            "site_id": rng.choice(site_ids),
+            "vendor_id": rng.choice(vendor_ids),
+            "library_id": material["library_id"],
+            "library_master_id": material["id"],
+        }
+
+
+def chunked(rows: Iterator[dict], size: int) -> Iterator[List[dict]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def populate(db_factory, sites: int, vendors: int, rows: int, end: datetime.date = None, days: int = 730,
+             batch_size: int = 5000, with_form_info: bool = False, seed: int = 42):
+    end = end or datetime.date.today()
+    rng = random.Random(seed)
+    site_rows = generate_sites(sites, rng)
+    vendor_rows = generate_vendors(vendors, rng)
+
+    db = db_factory()
+    try:
+        for chunk in chunked(iter(site_rows + vendor_rows), batch_size):
+            crud.upsert_by_id(db, models.LibraryMaster, chunk)
+        db.commit()
+    finally:
+        db.close()
+
+    site_ids = [row["id"] for row in site_rows]
+    vendor_ids = [row["id"] for row in vendor_rows]
+    written = 0
+    started = time.perf_counter()
+    for chunk in chunked(generate_ledger(rows, site_ids, vendor_ids, end, days, with_form_info, rng), batch_size):
+        db = db_factory()
+        try:
+            crud.upsert_by_id(db, models.LibraryMasterData, chunk)
+            db.commit()
+        finally:
+            db.close()
+        written += len(chunk)
+        elapsed = time.perf_counter() - started
+        print(f"ledger rows: {written}/{rows} ({written / elapsed:.0f} rows/s)", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sites", type=int, default=10)
+    parser.add_argument("--vendors", type=int, default=100)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--end", type=datetime.date.fromisoformat, default=datetime.date.today(), help="YYYY-MM-DD, defaults to today")
+    parser.add_argument("--days", type=int, default=730, help="spread createdon over this many days before --end")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--with-form-info", action="store_true", help="copy the form schema into every row's info, like the seeds do")
+    parser.add_argument("--seed", type=int, default=42, help="random seed; the same seed regenerates the same data")
+    args = parser.parse_args()
+
+    from seeds import engine as seed_engine
+    from sql_app.database import SessionLocal, engine
+
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        print(seed_engine.seed(db, tables=["library", "library_master"]))
+    populate(SessionLocal, args.sites, args.vendors, args.rows, end=args.end, days=args.days, batch_size=args.batch_size,
+             with_form_info=args.with_form_info, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Opt-in async database stack (SQLAlchemy asyncio + asyncpg).
+
+Used by `routers/library_async.py` (the ledger listing, history and create
+routes only), which `main.py` mounts only when ASYNC_DB=True. Async handlers release the event loop while they wait on
+Postgres, so a single worker can keep many more requests in flight than the
+threadpool-bound sync routes allow.
+
+The URL defaults to RDS_URL with the driver swapped for asyncpg; set
+ASYNC_RDS_URL to override it (e.g. when RDS_URL carries psycopg2-only query
+options such as `sslmode`).
+"""
+import os
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from sql_app.database import SQLALCHEMY_DATABASE_URL, engine
+from utils import metrics
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_RDS_URL") or make_url(SQLALCHEMY_DATABASE_URL).set(drivername="postgresql+asyncpg")
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=engine.echo,
+    pool_size=int(os.getenv("ASYNC_DB_POOL_SIZE", "20")),
+    max_overflow=int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "0")),
+)
+# Rows are serialized after the session closes, so keep them loaded after commit
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+
+def pool_stats() -> dict:
+    pool = async_engine.sync_engine.pool
+    return {"pool_size": pool.size(), "checked_out": pool.checkedout(), "checked_in": pool.checkedin(), "overflow": pool.overflow()}
+
+
+metrics.register("async_db_pool", pool_stats)
+
+
+# Dependency
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,17 +1,18 @@
+import logging
+
 from sqlalchemy.orm import Session
-from pprint import pprint
 from . import models, schemas
 
+logger = logging.getLogger("documents")
+
 
 def get_documents(db: Session, skip: int = 0, limit: int = 100):
     db_result = db.query(models.Document).offset(skip).limit(limit).all()
-    db.close()
     return db_result
 
 
 def get_document_by_name(db: Session, name: str):
     db_result = db.query(models.Document).filter(models.Document.name == name).first()
-    db.close()
     return db_result
 
 
@@ -21,7 +22,6 @@ def create_user_document(db: Session, document: schemas.DocumentCreate):
     db.add(db_document)
     db.commit()
     db.refresh(db_document)
-    db.close()
     return db_document
 
 
@@ -32,17 +32,15 @@ def create_document_chunck(db: Session, document_chunck: schemas.DocumentChunckC
         db.add(db_document_chunck)
         db.commit()
         db.refresh(db_document_chunck)
-        db.close()
         return db_document_chunck
-    except Exception as e:
-        print(db.error)
-        print(str(e))
-        db.close()
+    except Exception:
+        logger.exception("Error creating document chunck for document %s", document_id)
+        db.rollback()
+        raise
 
 
 def get_document_chuncks(db: Session, skip: int = 0, limit: int = 100):
     db_result = db.query(models.DocumentChunck).offset(skip).limit(limit).all()
-    db.close()
     return db_result
 
 
@@ -50,17 +48,14 @@ def create_document_summary(db: Session, document_summary: schemas.DocumentSumma
     try:
         document_summary = dict(document_summary)
         db_document_summary = models.DocumentSummary(**document_summary, document_id=document_id)
-        print('db_document_summary', db_document_summary)
-        pprint(vars(db_document_summary))
         db.add(db_document_summary)
         db.commit()
         db.refresh(db_document_summary)
-        db.close()
         return db_document_summary
-    except Exception as e:
-        print(db.error)
-        print(str(e))
-        db.close()
+    except Exception:
+        logger.exception("Error creating document summary for document %s", document_id)
+        db.rollback()
+        raise
 
 
 def create_document_qna(db: Session, document_qna: schemas.DocumentQnaCreate, document_id: int):
@@ -70,10 +65,9 @@ def create_document_qna(db: Session, document_qna: schemas.DocumentQnaCreate, do
         db.add(db_document_qna)
         db.commit()
         db.refresh(db_document_qna)
-        db.close()
         return db_document_qna
-    except Exception as e:
-        print(db.error)
-        print(str(e))
-        db.close()
+    except Exception:
+        logger.exception("Error creating document qna for document %s", document_id)
+        db.rollback()
+        raise
 
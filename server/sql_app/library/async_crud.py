@@ -0,0 +1,96 @@
+"""
+Async counterparts of the ledger functions in `crud.py`, for `AsyncSession`:
+listing (offset and keyset), history and single-row create/update. The
+catalog, bulk and report functions have no async version.
+
+Statements and filters are built by the shared helpers in `crud.py`, so both
+paths return the same rows. `get_async_db` owns the session.
+"""
+import datetime
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud, models
+
+
+# Start :: form_schemas
+async def get_form_schemas(db: AsyncSession, hashes) -> dict:
+    found, missing = crud.cached_form_schemas(hashes)
+    if missing:
+        loaded = dict((await db.execute(crud.form_schemas_select(missing))).all())
+        crud.cache_form_schemas(loaded)
+        found.update(loaded)
+    return found
+# End :: form_schemas
+
+
+# Start :: library_master_data
+async def get_libraries_master_data(db: AsyncSession, page: int = 1, limit: int = 200, site_id: int = None, library_id: int = None, date_from: datetime.datetime = None, date_to: datetime.datetime = None, latest: bool = False, fields: list = None, expand: list = None):
+    stmt = (
+        crud.library_master_data_select(fields, expand=expand)
+        .where(*crud.library_master_data_filters(site_id, library_id, date_from, date_to, latest))
+        .offset((page - 1) * limit)
+        .limit(limit)
+    )
+    return crud.fetch_rows(await db.execute(stmt), fields)
+
+
+async def get_libraries_master_data_after(db: AsyncSession, limit: int = 200, site_id: int = None, library_id: int = None, after: tuple = None, date_from: datetime.datetime = None, date_to: datetime.datetime = None, latest: bool = False, fields: list = None, expand: list = None):
+    stmt = crud.library_master_data_keyset_select(limit, site_id, library_id, after, date_from, date_to, latest, fields, expand)
+    return crud.split_keyset_page(crud.fetch_rows(await db.execute(stmt), fields), limit)
+
+
+async def get_library_master_data_by_id(db: AsyncSession, id: int):
+    return await db.get(models.LibraryMasterData, id)
+
+
+async def get_library_master_data_history(db: AsyncSession, id: int):
+    return (await db.execute(crud.library_master_data_history_select(id))).scalars().all()
+
+
+async def create_library_master_data(db: AsyncSession, library_master_data: dict, id: int = None):
+    """Update row `id` in place if it exists, otherwise insert it; either way its parent revision is retired."""
+    library_master_data = crud.bind_values(models.LibraryMasterData, library_master_data)
+    [library_master_data], found = crud.split_form_schemas([library_master_data])
+    stmt = crud.form_schemas_insert(found)
+    if stmt is not None:
+        await db.execute(stmt)
+    db_data = await db.get(models.LibraryMasterData, id) if id is not None else None
+    keys = set()
+    if db_data:
+        keys = await _rollup_keys(db, [id])
+        for key, value in library_master_data.items():
+            setattr(db_data, key, value)
+    else:
+        library_master_data["id"] = id
+        db_data = models.LibraryMasterData(**library_master_data)
+        db.add(db_data)
+    stmt = crud.retire_parents_update([library_master_data.get("parent_id")])
+    if stmt is not None:
+        await db.execute(stmt)
+    await db.flush()
+    await _refresh_rollups(db, keys | await _rollup_keys(db, [db_data.id, library_master_data.get("parent_id")]))
+    await db.commit()
+    return db_data
+# End :: library_master_data
+
+
+# Start :: library_cost_rollups
+async def _rollup_keys(db: AsyncSession, ids) -> set:
+    stmt = crud.rollup_keys_select(ids)
+    return set() if stmt is None else {tuple(row) for row in await db.execute(stmt)}
+
+
+async def _refresh_rollups(db: AsyncSession, keys: set):
+    """See `crud._refresh_rollups`."""
+    if not keys:
+        return
+    written = {tuple(row) for row in await db.execute(crud.rollup_refresh_upsert(keys))}
+    stmt = crud.rollup_delete(keys - written)
+    if stmt is not None:
+        await db.execute(stmt)
+    pairs = crud.balance_snapshot_pairs(keys)
+    if pairs:
+        written = {tuple(row) for row in await db.execute(crud.balance_snapshots_refresh_upsert(pairs))}
+        await db.execute(crud.balance_snapshots_stale_delete(pairs, written))
+# End :: library_cost_rollups
@@ -1,45 +1,153 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import Date, Integer, Numeric, bindparam, case, cast, delete, func, literal, literal_column, select, text, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, joinedload, selectinload
 from pprint import pprint
+import datetime
+import hashlib
+import json
+import os
+from utils.catalog_cache import catalog_cache
 from . import models, schemas
 
+# Guards the ancestor walk against parent_id cycles
+HISTORY_MAX_DEPTH = 1000
+# Column names accepted by the ledger listings' `fields=` projection
+LIBRARY_MASTER_DATA_FIELDS = tuple(models.LibraryMasterData.__table__.c.keys())
+# Relationships the ledger listings' `expand=` can inline (all to-one `library_master` rows)
+LIBRARY_MASTER_DATA_EXPANSIONS = ("site_master", "vendor_master", "library_master")
+# The libraries whose `library_master` rows are the sites and the vendors
+SITE_LIBRARY_ID = int(os.getenv("SITE_LIBRARY_ID", "6"))
+VENDOR_LIBRARY_ID = int(os.getenv("VENDOR_LIBRARY_ID", "7"))
+
+
+# Start :: form_schemas
+# Content-addressed, so cached entries can never go stale
+_form_schema_cache = {}
+FORM_SCHEMA_CACHE_SIZE = 1024
+
+
+def is_form_schema(info) -> bool:
+    return isinstance(info, dict) and "formElements" in info
+
+
+def form_schema_hash(schema: dict) -> str:
+    canonical = json.dumps(schema, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def split_form_schemas(rows: list):
+    """
+    Copies of `rows` with form-schema `info` blobs replaced by `info_hash`.
+
+    Every row that carries `info` gets `info_hash` (None when `info` is not a
+    form schema, so an update clears a stale reference). Returns
+    `(rows, {hash: schema})`.
+    """
+    found = {}
+    result = []
+    for row in rows:
+        row = dict(row)
+        if "info" in row:
+            info = row["info"]
+            if is_form_schema(info):
+                row["info_hash"] = form_schema_hash(info)
+                row["info"] = None
+                found[row["info_hash"]] = info
+            else:
+                row["info_hash"] = None
+        result.append(row)
+    return result, found
+
+
+def form_schemas_insert(found: dict):
+    """`INSERT ... ON CONFLICT DO NOTHING` for the schemas returned by `split_form_schemas`, or None."""
+    if not found:
+        return None
+    return (
+        pg_insert(models.FormSchema)
+        .values([{"hash": hash, "schema": schema} for hash, schema in found.items()])
+        .on_conflict_do_nothing(index_elements=[models.FormSchema.hash])
+    )
+
+
+def store_form_schemas(db: Session, rows: list) -> list:
+    """Store the form schemas found in `rows` and return the rows referencing them by hash. Does not commit."""
+    rows, found = split_form_schemas(rows)
+    stmt = form_schemas_insert(found)
+    if stmt is not None:
+        db.execute(stmt)
+    return rows
+
+
+def info_hashes(rows) -> set:
+    return {hash for hash in (getattr(row, "info_hash", None) for row in rows) if hash}
+
+
+def cached_form_schemas(hashes):
+    """Split `hashes` into `({hash: schema} already cached, [hashes to load])`."""
+    found = {hash: _form_schema_cache[hash] for hash in hashes if hash in _form_schema_cache}
+    return found, [hash for hash in hashes if hash not in found]
+
+
+def cache_form_schemas(loaded: dict):
+    if len(_form_schema_cache) + len(loaded) > FORM_SCHEMA_CACHE_SIZE:
+        _form_schema_cache.clear()
+    _form_schema_cache.update(loaded)
+
+
+def form_schemas_select(hashes):
+    return select(models.FormSchema.hash, models.FormSchema.schema).where(models.FormSchema.hash.in_(hashes))
+
+
+def get_form_schemas(db: Session, hashes) -> dict:
+    """`{hash: schema}` for `hashes`, from the in-process cache where possible."""
+    found, missing = cached_form_schemas(hashes)
+    if missing:
+        loaded = dict(db.execute(form_schemas_select(missing)).all())
+        cache_form_schemas(loaded)
+        found.update(loaded)
+    return found
+
+
+def get_form_schema(db: Session, hash: str):
+    return get_form_schemas(db, [hash]).get(hash)
+# End :: form_schemas
+
 
 # Start :: library
 def get_libraries(db: Session, skip: int = 0, limit: int = 100):
     db_result = db.query(models.Library).offset(skip).limit(limit).all()
-    db.close()
     return db_result
 
 
 def get_library_by_name(db: Session, name: str):
     db_result = db.query(models.Library).filter(models.Library.name == name).first()
-    db.close()
     return db_result
 
 
 def get_library_by_id(db: Session, id: int):
     db_result = db.query(models.Library).get(id)
-    db.close()
     return db_result
     # return db.query(models.Library).filter(models.Library.id == id).first()
 
 
 def create_library(db: Session, library: schemas.LibraryCreate):
-    library = dict(library)
+    [library] = store_form_schemas(db, [dict(library)])
     db_library = models.Library(**library)
     db.add(db_library)
     db.commit()
+    catalog_cache.bump()
     db.refresh(db_library)
-    db.close()
     return db_library
 
 
 def create_library_with_id(db: Session, library: schemas.LibraryCreateWithId):
-    library = dict(library)
+    [library] = store_form_schemas(db, [dict(library)])
     db_library = models.Library(**library)
     db.add(db_library)
     db.commit()
+    catalog_cache.bump()
     db.refresh(db_library)
-    db.close()
     return db_library
 
 
@@ -47,26 +155,85 @@ def create_or_update_library(db: Session, library: schemas.LibraryCreate, id: in
     db_data = get_library_by_id(db, id)
     if db_data:
         db_data = db.query(models.Library).filter(models.Library.id == id)
-        db_data.update(library)
+        db_data.update(store_form_schemas(db, [library])[0])
         db.commit()
-        db.close()
+        catalog_cache.bump()
         return { id: id, **library }
     else:
         library["id"] = id
         return create_library_with_id(db, library)
+
+
+def form_option_libraries(library_id: int) -> dict:
+    """Form dropdown name -> the library whose `library_master` rows are its options."""
+    return { "site_id": SITE_LIBRARY_ID, "vendor_id": VENDOR_LIBRARY_ID, "library_master_id": library_id }
+
+
+def form_option(row: models.LibraryMaster) -> dict:
+    return { "key": row.id, "value": row.name, "variant": row.variant }
+
+
+def get_library_form(db: Session, library_id: int, site_id: int = None):
+    """
+    The library's form schema with the options of every dropdown filled in
+    and the hidden `library_id`/`site_id` inputs prefilled, or None when the
+    library, its form or the site does not exist.
+
+    The library and the option libraries are loaded with one `IN` query, and
+    their active `library_master` rows with one `selectinload` query.
+    Dropdowns that already carry static `options` are left as they are.
+    """
+    sources = form_option_libraries(library_id)
+    libraries = db.scalars(
+        select(models.Library)
+        .where(models.Library.id.in_({library_id, *sources.values()}))
+        .options(selectinload(models.Library.master))
+    ).all()
+    by_id = {library.id: library for library in libraries}
+    library = by_id.get(library_id)
+    if library is None:
+        return None
+    schema = library.info if is_form_schema(library.info) else get_form_schema(db, library.info_hash) if library.info_hash else None
+    if not is_form_schema(schema):
+        return None
+    site = None
+    if site_id is not None:
+        sites = by_id.get(SITE_LIBRARY_ID)
+        site = next((row for row in sites.master if row.id == site_id), None) if sites else None
+        if site is None:
+            return None
+
+    elements = []
+    for element in schema["formElements"]:
+        # Copy, the schema itself is shared through the form-schema cache
+        element = dict(element)
+        name = element.get("name")
+        if element.get("element") == "dropdown" and "options" not in element and name in sources:
+            source = by_id.get(sources[name])
+            rows = [row for row in source.master if row.status == "active"] if source else []
+            rows.sort(key=lambda row: ((row.name or "").lower(), row.variant or "", row.id))
+            element["options"] = [form_option(row) for row in rows]
+        if name == "library_id":
+            element["value"] = library_id
+        elif name == "site_id" and site_id is not None:
+            element["value"] = site_id
+        elements.append(element)
+    return {
+        "library": { "id": library.id, "name": library.name, "type": library.type },
+        "site": form_option(site) if site else None,
+        "form": { **schema, "formElements": elements },
+    }
 # End :: library
 
 
 # Start :: library_master
 def get_libraries_master(db: Session, skip: int = 0, limit: int = 200):
     db_result = db.query(models.LibraryMaster).offset(skip).limit(limit).all()
-    db.close()
     return db_result
 
 
 def get_library_master_by_id(db: Session, id: int):
     db_result = db.query(models.LibraryMaster).get(id)
-    db.close()
     return db_result
     # return db.query(models.LibraryMaster).filter(models.LibraryMaster.id == id)
 
@@ -76,8 +243,8 @@ def create_library_master(db: Session, library_master: schemas.LibraryMasterCrea
     db_library_master = models.LibraryMaster(**library_master)
     db.add(db_library_master)
     db.commit()
+    catalog_cache.bump()
     db.refresh(db_library_master)
-    db.close()
     return db_library_master
 
 
@@ -86,8 +253,8 @@ def create_library_master_with_id(db: Session, library_master: schemas.LibraryMa
     db_library_master = models.LibraryMaster(**library_master)
     db.add(db_library_master)
     db.commit()
+    catalog_cache.bump()
     db.refresh(db_library_master)
-    db.close()
     return db_library_master
 
 
@@ -97,7 +264,7 @@ def create_or_update_library_master(db: Session, library_master: schemas.Library
         db_data = db.query(models.LibraryMaster).filter(models.LibraryMaster.id == id)
         db_data.update(library_master)
         db.commit()
-        db.close()
+        catalog_cache.bump()
         return { id: id, **library_master }
     else:
         library_master["id"] = id
@@ -106,34 +273,238 @@ def create_or_update_library_master(db: Session, library_master: schemas.Library
 
 
 # Start :: library_master_data
-def get_libraries_master_data(db: Session, page: int = 0, limit: int = 200, site_id: int = None, library_id: int = None):
+def bind_values(model, values: dict) -> dict:
+    """
+    `values` converted to the Python types of `model`'s columns. psycopg2 sends
+    strings for Postgres to cast, but asyncpg only binds exact types, so
+    `"site_id": "501"` or an ISO `createdon` would fail on the async path; on
+    either path a value Postgres cannot cast fails the whole statement. Aware
+    datetimes become naive UTC, as Postgres stores them in a `timestamp`
+    column (the database runs in UTC). Raises ValueError for values that do
+    not convert.
+    """
+    columns = model.__table__.columns
+    values = dict(values)
+    for key, value in values.items():
+        column = columns.get(key)
+        if column is None or value is None:
+            continue
+        python_type = column.type.python_type
+        if python_type is datetime.datetime:
+            if isinstance(value, str):
+                value = datetime.datetime.fromisoformat(value)
+            if not isinstance(value, datetime.datetime):
+                raise ValueError(f"{key}: expected a datetime, got {value!r}")
+            if value.tzinfo is not None:
+                value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        elif python_type in (int, float) and isinstance(value, (str, int, float)) and type(value) is not python_type:
+            try:
+                value = python_type(value)
+            except ValueError:
+                raise ValueError(f"{key}: expected {python_type.__name__}, got {value!r}")
+        values[key] = value
+    return values
+
+
+def get_libraries_master_data(db: Session, page: int = 1, limit: int = 200, site_id: int = None, library_id: int = None, date_from: datetime.datetime = None, date_to: datetime.datetime = None, latest: bool = False, fields: list = None, expand: list = None):
     skip = (page - 1) * limit
-    filter_by = {}
+    stmt = (
+        library_master_data_select(fields, expand=expand)
+        .where(*library_master_data_filters(site_id, library_id, date_from, date_to, latest))
+        .offset(skip)
+        .limit(limit)
+    )
+    return fetch_rows(db.execute(stmt), fields)
+
+
+def get_libraries_master_data_after(db: Session, limit: int = 200, site_id: int = None, library_id: int = None, after: tuple = None, date_from: datetime.datetime = None, date_to: datetime.datetime = None, latest: bool = False, fields: list = None, expand: list = None):
+    """
+    Keyset page of ledger rows, newest first.
+
+    `after` is the `(createdon, id)` of the last row of the previous page. The
+    row-value comparison lets Postgres seek straight into the
+    `(site_id, library_id, createdon, id)` index instead of walking and
+    discarding `OFFSET` rows, so deep pages cost the same as the first one.
+    Returns `(rows, next_after)` where `next_after` is None on the last page.
+    """
+    # Fetch one extra row to learn whether another page exists
+    stmt = library_master_data_keyset_select(limit, site_id, library_id, after, date_from, date_to, latest, fields, expand)
+    return split_keyset_page(fetch_rows(db.execute(stmt), fields), limit)
+
+
+def library_master_data_select(fields: list = None, *required: str, expand: list = None):
+    """
+    `select()` of ledger rows, shared with `async_crud`.
+
+    Without `fields` this selects whole `LibraryMasterData` entities. With
+    `fields` it is a Core select of just those columns (plus `id` and any
+    `required` ones), so the JSON `info`/`misc` blobs are not fetched unless
+    asked for and rows come back as plain tuples, outside the identity map.
+
+    `expand` names relationships (LIBRARY_MASTER_DATA_EXPANSIONS) to load
+    with the entities; it does not apply to projections.
+    """
+    if not fields:
+        return select(models.LibraryMasterData).options(*library_master_data_expand_options(expand))
+    columns = models.LibraryMasterData.__table__.c
+    keys = dict.fromkeys(["id", *required, *fields])
+    return select(*(columns[key] for key in keys))
+
+
+def library_master_data_expand_options(expand: list = None) -> list:
+    """
+    Loader options for `expand`: each to-one `library_master` relationship is
+    LEFT OUTER JOINed into the page's own query (`joinedload`), reading only
+    `id`, `name` and `variant`. A page therefore costs one query however many
+    rows and relationships it has, and LIMIT/OFFSET still apply to ledger rows
+    since to-one joins never multiply them.
+    """
+    Data, Master = models.LibraryMasterData, models.LibraryMaster
+    return [
+        joinedload(getattr(Data, name)).load_only(Master.id, Master.name, Master.variant)
+        for name in expand or ()
+    ]
+
+
+def master_summary(row: models.LibraryMaster) -> dict:
+    """What `expand=` inlines for a related `library_master` row; only columns the expand options load."""
+    return { "id": row.id, "name": row.name, "variant": row.variant }
+
+
+def fetch_rows(result, fields: list = None) -> list:
+    """Rows of a `library_master_data_select(fields)` result: entities, or Core rows for a projection."""
+    return result.all() if fields else result.scalars().all()
+
+
+def library_master_data_keyset_select(limit: int, site_id=None, library_id=None, after: tuple = None, date_from: datetime.datetime = None, date_to: datetime.datetime = None, latest: bool = False, fields: list = None, expand: list = None):
+    Data = models.LibraryMasterData
+    # `createdon` and `id` build the next cursor, so projections always carry them
+    stmt = library_master_data_select(fields, "createdon", expand=expand).where(*library_master_data_filters(site_id, library_id, date_from, date_to, latest))
+    if after:
+        stmt = stmt.where(tuple_(Data.createdon, Data.id) < tuple_(*after))
+    return stmt.order_by(Data.createdon.desc(), Data.id.desc()).limit(limit + 1)
+
+
+def library_master_data_filters(site_id=None, library_id=None, date_from: datetime.datetime = None, date_to: datetime.datetime = None, latest: bool = False) -> list:
+    """WHERE clauses for the ledger listings, shared with `async_crud`."""
+    Data = models.LibraryMasterData
+    filters = []
     if site_id:
-        filter_by["site_id"] = site_id
+        filters.append(Data.site_id == site_id)
     if library_id:
-        filter_by["library_id"] = library_id
-    # print(filter_by)
-    db_result = db.query(models.LibraryMasterData).filter_by(**filter_by).offset(skip).limit(limit).all()
-    db.close()
+        filters.append(Data.library_id == library_id)
+    if date_from:
+        filters.append(Data.createdon >= date_from)
+    if date_to:
+        filters.append(Data.createdon < date_to)
+    if latest:
+        filters.extend(_current_filter())
+    return filters
+
+
+def split_keyset_page(rows: list, limit: int):
+    """Trim a `limit + 1` fetch to `(rows, next_after)`; `next_after` is None on the last page."""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, (rows[-1].createdon, rows[-1].id)
+    return rows, None
+
+
+def stream_library_master_data(db: Session, site_id: int = None, date_from: datetime.datetime = None, date_to: datetime.datetime = None, batch_size: int = 1000):
+    """
+    Yield batches of ledger rows (as mappings) from a server-side cursor.
+
+    `yield_per` makes psycopg2 use a named cursor, so only `batch_size` rows
+    are held in memory at a time however large the site's ledger is. Plain
+    Core rows are used, so nothing accumulates in the session identity map.
+    The caller owns `db` and must keep it open until the generator finishes.
+    """
+    table = models.LibraryMasterData.__table__
+    stmt = select(table)
+    if site_id:
+        stmt = stmt.where(table.c.site_id == site_id)
+    if date_from:
+        stmt = stmt.where(table.c.createdon >= date_from)
+    if date_to:
+        stmt = stmt.where(table.c.createdon < date_to)
+    stmt = stmt.order_by(table.c.createdon, table.c.id)
+    result = db.execute(stmt, execution_options={"yield_per": batch_size})
+    for partition in result.mappings().partitions():
+        yield partition
+
+
+def _current_filter():
+    """Matches the latest active revision of each ledger entry (the predicate of the partial index)."""
+    return (models.LibraryMasterData.is_current.is_(True), models.LibraryMasterData.status == "active")
+
+
+def get_library_master_data_history(db: Session, id: int):
+    """
+    Every revision in the `parent_id` chain that `id` belongs to, oldest first.
+
+    One recursive CTE walks up from `id` to the root revision, a second walks
+    down from the root through all children, so the cost is one round trip
+    however many hops the chain has.
+    """
+    db_result = db.execute(library_master_data_history_select(id)).scalars().all()
     return db_result
 
 
+def library_master_data_history_select(id: int):
+    Data = models.LibraryMasterData
+    ancestors = select(Data.id, Data.parent_id, literal(0).label("depth")).where(Data.id == id).cte("ancestors", recursive=True)
+    ancestors = ancestors.union_all(
+        select(Data.id, Data.parent_id, ancestors.c.depth + 1)
+        .join(ancestors, Data.id == ancestors.c.parent_id)
+        .where(ancestors.c.depth < HISTORY_MAX_DEPTH)
+    )
+    root = select(ancestors.c.id).order_by(ancestors.c.depth.desc()).limit(1).cte("root")
+    chain = select(root.c.id).cte("chain", recursive=True)
+    chain = chain.union(select(Data.id).join(chain, Data.parent_id == chain.c.id))
+    return select(Data).join(chain, Data.id == chain.c.id).order_by(Data.version, Data.createdon, Data.id)
+
+
+def _retire_parents(db: Session, parent_ids):
+    """Clear `is_current` on rows that have just been superseded by a new revision."""
+    stmt = retire_parents_update(parent_ids)
+    if stmt is not None:
+        db.execute(stmt)
+
+
+def retire_parents_update(parent_ids):
+    """The UPDATE behind `_retire_parents`, or None when there is nothing to retire."""
+    parent_ids = {parent_id for parent_id in parent_ids if parent_id}
+    if not parent_ids:
+        return None
+    return (
+        update(models.LibraryMasterData)
+        .where(models.LibraryMasterData.id.in_(parent_ids), models.LibraryMasterData.is_current.is_(True))
+        .values(is_current=False)
+    )
+
+
 def get_library_master_data_by_id(db: Session, id: int):
     db_result = db.query(models.LibraryMasterData).get(id)
-    db.close()
     return db_result
     # return db.query(models.LibraryMaster).filter(models.LibraryMaster.id == id)
 
 
+def _update_library_master_data(db: Session, id: int, library_master_data: dict):
+    """Update row `id` in place, retiring the parent it names like an insert would. Commits."""
+    keys = _rollup_keys(db, [id])
+    db_data = db.query(models.LibraryMasterData).filter(models.LibraryMasterData.id == id)
+    db_data.update(store_form_schemas(db, [library_master_data])[0])
+    parent_id = library_master_data.get("parent_id")
+    _retire_parents(db, [parent_id])
+    _refresh_rollups(db, keys | _rollup_keys(db, [id, parent_id]))
+    db.commit()
+
+
 def create_library_master_data(db: Session, library_master_data: schemas.LibraryMasterDataCreate, id: int):
     db_data = get_library_master_data_by_id(db, id)
     library_master_data = dict(library_master_data)
     if db_data:
-        db_data = db.query(models.LibraryMasterData).filter(models.LibraryMasterData.id == id)
-        db_data.update(library_master_data)
-        db.commit()
-        db.close()
+        _update_library_master_data(db, id, library_master_data)
         return { id: id, **library_master_data }
     else:
         library_master_data["id"] = id
@@ -141,25 +512,529 @@ def create_library_master_data(db: Session, library_master_data: schemas.Library
 
 
 def create_library_master_data_with_id(db: Session, library_master_data: schemas.LibraryMasterDataCreateWithId):
-    library_master_data = dict(library_master_data)
+    [library_master_data] = store_form_schemas(db, [dict(library_master_data)])
     db_library_master_data = models.LibraryMasterData(**library_master_data)
     db.add(db_library_master_data)
+    _retire_parents(db, [library_master_data.get("parent_id")])
+    db.flush()
+    _refresh_rollups(db, _rollup_keys(db, [db_library_master_data.id, library_master_data.get("parent_id")]))
     db.commit()
     db.refresh(db_library_master_data)
-    db.close()
     return db_library_master_data
 
 
 def create_or_update_library_master_data(db: Session, library_master_data: schemas.LibraryMasterDataCreate, id: int):
     db_data = get_library_master_data_by_id(db, id)
     if db_data:
-        db_data = db.query(models.LibraryMasterData).filter(models.LibraryMasterData.id == id)
-        db_data.update(library_master_data)
-        db.commit()
-        db.close()
+        _update_library_master_data(db, id, library_master_data)
         return { id: id, **library_master_data }
     else:
         library_master_data["id"] = id
         return create_library_master_data_with_id(db, library_master_data)
+
+
+def bulk_upsert_library_master_data(db: Session, rows: list):
+    """
+    Write a batch of ledger rows in one transaction.
+
+    Rows carrying an `id` go through a single `INSERT ... ON CONFLICT (id) DO
+    UPDATE` (SQLAlchemy batches the parameter sets into multi-row VALUES
+    pages), rows without one through a plain multi-row `INSERT`. Returns a list
+    of `(id, inserted)` tuples in the same order as `rows`.
+    """
+    Data = models.LibraryMasterData
+    with_id = [row for row in rows if row.get("id") is not None]
+    without_id = [row for row in rows if row.get("id") is None]
+    outcome = {}
+    new_ids = []
+    try:
+        if with_id:
+            outcome = dict(upsert_by_id(db, Data, with_id))
+        if without_id:
+            without_id = store_form_schemas(db, without_id)
+            stmt = pg_insert(Data).returning(Data.id, sort_by_parameter_order=True)
+            new_ids = [row.id for row in db.execute(stmt, [{k: v for k, v in row.items() if k != "id"} for row in without_id])]
+            parent_ids = [row.get("parent_id") for row in without_id]
+            _retire_parents(db, parent_ids)
+            _refresh_rollups(db, _rollup_keys(db, new_ids + parent_ids))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    new_ids = iter(new_ids)
+    return [
+        (row["id"], outcome[row["id"]]) if row.get("id") is not None else (next(new_ids), True)
+        for row in rows
+    ]
+
+
+def upsert_by_id(db: Session, model, rows: list):
+    """
+    `INSERT ... ON CONFLICT (<primary key>) DO UPDATE` all `rows` into
+    `model`'s table; the ledger's key is `(id, createdon)`.
+
+    Rows may carry different subsets of columns; missing columns are filled
+    with the column's scalar default (or NULL) so the whole list binds to one
+    statement. Form-schema `info` blobs are moved to `form_schemas` first, and
+    ledger writes refresh the cost rollups they touch. Does not commit.
+    Returns `(id, inserted)` for every row written.
+    """
+    table = model.__table__
+    if "info_hash" in table.c:
+        rows = store_form_schemas(db, rows)
+    if model is models.LibraryMasterData:
+        # Rows already stored under these ids may move to another rollup bucket
+        rollup_keys = _rollup_keys(db, [row.get("id") for row in rows])
+        # `xmax` cannot be read through a partitioned table; ids stored before the upsert are updates
+        stored = set(db.scalars(select(table.c.id).where(table.c.id.in_([row.get("id") for row in rows]))))
+        _move_redated_rows(db, rows)
+    keys = [column.key for column in table.columns if any(column.key in row for row in rows)]
+    defaults = {
+        column.key: column.default.arg if column.default is not None and column.default.is_scalar else None
+        for column in table.columns
+    }
+    params = [{key: row.get(key, defaults[key]) for key in keys} for row in rows]
+    stmt = pg_insert(model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(table.primary_key.columns),
+        set_={key: stmt.excluded[key] for key in keys if key not in table.primary_key.columns},
+    )
+    if model is models.LibraryMasterData:
+        written = [(id, id not in stored) for id in db.execute(stmt.returning(table.c.id), params).scalars()]
+    else:
+        stmt = stmt.returning(table.c.id, literal_column("(xmax = 0)").label("inserted"))
+        written = [(row.id, row.inserted) for row in db.execute(stmt, params)]
+    if written:
+        _sync_id_sequence(db, table, max(id for id, _ in written))
+    if model is models.LibraryMasterData:
+        parent_ids = [row.get("parent_id") for row in rows]
+        _retire_parents(db, parent_ids)
+        _refresh_rollups(db, rollup_keys | _rollup_keys(db, [id for id, _ in written] + parent_ids))
+    return written
+
+
+def _move_redated_rows(db: Session, rows: list):
+    """
+    Give stored ledger rows the `createdon` the incoming `rows` carry for
+    their ids, before the upsert. The conflict target includes `createdon`
+    (the partition key), so a re-dated row would otherwise be inserted again
+    under its old id instead of updated; Postgres moves the row to its new
+    month's partition.
+    """
+    Data = models.LibraryMasterData.__table__
+    params = [
+        {"b_id": row["id"], "b_createdon": row["createdon"]}
+        for row in rows if row.get("id") is not None and row.get("createdon") is not None
+    ]
+    if params:
+        db.execute(
+            update(Data)
+            .where(Data.c.id == bindparam("b_id"), Data.c.createdon != bindparam("b_createdon"))
+            .values(createdon=bindparam("b_createdon")),
+            params,
+        )
+
+
+def _sync_id_sequence(db: Session, table, max_id: int):
+    """Move the table's `id` sequence past explicitly written ids so later server-generated ids do not collide."""
+    db.execute(
+        text(
+            "SELECT setval(pg_get_serial_sequence(:table, 'id'), "
+            "GREATEST(:max_id, pg_sequence_last_value(pg_get_serial_sequence(:table, 'id')::regclass)))"
+        ),
+        {"table": table.name, "max_id": max_id},
+    )
 # End :: library_master_data
 
+
+# Start :: library_cost_rollups
+# Primary key of `library_cost_rollups`, and the dimensions a report can group by
+ROLLUP_KEYS = ("site_id", "library_id", "vendor_id", "month")
+
+
+def rollup_key_columns():
+    """A ledger row's `(site_id, library_id, vendor_id, month)` rollup key, as SQL expressions."""
+    Data = models.LibraryMasterData
+    # Inline constants: bound parameters would make the GROUP BY expressions differ from the selected ones (asyncpg)
+    zero = literal_column("0")
+    return (
+        func.coalesce(Data.site_id, zero),
+        func.coalesce(Data.library_id, zero),
+        func.coalesce(Data.vendor_id, zero),
+        cast(func.date_trunc(literal_column("'month'"), Data.createdon), Date),
+    )
+
+
+def rollup_totals_select(*where):
+    """Rollup rows computed from the current ledger revisions matching `where`."""
+    Data = models.LibraryMasterData
+    keys = [column.label(key) for column, key in zip(rollup_key_columns(), ROLLUP_KEYS)]
+    return (
+        select(
+            *keys,
+            func.count().label("entries"),
+            func.sum(cast(func.coalesce(Data.quantity, 0), Numeric)).label("quantity"),
+            func.sum(ledger_amount()).label("amount"),
+        )
+        .where(*_current_filter(), *where)
+        .group_by(*rollup_key_columns())
+    )
+
+
+def ledger_amount():
+    """A ledger row's quantity * price, as an exact numeric."""
+    Data = models.LibraryMasterData
+    return cast(func.coalesce(Data.quantity, 0), Numeric) * cast(func.coalesce(Data.price, 0), Numeric)
+
+
+def rollup_upsert(totals, only_changed: bool = False):
+    """Write `totals` (a `rollup_totals_select`) into `library_cost_rollups`, returning the keys written."""
+    Rollup = models.LibraryCostRollup
+    stmt = pg_insert(Rollup).from_select([*ROLLUP_KEYS, "entries", "quantity", "amount"], totals)
+    values = ("entries", "quantity", "amount")
+    return stmt.on_conflict_do_update(
+        index_elements=list(ROLLUP_KEYS),
+        set_={**{key: stmt.excluded[key] for key in values}, "updatedon": func.now()},
+        where=(
+            tuple_(*(Rollup.__table__.c[key] for key in values)).is_distinct_from(tuple_(*(stmt.excluded[key] for key in values)))
+            if only_changed else None
+        ),
+    ).returning(*(Rollup.__table__.c[key] for key in ROLLUP_KEYS))
+
+
+def rollup_keys_select(ids):
+    """The rollup keys of the ledger rows `ids`, or None when there are none."""
+    ids = {id for id in ids if id}
+    if not ids:
+        return None
+    return select(*rollup_key_columns()).where(models.LibraryMasterData.id.in_(ids)).distinct()
+
+
+def rollup_refresh_upsert(keys: set):
+    """Recompute the rollup rows `keys` from the ledger."""
+    Data = models.LibraryMasterData
+    sites = {key[0] for key in keys}
+    months = [key[3] for key in keys]
+    where = [
+        tuple_(*rollup_key_columns()).in_(keys),
+        # Redundant with the tuple match, but lets the planner use the (site_id, library_id, createdon) indexes
+        Data.createdon >= min(months),
+        Data.createdon < _next_month(max(months)),
+    ]
+    if 0 not in sites:
+        where.append(Data.site_id.in_(sites))
+    return rollup_upsert(rollup_totals_select(*where))
+
+
+def rollup_delete(keys: set):
+    """Remove the rollup rows `keys`, or None when there are none."""
+    if not keys:
+        return None
+    Rollup = models.LibraryCostRollup
+    return delete(Rollup).where(tuple_(Rollup.site_id, Rollup.library_id, Rollup.vendor_id, Rollup.month).in_(keys))
+
+
+def _next_month(month: datetime.date) -> datetime.date:
+    return (month.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+
+
+def _rollup_keys(db: Session, ids) -> set:
+    stmt = rollup_keys_select(ids)
+    return set() if stmt is None else {tuple(row) for row in db.execute(stmt)}
+
+
+def _refresh_rollups(db: Session, keys: set):
+    """
+    Bring the rollup rows `keys` up to date with the ledger; buckets left with
+    no current revision are removed. Costs one grouped read of those buckets'
+    rows, however long the history. Does not commit.
+    """
+    if not keys:
+        return
+    written = {tuple(row) for row in db.execute(rollup_refresh_upsert(keys))}
+    stmt = rollup_delete(keys - written)
+    if stmt is not None:
+        db.execute(stmt)
+    _refresh_balance_snapshots(db, keys)
+
+
+def reconcile_rollups(db: Session, since: datetime.date = None) -> dict:
+    """
+    Recompute `library_cost_rollups` from the ledger (from the month of `since`
+    on, or entirely, but never before the archived months), correcting rows
+    that drifted: writes that bypass `crud`, or two concurrent writers
+    refreshing the same bucket. Commits. Returns the number of rollup rows
+    updated and deleted.
+    """
+    Data = models.LibraryMasterData
+    Rollup = models.LibraryCostRollup
+    since = since.replace(day=1) if since else None
+    # Archived months are gone from the ledger, but their rollups stay
+    archived_until = ledger_archived_until(db)
+    if archived_until and (since is None or since < archived_until):
+        since = archived_until
+    where = [Data.createdon >= since] if since else []
+    try:
+        updated = len(db.execute(rollup_upsert(rollup_totals_select(*where), only_changed=True)).all())
+        stale = delete(Rollup).where(
+            tuple_(Rollup.site_id, Rollup.library_id, Rollup.vendor_id, Rollup.month).not_in(
+                select(*rollup_key_columns()).where(*_current_filter(), *where)
+            )
+        )
+        if since:
+            stale = stale.where(Rollup.month >= since)
+        deleted = db.execute(stale).rowcount
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return { "updated": updated, "deleted": deleted }
+
+
+def ledger_archived_until(db: Session):
+    """The end of the last ledger month archived by utils/ledger_partitions.py, or None."""
+    return db.execute(select(func.max(models.LedgerPartitionArchive.month_to))).scalar()
+
+
+def get_cost_rollups(db: Session, group_by=ROLLUP_KEYS, site_id: int = None, library_id: int = None, vendor_id: int = None, month_from: datetime.date = None, month_to: datetime.date = None):
+    db_result = db.execute(cost_rollups_select(group_by, site_id, library_id, vendor_id, month_from, month_to)).all()
+    return db_result
+
+
+def cost_rollups_select(group_by=ROLLUP_KEYS, site_id: int = None, library_id: int = None, vendor_id: int = None, month_from: datetime.date = None, month_to: datetime.date = None):
+    """Totals from `library_cost_rollups`, summed over every dimension not in `group_by`; `month_to` is inclusive."""
+    Rollup = models.LibraryCostRollup
+    keys = [Rollup.__table__.c[key] for key in group_by]
+    stmt = select(
+        *keys,
+        func.coalesce(func.sum(Rollup.entries), 0).label("entries"),
+        func.coalesce(func.sum(Rollup.quantity), 0).label("quantity"),
+        func.coalesce(func.sum(Rollup.amount), 0).label("amount"),
+    )
+    if site_id is not None:
+        stmt = stmt.where(Rollup.site_id == site_id)
+    if library_id is not None:
+        stmt = stmt.where(Rollup.library_id == library_id)
+    if vendor_id is not None:
+        stmt = stmt.where(Rollup.vendor_id == vendor_id)
+    if month_from:
+        stmt = stmt.where(Rollup.month >= month_from.replace(day=1))
+    if month_to:
+        stmt = stmt.where(Rollup.month < _next_month(month_to))
+    if keys:
+        stmt = stmt.group_by(*keys).order_by(*keys)
+    return stmt
+# End :: library_cost_rollups
+
+
+# Start :: vendor_balances
+# Entries in a library of this type are deductions from what is owed to the vendor
+CREDIT_LIBRARY_TYPE = "credit"
+BALANCE_SNAPSHOT_KEYS = ("site_id", "vendor_id", "as_of")
+BALANCE_SNAPSHOT_VALUES = ("entries", "charges", "credits", "balance")
+
+
+def _closed_month():
+    """First day of the current month: snapshots cover the months before it."""
+    return cast(func.date_trunc(literal_column("'month'"), func.now()), Date)
+
+
+def balance_snapshots_select(*where):
+    """
+    Month-end running totals per site and vendor, from the cost rollups of
+    closed months matching `where`: one row per month with entries, as a
+    window (running SUM partitioned by site/vendor, ordered by month) over
+    the monthly totals.
+    """
+    Rollup = models.LibraryCostRollup
+    Library = models.Library
+    credit = Library.type == CREDIT_LIBRARY_TYPE
+    window = { "partition_by": (Rollup.site_id, Rollup.vendor_id), "order_by": Rollup.month }
+    monthly = (
+        select(
+            Rollup.site_id,
+            Rollup.vendor_id,
+            cast(Rollup.month + literal_column("interval '1 month'"), Date).label("as_of"),
+            cast(func.sum(func.sum(Rollup.entries)).over(**window), Integer).label("entries"),
+            func.sum(func.sum(case((credit, 0), else_=Rollup.amount))).over(**window).label("charges"),
+            func.sum(func.sum(case((credit, Rollup.amount), else_=0))).over(**window).label("credits"),
+        )
+        .outerjoin(Library, Library.id == Rollup.library_id)
+        .where(Rollup.month < _closed_month(), *where)
+        .group_by(Rollup.site_id, Rollup.vendor_id, Rollup.month)
+        .subquery()
+    )
+    return select(*(monthly.c[key] for key in (*BALANCE_SNAPSHOT_KEYS, "entries", "charges", "credits")), (monthly.c.charges - monthly.c.credits).label("balance"))
+
+
+def balance_snapshots_upsert(snapshots, only_changed: bool = False):
+    """Write `snapshots` (a `balance_snapshots_select`) into `vendor_balance_snapshots`, returning the keys written."""
+    Snapshot = models.VendorBalanceSnapshot
+    table = Snapshot.__table__
+    stmt = pg_insert(Snapshot).from_select([*BALANCE_SNAPSHOT_KEYS, *BALANCE_SNAPSHOT_VALUES], snapshots)
+    return stmt.on_conflict_do_update(
+        index_elements=list(BALANCE_SNAPSHOT_KEYS),
+        set_={**{key: stmt.excluded[key] for key in BALANCE_SNAPSHOT_VALUES}, "updatedon": func.now()},
+        where=(
+            tuple_(*(table.c[key] for key in BALANCE_SNAPSHOT_VALUES)).is_distinct_from(tuple_(*(stmt.excluded[key] for key in BALANCE_SNAPSHOT_VALUES)))
+            if only_changed else None
+        ),
+    ).returning(*(table.c[key] for key in BALANCE_SNAPSHOT_KEYS))
+
+
+def balance_snapshot_pairs(keys: set) -> set:
+    """The (site_id, vendor_id) pairs whose snapshots a change to the rollup rows `keys` affects."""
+    closed = datetime.date.today().replace(day=1)
+    # Changes in the open month reach no snapshot yet (the nightly rebuild settles the month boundary)
+    return {(site_id, vendor_id) for site_id, _, vendor_id, month in keys if month < closed}
+
+
+def balance_snapshots_refresh_upsert(pairs: set):
+    Rollup = models.LibraryCostRollup
+    return balance_snapshots_upsert(balance_snapshots_select(tuple_(Rollup.site_id, Rollup.vendor_id).in_(pairs)))
+
+
+def balance_snapshots_stale_delete(pairs: set, written: set):
+    """Remove the snapshots of `pairs` that were not just `written` (months left without entries)."""
+    Snapshot = models.VendorBalanceSnapshot
+    stmt = delete(Snapshot).where(tuple_(Snapshot.site_id, Snapshot.vendor_id).in_(pairs))
+    if written:
+        stmt = stmt.where(tuple_(Snapshot.site_id, Snapshot.vendor_id, Snapshot.as_of).not_in(written))
+    return stmt
+
+
+def _refresh_balance_snapshots(db: Session, keys: set):
+    """
+    Recompute the balance snapshots of the site/vendor pairs behind the rollup
+    rows `keys`. Reads that pair's monthly rollups only. Does not commit.
+    """
+    pairs = balance_snapshot_pairs(keys)
+    if not pairs:
+        return
+    written = {tuple(row) for row in db.execute(balance_snapshots_refresh_upsert(pairs))}
+    db.execute(balance_snapshots_stale_delete(pairs, written))
+
+
+def snapshot_vendor_balances(db: Session) -> dict:
+    """
+    Rebuild every balance snapshot from the cost rollups (run after
+    `reconcile_rollups`), adding the month that just closed. Commits. Returns
+    the number of snapshots written or changed, and deleted.
+    """
+    Snapshot = models.VendorBalanceSnapshot
+    try:
+        updated = len(db.execute(balance_snapshots_upsert(balance_snapshots_select(), only_changed=True)).all())
+        current = balance_snapshots_select().subquery()
+        deleted = db.execute(
+            delete(Snapshot).where(
+                tuple_(Snapshot.site_id, Snapshot.vendor_id, Snapshot.as_of).not_in(select(current.c.site_id, current.c.vendor_id, current.c.as_of))
+            )
+        ).rowcount
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return { "updated": updated, "deleted": deleted }
+
+
+def balance_checkpoint_select(site_id: int, vendor_id: int, before: datetime.datetime = None):
+    """The latest snapshot of site/vendor that only covers entries before `before` (default: the latest)."""
+    Snapshot = models.VendorBalanceSnapshot
+    stmt = select(Snapshot).where(Snapshot.site_id == site_id, Snapshot.vendor_id == vendor_id)
+    if before is not None:
+        stmt = stmt.where(Snapshot.as_of <= before)
+    return stmt.order_by(Snapshot.as_of.desc()).limit(1)
+
+
+def _signed_amount():
+    """Ledger amount, negative for credit-library entries."""
+    amount = ledger_amount()
+    return case((models.Library.type == CREDIT_LIBRARY_TYPE, -amount), else_=amount)
+
+
+def _vendor_entries(stmt, site_id: int, vendor_id: int):
+    """Restrict `stmt` to the current, active entries of site/vendor, joined to their library (for its type)."""
+    Data = models.LibraryMasterData
+    return (
+        stmt.select_from(Data)
+        .outerjoin(models.Library, models.Library.id == Data.library_id)
+        .where(*_current_filter(), Data.site_id == site_id, Data.vendor_id == vendor_id)
+    )
+
+
+def balance_delta_select(site_id: int, vendor_id: int, since: datetime.date = None, at=None):
+    """Totals of the site/vendor entries from `since` (a checkpoint) up to `at` (see `get_vendor_balance`)."""
+    Data = models.LibraryMasterData
+    amount = ledger_amount()
+    credit = models.Library.type == CREDIT_LIBRARY_TYPE
+    stmt = _vendor_entries(select(
+        func.count().label("entries"),
+        func.coalesce(func.sum(case((credit, 0), else_=amount)), 0).label("charges"),
+        func.coalesce(func.sum(case((credit, amount), else_=0)), 0).label("credits"),
+    ), site_id, vendor_id)
+    if since is not None:
+        stmt = stmt.where(Data.createdon >= since)
+    if isinstance(at, tuple):
+        stmt = stmt.where(Data.createdon <= at[0], tuple_(Data.createdon, Data.id) <= tuple_(*at))
+    elif at is not None:
+        stmt = stmt.where(Data.createdon < at)
+    return stmt
+
+
+def get_vendor_balance(db: Session, site_id: int, vendor_id: int, at=None) -> dict:
+    """
+    What the site owes the vendor at `at`: a datetime (entries before it), a
+    `(createdon, id)` statement position (entries up to and including it), or
+    None (all entries).
+
+    Reads the latest snapshot before that point and adds only the entries
+    after it, so the cost is at most about a month of entries however long the
+    vendor's history.
+    """
+    checkpoint = db.execute(balance_checkpoint_select(site_id, vendor_id, at[0] if isinstance(at, tuple) else at)).scalars().first()
+    delta = db.execute(balance_delta_select(site_id, vendor_id, checkpoint.as_of if checkpoint else None, at)).one()
+    charges = delta.charges + (checkpoint.charges if checkpoint else 0)
+    credits = delta.credits + (checkpoint.credits if checkpoint else 0)
+    return {
+        "site_id": site_id,
+        "vendor_id": vendor_id,
+        "entries": delta.entries + (checkpoint.entries if checkpoint else 0),
+        "charges": charges,
+        "credits": credits,
+        "balance": charges - credits,
+        "checkpoint": checkpoint.as_of if checkpoint else None,
+    }
+
+
+def get_vendor_statement(db: Session, site_id: int, vendor_id: int, date_from: datetime.datetime = None, date_to: datetime.datetime = None, after: tuple = None, limit: int = 200):
+    """
+    One page of the site/vendor statement, oldest first: each entry with its
+    signed `amount` (credits negative) and the running `balance` after it.
+
+    Returns `(opening, rows, next_after)`: `opening` is the balance before the
+    page (from `get_vendor_balance`), `next_after` the keyset position of the
+    following page or None.
+    """
+    start = after or date_from
+    opening = get_vendor_balance(db, site_id, vendor_id, at=start)["balance"] if start else 0
+    rows = db.execute(vendor_statement_select(site_id, vendor_id, opening, date_from, date_to, after, limit)).all()
+    rows, next_after = split_keyset_page(rows, limit)
+    return opening, rows, next_after
+
+
+def vendor_statement_select(site_id: int, vendor_id: int, opening=0, date_from: datetime.datetime = None, date_to: datetime.datetime = None, after: tuple = None, limit: int = 200):
+    Data = models.LibraryMasterData
+    order = (Data.createdon, Data.id)
+    stmt = _vendor_entries(select(
+        Data.id, Data.createdon, Data.library_id, Data.library_master_id, Data.quantity, Data.price,
+        _signed_amount().label("amount"),
+        (literal(opening, Numeric) + func.sum(_signed_amount()).over(order_by=order)).label("balance"),
+    ), site_id, vendor_id)
+    if date_from:
+        stmt = stmt.where(Data.createdon >= date_from)
+    if date_to:
+        stmt = stmt.where(Data.createdon < date_to)
+    if after:
+        stmt = stmt.where(tuple_(*order) > tuple_(*after))
+    return stmt.order_by(*order).limit(limit + 1)
+# End :: vendor_balances
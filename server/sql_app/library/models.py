@@ -1,10 +1,21 @@
 from typing import List
-from sqlalchemy import Column, ForeignKey, Integer, String, JSON, Double, DateTime
+from sqlalchemy import DDL, Boolean, Column, Date, ForeignKey, Index, Integer, Numeric, PrimaryKeyConstraint, String, JSON, Double, DateTime, event, text
 from sqlalchemy.orm import relationship
 
 from sql_app.database import Base
 
 
+# Start :: form_schemas
+class FormSchema(Base):
+    """A form definition shared by library and ledger rows, stored once and keyed by the SHA-256 of its canonical JSON."""
+    __tablename__ = "form_schemas"
+
+    hash = Column(String(64), primary_key=True)
+    schema = Column(JSON, nullable=False)
+    createdon = Column(DateTime, server_default=text("now()"))
+# End :: form_schemas
+
+
 # Start :: library
 class Library(Base):
     __tablename__ = "library"
@@ -14,6 +25,8 @@ class Library(Base):
     type = Column(String)
     status = Column(String, index=True)
     info = Column(JSON, nullable=True)
+    # Set (and `info` left NULL) when `info` is a form schema; see crud.store_form_schemas
+    info_hash = Column(String(64), ForeignKey("form_schemas.hash"), nullable=True, index=True)
 
     master = relationship("LibraryMaster", back_populates="library", primaryjoin="Library.id == LibraryMaster.library_id")
     master_data = relationship("LibraryMasterData", back_populates="library", primaryjoin="Library.id == LibraryMasterData.library_id")
@@ -42,15 +55,40 @@ class LibraryMaster(Base):
 
 # Start :: library_master_data
 class LibraryMasterData(Base):
+    """
+    Ledger entries, range-partitioned by month of `createdon` (see
+    utils/ledger_partitions.py). Postgres requires the partition key in the
+    primary key, so the table's key is `(id, createdon)`; `id` stays unique
+    (one sequence, and `crud.upsert_by_id` moves re-dated rows instead of
+    duplicating them) and is what the ORM identifies rows by.
+    """
     __tablename__ = "library_master_data"
+    __table_args__ = (
+        # Serves the ledger listing's keyset pagination: equality on site/library, range on (createdon, id)
+        Index("ix_library_master_data_site_library_createdon_id", "site_id", "library_id", "createdon", "id"),
+        # Same keys, restricted to the latest active revision of each entry, for `latest` reads
+        Index(
+            "ix_library_master_data_current_site_library_createdon_id", "site_id", "library_id", "createdon", "id",
+            postgresql_where=text("is_current AND status = 'active'"),
+        ),
+        # Vendor balances and statements: the entries of one site/vendor after a checkpoint, in (createdon, id) order
+        Index(
+            "ix_library_master_data_current_site_vendor_createdon_id", "site_id", "vendor_id", "createdon", "id",
+            postgresql_where=text("is_current AND status = 'active'"),
+        ),
+        {"postgresql_partition_by": "RANGE (createdon)"},
+    )
 
-    id = Column(Integer, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     quantity = Column(Double, nullable=True)
     price = Column(Double, default=0)
-    createdon = Column(DateTime, nullable=False)
+    createdon = Column(DateTime, primary_key=True, nullable=False)
     version = Column(Integer, default=1)
     parent_id = Column(Integer, default=0, index=True)
+    # False once a newer revision (a row whose parent_id points here) exists
+    is_current = Column(Boolean, default=True, server_default=text("true"), nullable=False)
     info = Column(JSON, nullable=True)
+    info_hash = Column(String(64), ForeignKey("form_schemas.hash"), nullable=True, index=True)
     misc = Column(JSON, nullable=True)
     status = Column(String, default="active", index=True)
     site_id = Column(Integer, ForeignKey("library_master.id"), index=True, nullable=True)
@@ -62,4 +100,85 @@ class LibraryMasterData(Base):
     library_master = relationship("LibraryMaster", back_populates="library_data", primaryjoin="LibraryMaster.id == LibraryMasterData.library_master_id")
     site_master = relationship("LibraryMaster", back_populates="site_data", primaryjoin="LibraryMaster.id == LibraryMasterData.site_id")
     vendor_master = relationship("LibraryMaster", back_populates="vendor_data", primaryjoin="LibraryMaster.id == LibraryMasterData.vendor_id")
+
+    __mapper_args__ = {"primary_key": [id]}
+
+
+# A table created by `create_all` starts without monthly partitions; rows land here until the partition task runs
+event.listen(
+    LibraryMasterData.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS library_master_data_default PARTITION OF library_master_data DEFAULT"),
+)
 # End :: library_master_data
+
+
+# Start :: ledger_partition_archives
+class LedgerPartitionArchive(Base):
+    """A monthly `library_master_data` partition detached, written to a compressed file and dropped."""
+    __tablename__ = "ledger_partition_archives"
+
+    partition = Column(String, primary_key=True)
+    # The partition's range, [month_from, month_to)
+    month_from = Column(Date, nullable=False)
+    month_to = Column(Date, nullable=False, index=True)
+    rows = Column(Integer, nullable=False)
+    path = Column(String, nullable=False)
+    archivedon = Column(DateTime, server_default=text("now()"))
+# End :: ledger_partition_archives
+
+
+# Start :: library_cost_rollups
+class LibraryCostRollup(Base):
+    """
+    Ledger totals per site, library, vendor and calendar month, over the latest
+    active revision of each entry (the rows `latest` reads return).
+
+    Kept up to date by the ledger writes in `crud` and reconciled by the
+    `reconcile_ledger_rollups` beat task. A missing site/library/vendor id on
+    the ledger row is stored as 0.
+    """
+    __tablename__ = "library_cost_rollups"
+    __table_args__ = (
+        PrimaryKeyConstraint("site_id", "library_id", "vendor_id", "month"),
+        Index("ix_library_cost_rollups_month", "month"),
+    )
+
+    site_id = Column(Integer, nullable=False)
+    library_id = Column(Integer, nullable=False)
+    vendor_id = Column(Integer, nullable=False)
+    # First day of the month
+    month = Column(Date, nullable=False)
+    entries = Column(Integer, nullable=False, default=0)
+    # Exact sums (numeric), so reconciling never flags float rounding as drift
+    quantity = Column(Numeric, nullable=False, default=0)
+    amount = Column(Numeric, nullable=False, default=0)
+    updatedon = Column(DateTime, server_default=text("now()"), onupdate=text("now()"))
+# End :: library_cost_rollups
+
+
+# Start :: vendor_balance_snapshots
+class VendorBalanceSnapshot(Base):
+    """
+    Running totals of what a site owes a vendor, checkpointed at the end of
+    each closed month: every current, active ledger entry with `createdon`
+    before `as_of` (the first day of the next month). Credit-library entries
+    are deductions.
+
+    Derived from `library_cost_rollups`; see crud `get_vendor_balance`.
+    """
+    __tablename__ = "vendor_balance_snapshots"
+    __table_args__ = (
+        PrimaryKeyConstraint("site_id", "vendor_id", "as_of"),
+    )
+
+    site_id = Column(Integer, nullable=False)
+    vendor_id = Column(Integer, nullable=False)
+    as_of = Column(Date, nullable=False)
+    entries = Column(Integer, nullable=False, default=0)
+    charges = Column(Numeric, nullable=False, default=0)
+    credits = Column(Numeric, nullable=False, default=0)
+    # charges - credits
+    balance = Column(Numeric, nullable=False, default=0)
+    updatedon = Column(DateTime, server_default=text("now()"), onupdate=text("now()"))
+# End :: vendor_balance_snapshots
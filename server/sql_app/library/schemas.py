@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseModel
 import datetime
 
@@ -15,6 +16,8 @@ class LibraryCreate(LibraryBase):
 
 class Library(LibraryBase):
     id: int
+    info: Optional[dict] = None
+    info_hash: Optional[str] = None
 
 
 class LibraryCreateWithId(LibraryCreate):
@@ -65,8 +68,23 @@ class LibraryMasterDataCreate(LibraryMasterDataBase):
 
 class LibraryMasterData(LibraryMasterDataBase):
     id: int
+    is_current: bool = True
+    info: Optional[dict] = None
+    info_hash: Optional[str] = None
 
 
 class LibraryMasterDataCreateWithId(LibraryMasterDataCreate):
     id: int = None
-# End :: library_master_data
\ No newline at end of file
+# End :: library_master_data
+
+# Start :: library_cost_rollups
+class LibraryCostRollup(BaseModel):
+    # Only the grouped keys are present in a report row
+    site_id: Optional[int] = None
+    library_id: Optional[int] = None
+    vendor_id: Optional[int] = None
+    month: Optional[datetime.date] = None
+    entries: int
+    quantity: float
+    amount: float
+# End :: library_cost_rollups
@@ -1,5 +1,10 @@
+from typing import Iterator, List
+
+from sqlalchemy import case, cast, func, select, update
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Session
 from ..notifications import models
+from ..users import models as users_models
 
 
 def create_notification(db: Session, user_id: int, title: str = None, message: str = None, status: str = None, notification_id: str = None):
@@ -38,3 +43,118 @@ def create_device_token(db: Session, user_id: int, device_token: str, platform:
 
 def get_tokens_for_user(db: Session, user_id: int):
     return db.query(models.DeviceToken).filter(models.DeviceToken.user_id == user_id).all()
+
+
+# Start :: Broadcasts
+def create_broadcast(db: Session, title: str, message: str, data: dict = None, filters: dict = None):
+    db_obj = models.NotificationBroadcast(title=title, message=message, data=data or {}, filters=filters or {}, status="pending")
+    db.add(db_obj)
+    db.commit()
+    db.refresh(db_obj)
+    return db_obj
+
+
+def get_broadcast(db: Session, broadcast_id: int):
+    return db.query(models.NotificationBroadcast).filter(models.NotificationBroadcast.id == broadcast_id).first()
+
+
+def broadcast_tokens_select(filters: dict = None):
+    """
+    Distinct device tokens of the active users matching `filters`:
+    `user_ids` (list), `platform`, and `misc` (a dict `users.misc` must contain,
+    e.g. {"site_id": 501}). No filters means every active user.
+    """
+    filters = filters or {}
+    User, DeviceToken = users_models.User, models.DeviceToken
+    stmt = (
+        select(DeviceToken.device_token)
+        .join(User, User.id == DeviceToken.user_id)
+        .where(User.is_active.isnot(False))
+        .distinct()
+    )
+    if filters.get("user_ids"):
+        stmt = stmt.where(DeviceToken.user_id.in_(filters["user_ids"]))
+    if filters.get("platform"):
+        stmt = stmt.where(DeviceToken.platform == filters["platform"])
+    if filters.get("misc"):
+        stmt = stmt.where(cast(User.misc, JSONB).contains(filters["misc"]))
+    return stmt
+
+
+def iter_broadcast_token_batches(db: Session, filters: dict, size: int) -> Iterator[List[str]]:
+    """The tokens of `broadcast_tokens_select` in lists of `size`, streamed from a server-side cursor."""
+    result = db.execute(broadcast_tokens_select(filters).execution_options(yield_per=size))
+    for batch in result.scalars().partitions():
+        yield list(batch)
+
+
+def claim_broadcast(db: Session, broadcast_id: int) -> bool:
+    """Move a pending broadcast to `dispatching`; False if it is gone or another planner already took it."""
+    claimed = db.execute(
+        update(models.NotificationBroadcast)
+        .where(models.NotificationBroadcast.id == broadcast_id, models.NotificationBroadcast.status == "pending")
+        .values(status="dispatching")
+        .returning(models.NotificationBroadcast.id)
+    ).first()
+    db.commit()
+    return claimed is not None
+
+
+def finish_dispatch(db: Session, broadcast_id: int, tokens: int, batches: int):
+    """
+    Record the totals once every batch is dispatched. Batches that finished
+    during dispatching could not complete the broadcast (see
+    record_broadcast_batch), so this completes it if they were all of them.
+    """
+    Broadcast = models.NotificationBroadcast
+    done = Broadcast.batches_done >= batches
+    db.execute(
+        update(Broadcast)
+        .where(Broadcast.id == broadcast_id, Broadcast.status == "dispatching")
+        .values(
+            tokens=tokens,
+            batches=batches,
+            status=case((done, "completed"), else_="sending"),
+            finished_at=case((done, func.now()), else_=None),
+        )
+    )
+    db.commit()
+
+
+def fail_broadcast(db: Session, broadcast_id: int, error: str):
+    db.execute(
+        update(models.NotificationBroadcast)
+        .where(models.NotificationBroadcast.id == broadcast_id)
+        .values(status="failed", error=error, finished_at=func.now())
+    )
+    db.commit()
+
+
+def record_broadcast_batch(db: Session, broadcast_id: int, sent: int, failed: int):
+    """Add one batch's results in a single UPDATE, so concurrent batch tasks never lose counts."""
+    Broadcast = models.NotificationBroadcast
+    # Right-hand sides see the row before the update. Only once dispatching is
+    # over is `batches` the final count; until then finish_dispatch completes it
+    last = (Broadcast.status == "sending") & (Broadcast.batches_done + 1 >= Broadcast.batches)
+    db.execute(
+        update(Broadcast)
+        .where(Broadcast.id == broadcast_id)
+        .values(
+            batches_done=Broadcast.batches_done + 1,
+            sent=Broadcast.sent + sent,
+            failed=Broadcast.failed + failed,
+            status=case((last, "completed"), else_=Broadcast.status),
+            finished_at=case((last, func.now()), else_=Broadcast.finished_at),
+        )
+    )
+    db.commit()
+
+
+def delete_device_tokens(db: Session, tokens: List[str]) -> int:
+    """Remove tokens the provider reported as no longer registered."""
+    if not tokens:
+        return 0
+    deleted = db.query(models.DeviceToken).filter(models.DeviceToken.device_token.in_(tokens)).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+# End :: Broadcasts
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import JSON, Column, Integer, String, Text, DateTime, ForeignKey
 from sqlalchemy.sql import func
 
 from ..database import Base
@@ -24,3 +24,24 @@ class DeviceToken(Base):
     device_token = Column(String(500), nullable=False, unique=False, index=True)
     platform = Column(String(50), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class NotificationBroadcast(Base):
+    """One notification sent to every device token matching `filters`, in provider multicast batches."""
+    __tablename__ = "notification_broadcasts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    title = Column(String(255), nullable=True)
+    message = Column(Text, nullable=True)
+    data = Column(JSON, nullable=True)
+    filters = Column(JSON, nullable=True)
+    # pending -> dispatching (tokens streaming out) -> sending -> completed, or failed when planning fails
+    status = Column(String(50), nullable=False, default="pending")
+    tokens = Column(Integer, nullable=False, default=0)
+    batches = Column(Integer, nullable=False, default=0)
+    batches_done = Column(Integer, nullable=False, default=0)
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,132 @@
+"""
+Per-request SQL profiling.
+
+With SQL_PROFILING=True, `main.py` attaches cursor-execute hooks to the
+engine(s) and wraps the app in `SQLProfilingMiddleware`. For every request
+the middleware records how many statements ran and how long the database
+took, and reports the totals:
+
+- in a `Server-Timing: db;dur=<ms>;desc="<n> queries"` response header, which
+  browser dev tools display next to the request, and
+- in one structured (JSON) log line on the `server.sql` logger.
+
+Identical SQL text executed SQL_PROFILING_REPEAT_THRESHOLD or more times in
+one request (default 5) is how N+1 loading shows up: a loop issuing the
+same `SELECT ... WHERE id = %(pk)s` per item. Such statements are listed in
+the log line, which is then logged as a warning.
+
+Statements outside a request (Celery tasks, scripts) are not recorded.
+"""
+import contextvars
+import json
+import logging
+import os
+import time
+from collections import Counter
+from typing import Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger("server.sql")
+
+ENABLED = os.getenv("SQL_PROFILING", "False") == "True"
+REPEAT_THRESHOLD = int(os.getenv("SQL_PROFILING_REPEAT_THRESHOLD", "5"))
+
+
+class RequestProfile:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+
+    def repeated(self):
+        return [
+            {"statement": statement, "count": count}
+            for statement, count in self.statements.most_common()
+            if count >= REPEAT_THRESHOLD
+        ]
+
+    def server_timing(self) -> str:
+        desc = "%d queries" % self.count
+        repeated = len(self.repeated())
+        if repeated:
+            desc += ", %d repeated" % repeated
+        return 'db;dur=%.1f;desc="%s"' % (self.duration * 1000, desc)
+
+
+_current: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar("sql_profile", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("profiling_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is not None and conn.info.get("profiling_started"):
+        profile.record(statement, time.perf_counter() - conn.info["profiling_started"].pop())
+
+
+def _handle_error(context):
+    # `after_cursor_execute` does not fire for a failed statement; drop its start time
+    # here so it does not pile up on the pooled connection. It still counts as a query.
+    conn = context.connection
+    if conn is None or not conn.info.get("profiling_started"):
+        return
+    started = conn.info["profiling_started"].pop()
+    profile = _current.get()
+    if profile is not None and context.statement is not None:
+        profile.record(context.statement, time.perf_counter() - started)
+
+
+def install(engine):
+    """Attach the profiling hooks to a sync engine (for an AsyncEngine, pass `.sync_engine`)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class SQLProfilingMiddleware:
+    """ASGI middleware that profiles each HTTP request's SQL (see module docstring)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        status = None
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # Covers everything up to the headers; a streamed body's queries only reach the log line
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", profile.server_timing().encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            repeated = profile.repeated()
+            logger.log(logging.WARNING if repeated else logging.INFO, json.dumps({
+                "event": "sql_profile",
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status,
+                "queries": profile.count,
+                "db_ms": round(profile.duration * 1000, 2),
+                "repeated": repeated,
+            }))
@@ -1,5 +1,8 @@
+import time
+
 from sqlalchemy.orm import Session
 from pprint import pprint
+from utils import auth_cache
 from . import models, schemas
 
 
@@ -7,6 +10,20 @@ def get_user(db: Session, user_id: int):
     return db.query(models.User).filter(models.User.id == user_id).first()
 
 
+def get_user_cached(db: Session, user_id: int):
+    """The user as a detached `schemas.User`, from the per-process user cache when possible (see utils/auth_cache.py)."""
+    user = auth_cache.users.get(user_id)
+    if user is None:
+        generation = auth_cache.users.generation(user_id)
+        db_user = get_user(db, user_id=user_id)
+        if db_user is None:
+            return None
+        user = schemas.User.model_validate(db_user)
+        auth_cache.users.put(user_id, user, time.time() + auth_cache.AUTH_USER_CACHE_TTL, generation=generation)
+    # A copy, so one request changing `misc` cannot change what later requests see
+    return user.model_copy(deep=True)
+
+
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
@@ -40,6 +57,7 @@ def update_user(db: Session, db_user: models.User, **kwargs):
             setattr(db_user, k, v)
     db.add(db_user)
     db.commit()
+    auth_cache.users.invalidate(db_user.id)
     db.refresh(db_user)
     return db_user
 
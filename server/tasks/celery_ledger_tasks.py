@@ -0,0 +1,138 @@
+"""
+Celery tasks for ledger maintenance and analytics.
+
+Registered on the shared Celery app; workers load this module through the
+`imports` setting in celeryconfig. Tasks create their own DB sessions.
+"""
+import datetime
+import logging
+
+from tasks.celery_notification_tasks import celery_app
+from sql_app.database import SessionLocal
+from sql_app.library import crud
+from utils import credit_engine, ledger_partitions, ledger_snapshot
+
+logger = logging.getLogger("ledger_tasks")
+
+
+def run_snapshot_export(site_id=None, since=None, until=None, fmt="parquet"):
+    """Plain-function body of `export_ledger_snapshots`, also used when Celery is unavailable."""
+    since = datetime.date.fromisoformat(since) if since else None
+    until = datetime.date.fromisoformat(until) if until else None
+    db = SessionLocal()
+    try:
+        if site_id:
+            return [ledger_snapshot.export_site(db, int(site_id), since=since, until=until, fmt=fmt)]
+        return ledger_snapshot.export_all_sites(db, since=since, until=until, fmt=fmt)
+    finally:
+        db.close()
+
+
+@celery_app.task(bind=True, name="export_ledger_snapshots")
+def export_ledger_snapshots(self, site_id=None, since=None, until=None, fmt="parquet"):
+    """
+    Bring the columnar ledger snapshots up to date.
+
+    Args:
+        site_id: Export only this site (default: every site)
+        since: Optional first day to consider (YYYY-MM-DD)
+        until: Optional day to stop before (YYYY-MM-DD, default today)
+        fmt: "parquet" or "arrow"
+
+    Returns:
+        List of per-site summaries of written/removed days
+    """
+    return run_snapshot_export(site_id=site_id, since=since, until=until, fmt=fmt)
+
+
+def run_rollup_reconcile(since=None):
+    """Plain-function body of `reconcile_ledger_rollups`, also used when Celery is unavailable."""
+    since = datetime.date.fromisoformat(since) if since else None
+    with SessionLocal() as db:
+        result = crud.reconcile_rollups(db, since=since)
+    if result["updated"] or result["deleted"]:
+        logger.warning("Ledger cost rollups drifted: %s", result)
+    return result
+
+
+@celery_app.task(bind=True, name="reconcile_ledger_rollups")
+def reconcile_ledger_rollups(self, since=None):
+    """
+    Recompute the site/library/vendor/month cost rollups from the ledger and
+    fix any rows that drifted from it.
+
+    Args:
+        since: Optional first day to reconcile (YYYY-MM-DD; its whole month is included)
+
+    Returns:
+        Number of rollup rows updated and deleted
+    """
+    return run_rollup_reconcile(since=since)
+
+
+def run_balance_snapshots():
+    """Plain-function body of `snapshot_vendor_balances`, also used when Celery is unavailable."""
+    with SessionLocal() as db:
+        return crud.snapshot_vendor_balances(db)
+
+
+@celery_app.task(bind=True, name="snapshot_vendor_balances")
+def snapshot_vendor_balances(self):
+    """
+    Rebuild the month-end vendor balance checkpoints from the cost rollups,
+    adding the month that just closed.
+
+    Returns:
+        Number of snapshots written or changed, and deleted
+    """
+    return run_balance_snapshots()
+
+
+def run_credit_deductions(site_id, vendor_id=None, since=None, until=None):
+    """Plain-function body of `compute_credit_deductions`, also used when Celery is unavailable."""
+    since = datetime.datetime.fromisoformat(since) if since else None
+    until = datetime.datetime.fromisoformat(until) if until else None
+    with SessionLocal() as db:
+        return credit_engine.compute_ledger(db, int(site_id), vendor_id=vendor_id, date_from=since, date_to=until)
+
+
+@celery_app.task(bind=True, name="compute_credit_deductions")
+def compute_credit_deductions(self, site_id, vendor_id=None, since=None, until=None):
+    """
+    Apply the Credit Master rules to a site's ledger entries in one vectorized pass.
+
+    Args:
+        site_id: Site whose entries are the bills
+        vendor_id: Optional vendor filter
+        since: Optional first day (YYYY-MM-DD)
+        until: Optional day to stop before (YYYY-MM-DD)
+
+    Returns:
+        Bill count and per-rule totals (gross, each deduction, net)
+    """
+    return run_credit_deductions(site_id, vendor_id=vendor_id, since=since, until=until)
+
+
+def run_ensure_partitions(ahead=None):
+    """Plain-function body of `ensure_ledger_partitions`, also used when Celery is unavailable."""
+    with SessionLocal() as db:
+        created = ledger_partitions.ensure_partitions(db, ahead=ledger_partitions.LEDGER_PARTITION_MONTHS_AHEAD if ahead is None else int(ahead))
+    if created:
+        logger.info("created ledger partitions: %s", ", ".join(created))
+    return created
+
+
+@celery_app.task(bind=True, name="ensure_ledger_partitions")
+def ensure_ledger_partitions(self, ahead=None):
+    """
+    Create the monthly `library_master_data` partitions that do not exist yet:
+    one for each month still held by the default partition, and the current
+    month through the coming months.
+
+    Args:
+        ahead: Months ahead of the current one (default LEDGER_PARTITION_MONTHS_AHEAD)
+
+    Returns:
+        Names of the partitions created
+    """
+    return run_ensure_partitions(ahead=ahead)
@@ -4,9 +4,11 @@ Celery tasks for mobile push notifications.
 This module defines the Celery app and notification tasks that are processed
 by Celery workers. Tasks create their own DB sessions for thread safety.
 """
-from celery import Celery
+from celery import Celery, group
+import logging
 import os
 from utils import notification_utils
+from sql_app.notifications import crud as notifications_crud
 from sql_app.database import SessionLocal
 
 # Initialize Celery app with Redis as broker and backend
@@ -17,6 +19,8 @@ celery_app = Celery(
 )
 celery_app.config_from_object("server.celeryconfig")
 
+logger = logging.getLogger("notification_tasks")
+
 
 @celery_app.task(bind=True, name="send_mobile_notification")
 def send_mobile_notification(self, user_id, title, body, data=None):
@@ -38,3 +42,57 @@ def send_mobile_notification(self, user_id, title, body, data=None):
         return res
     finally:
         db.close()
+
+
+@celery_app.task(bind=True, name="plan_notification_broadcast")
+def plan_notification_broadcast(self, broadcast_id):
+    """
+    Stream a broadcast's device tokens and dispatch one `send_broadcast_batch`
+    per multicast batch as the query yields them, BROADCAST_DISPATCH_GROUP
+    batches per Celery group.
+
+    Args:
+        broadcast_id: notification_broadcasts row to send
+
+    Returns:
+        Dict with the broadcast id and the number of batches dispatched
+    """
+    db = SessionLocal()
+    try:
+        broadcast = notifications_crud.get_broadcast(db, broadcast_id)
+        # Missing, or already planned by an earlier delivery of this task
+        if broadcast is None or not notifications_crud.claim_broadcast(db, broadcast_id):
+            return {"broadcast_id": broadcast_id, "batches": 0}
+        title, body, data = broadcast.title, broadcast.message, broadcast.data
+
+        def dispatch(batches):
+            group(send_broadcast_batch.s(broadcast_id, tokens, title, body, data) for tokens in batches).apply_async()
+
+        batches = notification_utils.plan_broadcast(db, broadcast, dispatch)
+    finally:
+        db.close()
+    return {"broadcast_id": broadcast_id, "batches": batches}
+
+
+@celery_app.task(bind=True, name="send_broadcast_batch", max_retries=notification_utils.DEFAULT_RETRIES - 1)
+def send_broadcast_batch(self, broadcast_id, tokens, title, body, data=None):
+    """
+    Send one multicast batch of a broadcast and add its counts to the broadcast.
+
+    A failed request is retried by Celery after NOTIFICATION_BACKOFF * attempt
+    seconds, freeing the worker meanwhile; once retries run out, the whole
+    batch counts as failed.
+    """
+    try:
+        result = notification_utils.send_multicast(tokens, title, body, data or {})
+    except Exception as exc:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=exc, countdown=notification_utils.DEFAULT_BACKOFF * (self.request.retries + 1))
+        logger.exception("Broadcast %s batch of %d tokens failed", broadcast_id, len(tokens))
+        result = {"sent": 0, "failed": len(tokens), "dead_tokens": []}
+    db = SessionLocal()
+    try:
+        notification_utils.record_broadcast_batch(db, broadcast_id, result)
+    finally:
+        db.close()
+    return {"sent": result["sent"], "failed": result["failed"]}
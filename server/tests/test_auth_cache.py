@@ -0,0 +1,52 @@
+"""The per-process auth caches stay bounded and hand out values callers cannot share by accident."""
+import time
+
+from sql_app.users import crud as users_crud, schemas as users_schemas
+from utils import auth_cache
+
+
+def test_generations_are_bounded():
+    cache = auth_cache.ExpiringLRU(maxsize=3)
+    for key in range(100):
+        cache.invalidate(key)
+
+    assert len(cache._generations) == 3
+
+
+def test_invalidate_during_load_drops_the_put():
+    cache = auth_cache.ExpiringLRU(maxsize=3)
+    generation = cache.generation("a")
+    cache.invalidate("a")
+    cache.put("a", "stale", time.time() + 60, generation=generation)
+
+    assert cache.get("a") is None
+
+
+def test_invalidate_is_seen_after_its_stamp_is_pruned():
+    cache = auth_cache.ExpiringLRU(maxsize=2)
+    generation = cache.generation("a")
+    cache.invalidate("a")
+    # Push "a" out of the generation table before the load finishes
+    cache.invalidate("b")
+    cache.invalidate("c")
+    cache.put("a", "stale", time.time() + 60, generation=generation)
+
+    assert "a" not in cache._generations
+    assert cache.get("a") is None
+    cache.put("a", "fresh", time.time() + 60, generation=cache.generation("a"))
+    assert cache.get("a") == "fresh"
+
+
+def test_cached_user_is_a_copy():
+    user = users_schemas.User(id=-7, email="cache-test@example.com", is_active=True, misc={"site_id": 501})
+    auth_cache.users.put(-7, user, time.time() + 60)
+    try:
+        # A cache hit never touches the session
+        first = users_crud.get_user_cached(None, user_id=-7)
+        first.misc["site_id"] = 999
+        second = users_crud.get_user_cached(None, user_id=-7)
+    finally:
+        auth_cache.users.invalidate(-7)
+
+    assert second.misc == {"site_id": 501}
+    assert first is not second
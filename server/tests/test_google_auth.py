@@ -0,0 +1,149 @@
+"""Local verification of Google ID tokens against a JWKS served from a local stand-in for Google."""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from utils import google_auth, http_client
+from utils.google_auth import GoogleKeySet, GoogleKeysUnavailable, InvalidGoogleToken, verify_id_token
+
+CLIENT_ID = "test-client.apps.googleusercontent.com"
+
+
+class SigningKey:
+    def __init__(self, kid: str):
+        self.kid = kid
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    def jwk(self) -> dict:
+        return {**json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(self.private_key.public_key())), "kid": self.kid, "use": "sig", "alg": "RS256"}
+
+    def sign(self, **overrides) -> str:
+        now = int(time.time())
+        claims = {
+            "iss": "https://accounts.google.com", "aud": CLIENT_ID, "sub": "1234567890",
+            "email": "user@example.com", "email_verified": True, "iat": now, "exp": now + 3600,
+            **overrides,
+        }
+        return jwt.encode(claims, self.private_key, algorithm="RS256", headers={"kid": self.kid})
+
+
+@pytest.fixture(scope="module")
+def keys():
+    return {"current": SigningKey("key-1"), "next": SigningKey("key-2")}
+
+
+@pytest.fixture(autouse=True)
+def google_client(monkeypatch):
+    """A fresh "google" provider client per test, so failed fetches never trip a shared circuit breaker."""
+    monkeypatch.setitem(http_client._clients, "google", http_client.ProviderClient("google"))
+
+
+@pytest.fixture
+def jwks(keys):
+    """A JWKS endpoint whose keys, status and Cache-Control the test controls; counts requests."""
+    state = {"keys": [keys["current"]], "status": 200, "max_age": 3600, "requests": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            state["requests"] += 1
+            body = json.dumps({"keys": [key.jwk() for key in state["keys"]]}).encode()
+            self.send_response(state["status"])
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Cache-Control", f"public, max-age={state['max_age']}")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    state["key_set"] = GoogleKeySet(url=f"http://127.0.0.1:{server.server_port}/certs", timeout=2)
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def verify(jwks, token):
+    return verify_id_token(token, audience=[CLIENT_ID], keys=jwks["key_set"])
+
+
+def test_valid_token(jwks, keys):
+    claims = verify(jwks, keys["current"].sign())
+    assert claims["sub"] == "1234567890" and claims["email"] == "user@example.com"
+    # Later tokens are checked against the cached keys
+    verify(jwks, keys["current"].sign())
+    assert jwks["requests"] == 1
+
+
+@pytest.mark.parametrize("overrides", [
+    {"aud": "someone-else.apps.googleusercontent.com"},
+    {"iss": "https://evil.example.com"},
+    {"exp": int(time.time()) - 3600, "iat": int(time.time()) - 7200},
+], ids=["wrong-aud", "wrong-iss", "expired"])
+def test_rejected_claims(jwks, keys, overrides):
+    with pytest.raises(InvalidGoogleToken):
+        verify(jwks, keys["current"].sign(**overrides))
+
+
+def test_tampered_token(jwks, keys):
+    token = keys["current"].sign()
+    header, _, signature = token.split(".")
+    claims = {**jwt.decode(token, options={"verify_signature": False}), "email": "admin@example.com"}
+    payload = jwt.utils.base64url_encode(json.dumps(claims).encode()).decode()
+    with pytest.raises(InvalidGoogleToken):
+        verify(jwks, f"{header}.{payload}.{signature}")
+
+
+def test_token_signed_by_unknown_key(jwks):
+    with pytest.raises(InvalidGoogleToken):
+        verify(jwks, SigningKey("key-1").sign())
+
+
+def test_kid_rotation_refetch_is_throttled(jwks, keys, monkeypatch):
+    verify(jwks, keys["current"].sign())
+    # Google publishes the next key; a token signed with it arrives right away
+    jwks["keys"] = [keys["current"], keys["next"]]
+    with pytest.raises(InvalidGoogleToken):
+        verify(jwks, keys["next"].sign())
+    # The unknown kid could not force a fetch within JWKS_MIN_REFETCH_INTERVAL of the last one
+    assert jwks["requests"] == 1
+    # Once the interval has passed, the unknown kid refetches and verifies
+    monkeypatch.setattr(google_auth, "JWKS_MIN_REFETCH_INTERVAL", 0)
+    assert verify(jwks, keys["next"].sign())["sub"] == "1234567890"
+    assert jwks["requests"] == 2
+    # Forged kids refetch at most once per interval
+    monkeypatch.setattr(google_auth, "JWKS_MIN_REFETCH_INTERVAL", 30)
+    for _ in range(5):
+        with pytest.raises(InvalidGoogleToken):
+            verify(jwks, SigningKey("forged").sign())
+    assert jwks["requests"] == 2
+
+
+def test_cached_keys_kept_when_refresh_fails(jwks, keys):
+    verify(jwks, keys["current"].sign())
+    jwks["status"] = 500
+    # The cached set expires and the refresh fails: the previous keys stay in use
+    jwks["key_set"]._expires_at = 0
+    jwks["key_set"]._last_attempt = 0
+    assert verify(jwks, keys["current"].sign())["sub"] == "1234567890"
+    stats = jwks["key_set"].stats()
+    assert stats["failures"] == 1 and stats["keys"] == 1
+
+
+def test_keys_unavailable_without_cache(jwks, keys):
+    jwks["status"] = 500
+    with pytest.raises(GoogleKeysUnavailable):
+        verify(jwks, keys["current"].sign())
+
+
+def test_cache_lifetime_follows_cache_control(jwks, keys):
+    jwks["max_age"] = 120
+    verify(jwks, keys["current"].sign())
+    assert 0 < jwks["key_set"].stats()["expires_in"] <= 120
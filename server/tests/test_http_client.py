@@ -0,0 +1,133 @@
+"""Provider HTTP clients against a local stub server: pooling, timeouts and the circuit breaker."""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from utils.http_client import CircuitBreaker, CircuitOpenError, ProviderClient
+
+
+@pytest.fixture(scope="module")
+def stub():
+    """
+    `/ok` answers 200, `/fail` 503, `/slow` 200 after 0.5 s. Counts requests
+    and the TCP connections they arrived on.
+    """
+    state = {"connections": 0, "requests": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Otherwise Nagle's algorithm adds ~40 ms per kept-alive response
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            state["connections"] += 1
+
+        def do_GET(self):
+            state["requests"] += 1
+            if self.path == "/slow":
+                time.sleep(0.5)
+            status = 503 if self.path == "/fail" else 200
+            self.send_response(status)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    state["url"] = f"http://127.0.0.1:{server.server_port}"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def provider():
+    clients = []
+
+    def make(**kwargs):
+        client = ProviderClient("stub", **kwargs)
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+def test_connections_are_reused(stub, provider):
+    client = provider()
+    connections = stub["connections"]
+    for _ in range(50):
+        assert client.get(stub["url"] + "/ok").status_code == 200
+    assert stub["connections"] - connections == 1
+    snapshot = client.snapshot()
+    assert snapshot["requests"] == 50 and snapshot["errors"] == 0 and snapshot["statuses"] == {"2xx": 50}
+
+
+def test_timeout(stub, provider):
+    client = provider(timeout=0.1)
+    started = time.monotonic()
+    with pytest.raises(httpx.ReadTimeout):
+        client.get(stub["url"] + "/slow")
+    assert time.monotonic() - started < 0.4
+    # A per-call timeout overrides the client's
+    assert client.get(stub["url"] + "/slow", timeout=2).status_code == 200
+    assert client.snapshot()["statuses"] == {"transport_error": 1, "2xx": 1}
+
+
+def test_breaker_open_half_open_close(stub, provider):
+    client = provider(breaker=CircuitBreaker(failures=2, reset_after=0.2))
+    # 5xx counts as a failure but is still returned to the caller
+    assert client.get(stub["url"] + "/fail").status_code == 503
+    assert client.breaker.state == CircuitBreaker.CLOSED
+    client.get(stub["url"] + "/fail")
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    # Open: rejected without a request
+    requests = stub["requests"]
+    with pytest.raises(CircuitOpenError):
+        client.get(stub["url"] + "/ok")
+    assert stub["requests"] == requests and client.snapshot()["rejected"] == 1
+
+    # Half-open: one trial; failing it opens the breaker again
+    time.sleep(0.25)
+    client.get(stub["url"] + "/fail")
+    assert client.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        client.get(stub["url"] + "/ok")
+
+    # A successful trial closes it
+    time.sleep(0.25)
+    assert client.get(stub["url"] + "/ok").status_code == 200
+    assert client.breaker.state == CircuitBreaker.CLOSED
+    assert client.snapshot()["breaker_opened"] == 2
+
+
+def test_transport_errors_open_the_breaker(provider):
+    client = provider(connect_timeout=0.5, breaker=CircuitBreaker(failures=2, reset_after=60))
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            # Nothing listens on port 9 (discard) here
+            client.get("http://127.0.0.1:9/")
+    with pytest.raises(CircuitOpenError):
+        client.get("http://127.0.0.1:9/")
+
+
+def test_half_open_trial_released_by_non_http_errors(stub, provider):
+    client = provider(breaker=CircuitBreaker(failures=1, reset_after=0.1))
+    client.get(stub["url"] + "/fail")
+    time.sleep(0.15)
+    # The trial raises something other than httpx.HTTPError
+    with pytest.raises(httpx.InvalidURL):
+        client.get("http://[::1/")
+    # The breaker still lets the next trial through, which closes it
+    assert client.get(stub["url"] + "/ok").status_code == 200
+    assert client.breaker.state == CircuitBreaker.CLOSED
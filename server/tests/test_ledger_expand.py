@@ -0,0 +1,88 @@
+"""`expand=` inlines related names without adding queries, whatever the page size."""
+import datetime
+
+import pytest
+from sqlalchemy import delete, event, select
+
+from sql_app.library import models
+
+# Relation -> the row's foreign key it expands
+EXPAND_KEYS = {"site_master": "site_id", "vendor_master": "vendor_id", "library_master": "library_master_id"}
+EXPAND = ",".join(EXPAND_KEYS)
+# A month no real ledger data uses, so the listing only sees these rows
+MONTH = datetime.datetime(2031, 1, 1)
+ROWS = 60
+
+
+@pytest.fixture
+def ledger_rows(db):
+    masters = lambda library_id: db.execute(
+        select(models.LibraryMaster.id).where(models.LibraryMaster.library_id == library_id).order_by(models.LibraryMaster.id).limit(8)
+    ).scalars().all()
+    sites, vendors, materials = masters(6), masters(7), masters(1)
+    if not (sites and vendors and materials):
+        pytest.skip("catalog not seeded (python -m seeds.engine)")
+    site_id = sites[0]
+    ids = range(9_900_001, 9_900_001 + ROWS)
+    for index, id in enumerate(ids):
+        db.add(models.LibraryMasterData(
+            id=id, quantity=1, price=index, createdon=MONTH + datetime.timedelta(hours=index),
+            site_id=site_id, vendor_id=vendors[index % len(vendors)], library_id=1,
+            library_master_id=materials[index % len(materials)], info={}, misc={},
+        ))
+    db.commit()
+    yield site_id
+    db.execute(delete(models.LibraryMasterData).where(models.LibraryMasterData.id.in_(list(ids))))
+    db.commit()
+
+
+@pytest.fixture
+def count_queries(db_engine):
+    counter = {"queries": 0}
+
+    def before_cursor_execute(*args):
+        counter["queries"] += 1
+
+    event.listen(db_engine, "before_cursor_execute", before_cursor_execute)
+    yield counter
+    event.remove(db_engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _get(client, count_queries, site_id, **params):
+    count_queries["queries"] = 0
+    response = client.get(
+        f"/api/library/master/data/{site_id}/1",
+        params={"from": "2031-01-01", "to": "2031-01-31", "expand": EXPAND, **params},
+    )
+    assert response.status_code == 200, response.text
+    return response.json(), count_queries["queries"]
+
+
+def _assert_expanded(rows):
+    assert rows
+    for row in rows:
+        for relation, key in EXPAND_KEYS.items():
+            assert row[relation]["id"] == row[key]
+            assert "name" in row[relation]
+
+
+@pytest.mark.parametrize("mode", ["offset", "keyset"])
+def test_expand_query_count_is_constant(client, count_queries, ledger_rows, mode):
+    counts = {}
+    for limit in (1, 10, ROWS):
+        params = {"limit": limit, **({"cursor": "true"} if mode == "keyset" else {})}
+        body, counts[limit] = _get(client, count_queries, ledger_rows, **params)
+        assert len(body["result"]) == limit
+        _assert_expanded(body["result"])
+    assert len(set(counts.values())) == 1, counts
+    assert counts[ROWS] == 1
+
+
+def test_expand_following_keyset_and_offset_pages(client, count_queries, ledger_rows):
+    body, _ = _get(client, count_queries, ledger_rows, limit=25, cursor="true")
+    body, queries = _get(client, count_queries, ledger_rows, limit=25, after=body["next"])
+    assert len(body["result"]) == 25 and queries == 1
+    _assert_expanded(body["result"])
+    body, queries = _get(client, count_queries, ledger_rows, limit=25, page=3)
+    assert len(body["result"]) == ROWS - 50 and queries == 1
+    _assert_expanded(body["result"])
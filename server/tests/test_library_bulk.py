@@ -0,0 +1,56 @@
+"""Bulk ingest reports a bad value as an invalid row, or a 4xx, never a 500."""
+import datetime
+
+import pytest
+from sqlalchemy import delete, select
+
+from sql_app.library import models
+
+# A month no real ledger data uses, so cleanup only touches these rows
+MONTH = datetime.datetime(2031, 2, 1)
+URL = "/api/library/master/data/bulk"
+
+
+@pytest.fixture
+def row(db):
+    masters = lambda library_id: db.execute(
+        select(models.LibraryMaster.id).where(models.LibraryMaster.library_id == library_id).order_by(models.LibraryMaster.id).limit(1)
+    ).scalars().first()
+    site_id, vendor_id, material_id = masters(6), masters(7), masters(1)
+    if not (site_id and vendor_id and material_id):
+        pytest.skip("catalog not seeded (python -m seeds.engine)")
+    yield {
+        "quantity": 1, "price": 10, "createdon": MONTH.isoformat(), "site_id": site_id, "vendor_id": vendor_id,
+        "library_id": 1, "library_master_id": material_id, "info": {}, "misc": {},
+    }
+    db.execute(delete(models.LibraryMasterData).where(
+        models.LibraryMasterData.createdon >= MONTH, models.LibraryMasterData.createdon < MONTH + datetime.timedelta(days=28)
+    ))
+    db.commit()
+
+
+@pytest.mark.parametrize("field, value", [("site_id", "abc"), ("vendor_id", "12x"), ("createdon", "not a date")])
+def test_uncastable_value_is_an_invalid_row(client, row, field, value):
+    response = client.post(URL, json=[{**row, field: value}, row])
+
+    assert response.status_code == 200
+    result = response.json()["result"]
+    assert (result["invalid"], result["inserted"]) == (1, 1)
+    assert result["rows"][0]["status"] == "invalid"
+    assert field in result["rows"][0]["errors"][0]["msg"] or value in result["rows"][0]["errors"][0]["msg"]
+    assert result["rows"][1]["status"] == "inserted"
+
+
+def test_numeric_string_ids_are_accepted(client, row):
+    response = client.post(URL, json=[{**row, "site_id": str(row["site_id"])}])
+
+    assert response.status_code == 200
+    assert response.json()["result"]["inserted"] == 1
+
+
+def test_value_postgres_rejects_is_a_422(client, row):
+    # Passes validation but overflows the integer column
+    response = client.post(URL, json=[row, {**row, "version": 2 ** 40}])
+
+    assert response.status_code == 422
+    assert "index" not in response.json()["detail"]
@@ -0,0 +1,68 @@
+"""Broadcasts are admin-only and never fan out inside the request."""
+import pytest
+
+from dependencies import current_user
+from sql_app.notifications import crud as notifications_crud
+from sql_app.notifications import models as notifications_models
+from sql_app.users import schemas as users_schemas
+from utils import queue as task_queue
+
+URL = "/api/notifications/broadcast"
+BODY = {"title": "Site closed", "body": "No deliveries today", "filter": {"userIds": [-1]}}
+
+
+@pytest.fixture
+def as_user(client):
+    import main
+
+    def login(misc=None):
+        user = users_schemas.User(id=-1, email="broadcast-test@example.com", is_active=True, misc=misc)
+        main.app.dependency_overrides[current_user] = lambda: user
+    yield login
+    main.app.dependency_overrides.pop(current_user, None)
+
+
+@pytest.fixture
+def broadcasts(db):
+    created = []
+    yield created
+    db.query(notifications_models.NotificationBroadcast).filter(
+        notifications_models.NotificationBroadcast.id.in_(created)
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def test_non_admin_is_refused(client, as_user, monkeypatch):
+    as_user(misc={"role": "clerk"})
+    monkeypatch.setattr(task_queue, "enqueue_task", lambda *args, **kwargs: pytest.fail("enqueued"))
+
+    assert client.post(URL, json=BODY).status_code == 403
+    assert client.get(f"{URL}/1").status_code == 403
+
+
+def test_admin_broadcast_is_enqueued(client, as_user, broadcasts, monkeypatch):
+    as_user(misc={"role": "admin"})
+    enqueued = []
+    monkeypatch.setattr(task_queue, "enqueue_task", lambda name, args=(), kwargs=None: enqueued.append((name, args)))
+
+    response = client.post(URL, json=BODY)
+
+    assert response.status_code == 200
+    broadcasts.append(response.json()["broadcastId"])
+    assert enqueued == [("plan_notification_broadcast", (broadcasts[0],))]
+
+
+def test_queue_unavailable_is_a_503(client, as_user, broadcasts, db, monkeypatch):
+    as_user(misc={"role": "admin"})
+
+    def unavailable(*args, **kwargs):
+        raise ConnectionError("broker down")
+    monkeypatch.setattr(task_queue, "enqueue_task", unavailable)
+    before = db.query(notifications_models.NotificationBroadcast.id).all()
+
+    response = client.post(URL, json=BODY)
+
+    assert response.status_code == 503
+    new = [id for id, in db.query(notifications_models.NotificationBroadcast.id).all() if (id,) not in before]
+    broadcasts.extend(new)
+    assert [notifications_crud.get_broadcast(db, id).status for id in new] == ["failed"]
@@ -0,0 +1,47 @@
+"""The SQL profiling hooks leave nothing behind on a pooled connection, even when a statement fails."""
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.pool import QueuePool
+
+from sql_app import profiling
+
+
+@pytest.fixture
+def engine(db_engine):
+    # One pooled connection, so every checkout sees what earlier statements left in `conn.info`
+    engine = create_engine(db_engine.url, poolclass=QueuePool, pool_size=1, max_overflow=0)
+    profiling.install(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def profile():
+    profile = profiling.RequestProfile()
+    token = profiling._current.set(profile)
+    yield profile
+    profiling._current.reset(token)
+
+
+def test_failed_statement_does_not_leak_a_start_time(engine, profile):
+    for _ in range(3):
+        with engine.connect() as conn:
+            with pytest.raises(ProgrammingError):
+                conn.execute(text("SELECT * FROM profiling_test_missing_table"))
+            assert conn.info.get("profiling_started") == []
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        assert conn.info.get("profiling_started") == []
+    assert profile.count == 4
+    assert profile.statements["SELECT * FROM profiling_test_missing_table"] == 3
+
+
+def test_statements_outside_a_request_are_not_recorded(engine):
+    with engine.connect() as conn:
+        with pytest.raises(ProgrammingError):
+            conn.execute(text("SELECT * FROM profiling_test_missing_table"))
+        conn.rollback()
+        conn.execute(text("SELECT 1"))
+        assert not conn.info.get("profiling_started")
@@ -0,0 +1,124 @@
+"""
+In-process caches for authentication.
+
+Every protected request carries the same bearer token many times over its
+lifetime, and routes that need the user load the same `users` row again
+and again. Two bounded LRU caches avoid repeating that work:
+
+- `claims`: verified JWT claims, keyed by the SHA-256 of the token (tokens
+  themselves are never held). An entry expires at the token's own `exp`, so
+  a cached token is never accepted after it would have failed
+  verification. Tokens without `exp` are not cached.
+- `users`: the `users` row of each user id, as a detached `schemas.User`,
+  kept for at most AUTH_USER_CACHE_TTL seconds; callers get a deep copy. `crud.update_user`
+  invalidates the entry in this process; other workers see the change
+  once their entry reaches the TTL.
+
+Both are per process, like the catalog cache.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from utils import metrics
+from utils.jwt_helper import verify_jwt_token
+
+AUTH_CLAIMS_CACHE_SIZE = int(os.getenv("AUTH_CLAIMS_CACHE_SIZE", "10000"))
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "10000"))
+AUTH_USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", "300"))
+
+
+class ExpiringLRU:
+    """A thread-safe LRU mapping whose entries each carry an absolute expiry (`time.time()` seconds)."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()
+        # Invalidation stamps from one increasing clock, for the `maxsize` most recently invalidated keys;
+        # a key without one reads `_generation_floor`, the newest stamp ever dropped, so reads never go backwards
+        self._generations: "OrderedDict[Any, int]" = OrderedDict()
+        self._generation_clock = 0
+        self._generation_floor = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self._misses += 1
+            return None
+
+    def generation(self, key) -> int:
+        """
+        Read before loading a value; `put` drops it if `invalidate(key)` ran in
+        between (or, rarely, if another key's stamp was pruned meanwhile).
+        """
+        with self._lock:
+            return self._generations.get(key, self._generation_floor)
+
+    def put(self, key, value, expires_at: float, generation: int = None):
+        with self._lock:
+            if generation is not None and generation != self._generations.get(key, self._generation_floor):
+                # Invalidated while the value was being loaded; it may already be stale
+                return
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generation_clock += 1
+            self._generations[key] = self._generation_clock
+            self._generations.move_to_end(key)
+            while len(self._generations) > self.maxsize:
+                _, pruned = self._generations.popitem(last=False)
+                self._generation_floor = max(self._generation_floor, pruned)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else None,
+        }
+
+
+claims = ExpiringLRU(AUTH_CLAIMS_CACHE_SIZE)
+users = ExpiringLRU(AUTH_USER_CACHE_SIZE)
+
+
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+def verify_token(token: str) -> Optional[dict]:
+    """`verify_jwt_token`, answered from the claims cache while the token is unexpired."""
+    key = token_digest(token)
+    cached = claims.get(key)
+    if cached is not None:
+        # A copy, so callers cannot change what later requests see
+        return dict(cached)
+    payload = verify_jwt_token(token)
+    if payload and isinstance(payload.get("exp"), (int, float)):
+        claims.put(key, dict(payload), payload["exp"])
+    return payload
+
+
+metrics.register("auth_cache", lambda: { "claims": claims.stats(), "users": users.stats() })
@@ -0,0 +1,88 @@
+"""
+Versioned read-through cache for serialized catalog responses.
+
+The library catalogs (`library`, `library_master`) are read on every mobile
+screen but change a few times a month. Responses are cached as the final
+JSON bytes together with a strong ETag, keyed by `(name, catalog version)`.
+Every catalog write bumps the version, which makes all existing entries
+unreachable, so no explicit invalidation bookkeeping is needed.
+
+The version lives in this process only; other workers notice a write once
+their entries reach CATALOG_CACHE_TTL seconds.
+"""
+import hashlib
+import os
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+from utils import metrics
+
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "300"))
+
+
+class CatalogCache:
+    def __init__(self, ttl: float = CATALOG_CACHE_TTL):
+        self.ttl = ttl
+        self._version = 1
+        self._entries: Dict[Tuple[str, int], Tuple[bytes, str, float]] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def bump(self):
+        """Invalidate everything cached so far; call after any catalog write."""
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def get(self, name: str, build: Callable[[], bytes]) -> Tuple[bytes, str]:
+        """
+        Return `(body, etag)` for `name`, calling `build()` on a miss.
+
+        The version is read before building so a write that lands mid-build
+        leaves the result under the old, already unreachable version.
+        """
+        version = self._version
+        key = (name, version)
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[2] < self.ttl:
+            with self._lock:
+                self._hits += 1
+            return entry[0], entry[1]
+
+        body = build()
+        etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+        with self._lock:
+            self._misses += 1
+            if version == self._version:
+                self._entries[key] = (body, etag, time.monotonic())
+        return body, etag
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._misses
+        return {
+            "version": self._version,
+            "entries": len(self._entries),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else None,
+        }
+
+
+catalog_cache = CatalogCache()
+metrics.register("catalog_cache", catalog_cache.stats)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """`If-None-Match` check (weak comparison, as RFC 9110 requires for this header)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in tags or "W/" + etag in tags
@@ -0,0 +1,210 @@
+"""
+In-memory typeahead index over `library_master` names and variants.
+
+Dropdowns (sites, vendors, materials) search as the user types, so the
+index is built for prefix-tolerant fuzzy matching:
+
+- Every active row's `name` + `variant` is normalized (lowercase, accents
+  and punctuation stripped) and split into words. Each word contributes its
+  padded trigrams, pg_trgm style: "cement" -> "  c", " ce", "cem", ...,
+  "nt ".
+- Each trigram maps to a sorted NumPy array of the row positions containing
+  it (posting list).
+- A query is turned into trigrams the same way, except its last word, which
+  may still be incomplete, gets no trailing pad ("cem" matches "cement").
+  Concatenating the query's posting lists and running one `np.bincount`
+  counts the shared trigrams of every row at once.
+- Rows are scored by the share of query trigrams they contain, with a small
+  bonus for shorter rows. The best CANDIDATES are then re-ranked in Python,
+  with prefix and exact matches first.
+
+A query costs a few posting-list reads and one vectorized count, well under
+a millisecond for tens of thousands of rows. There is no database round
+trip.
+
+Only the very first search builds the index in the request. After a
+catalog write in this process, or every CATALOG_CACHE_TTL (writes in other
+workers), searches start a background check and keep answering from the
+current index. The check compares a cheap database fingerprint of the
+searchable rows (count and a hash sum) and rebuilds only if it changed; the
+new index then replaces the old one in a single assignment.
+"""
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from sql_app.database import SessionLocal
+from sql_app.library import models
+from utils import metrics
+from utils.catalog_cache import CATALOG_CACHE_TTL, catalog_cache
+
+# Rows sharing fewer of the query's trigrams than this are not matches
+MIN_COVERAGE = 0.5
+# Weight of "how much of the row the query covers"; prefers "Cement" over "Cement Bags 50kg Grade 53"
+SPECIFICITY = 0.25
+# Rows re-ranked in Python after the vectorized scoring
+CANDIDATES = 200
+
+_non_word = re.compile(r"[\W_]+")
+
+logger = logging.getLogger("catalog_search")
+
+
+def normalize(text: Optional[str]) -> str:
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return _non_word.sub(" ", text.lower()).strip()
+
+
+def word_trigrams(word: str, prefix: bool = False) -> List[str]:
+    padded = "  " + word + ("" if prefix else " ")
+    return [padded[index:index + 3] for index in range(len(padded) - 2)]
+
+
+class CatalogSearchIndex:
+    def __init__(self, rows: Iterable[dict]):
+        self.rows: List[dict] = []
+        self.texts: List[str] = []
+        postings = defaultdict(list)
+        sizes = []
+        for position, row in enumerate(rows):
+            text = normalize(" ".join(part for part in (row["name"], row.get("variant")) if part))
+            trigrams = {trigram for word in text.split() for trigram in word_trigrams(word)}
+            for trigram in trigrams:
+                postings[trigram].append(position)
+            self.rows.append({ "id": row["id"], "library_id": row["library_id"], "name": row["name"], "variant": row.get("variant") })
+            self.texts.append(text)
+            sizes.append(max(len(trigrams), 1))
+        self.postings = {trigram: np.array(positions, dtype=np.int32) for trigram, positions in postings.items()}
+        self.sizes = np.array(sizes, dtype=np.float64)
+        self.library_ids = np.array([row["library_id"] or 0 for row in self.rows], dtype=np.int64)
+
+    @classmethod
+    def load(cls, db: Session) -> "CatalogSearchIndex":
+        Master = models.LibraryMaster
+        rows = db.execute(
+            select(Master.id, Master.library_id, Master.name, Master.variant)
+            .where(Master.status == "active")
+            .order_by(Master.id)
+        ).mappings().all()
+        return cls(rows)
+
+    @staticmethod
+    def fingerprint(db: Session) -> tuple:
+        """Count and hash sum of the rows `load` reads; changes whenever the index would."""
+        Master = models.LibraryMaster
+        row_hash = func.hashtext(func.concat_ws("|", Master.id, Master.library_id, Master.name, Master.variant))
+        return tuple(db.execute(
+            select(func.count(), func.coalesce(func.sum(row_hash), 0)).where(Master.status == "active")
+        ).one())
+
+    def search(self, q: str, library_id: int = None, limit: int = 20) -> List[dict]:
+        """The best `limit` rows for `q` (optionally within one library), best first, each with its `score`."""
+        query = normalize(q)
+        words = query.split()
+        if not words or not self.rows:
+            return []
+        trigrams = {trigram for word in words[:-1] for trigram in word_trigrams(word)}
+        trigrams.update(word_trigrams(words[-1], prefix=True))
+        lists = [self.postings[trigram] for trigram in trigrams if trigram in self.postings]
+        if not lists:
+            return []
+
+        shared = np.bincount(np.concatenate(lists), minlength=len(self.rows))
+        coverage = shared / len(trigrams)
+        score = coverage + SPECIFICITY * shared / self.sizes
+        score[coverage < MIN_COVERAGE] = 0
+        if library_id is not None:
+            score[self.library_ids != library_id] = 0
+        candidates = np.flatnonzero(score)
+        if candidates.size > CANDIDATES:
+            candidates = candidates[np.argpartition(-score[candidates], CANDIDATES)[:CANDIDATES]]
+
+        ranked = []
+        for position in candidates.tolist():
+            text = self.texts[position]
+            if text == query:
+                bonus = 2.0
+            elif text.startswith(query):
+                bonus = 1.0
+            elif (" " + query) in (" " + text):
+                # The query starts at a later word ("hard" in "XYZ Hardwares")
+                bonus = 0.5
+            else:
+                bonus = 0.0
+            ranked.append((score[position] + bonus, position))
+        ranked.sort(key=lambda item: (-item[0], len(self.texts[item[1]]), self.texts[item[1]]))
+        return [{ **self.rows[position], "score": round(float(value), 4) } for value, position in ranked[:limit]]
+
+
+# (index, catalog version, fingerprint, time.monotonic() of the last check); replaced whole, never mutated
+_current: Optional[tuple] = None
+_index_lock = threading.Lock()
+_refreshing = False
+_stats = { "builds": 0, "build_ms": None, "rows": 0, "checks": 0, "check_failures": 0 }
+
+
+def _build(db: Session, version: int, fingerprint: tuple = None):
+    global _current
+    started = time.perf_counter()
+    fingerprint = fingerprint or CatalogSearchIndex.fingerprint(db)
+    index = CatalogSearchIndex.load(db)
+    _current = (index, version, fingerprint, time.monotonic())
+    _stats.update(builds=_stats["builds"] + 1, build_ms=round((time.perf_counter() - started) * 1000, 1), rows=len(index.rows))
+
+
+def get_index(db: Session) -> CatalogSearchIndex:
+    """The current index; built in the request only the first time, revalidated in the background after that."""
+    current = _current
+    if current is None:
+        with _index_lock:
+            if _current is None:
+                # Read before loading, so a write that lands mid-build triggers a check
+                _build(db, catalog_cache.version)
+            return _current[0]
+    index, version, _, checked_at = current
+    if version != catalog_cache.version or time.monotonic() - checked_at >= CATALOG_CACHE_TTL:
+        refresh_in_background()
+    return index
+
+
+def refresh_in_background():
+    """Start one revalidation thread unless one is already running."""
+    global _refreshing
+    with _index_lock:
+        if _refreshing:
+            return
+        _refreshing = True
+    threading.Thread(target=_refresh, name="catalog-search-refresh", daemon=True).start()
+
+
+def _refresh():
+    global _current, _refreshing
+    try:
+        index, _, fingerprint, _ = _current
+        version = catalog_cache.version
+        _stats["checks"] += 1
+        try:
+            with SessionLocal() as db:
+                latest = CatalogSearchIndex.fingerprint(db)
+                if latest != fingerprint:
+                    _build(db, version, latest)
+                    return
+        except Exception:
+            _stats["check_failures"] += 1
+            logger.exception("Refreshing the catalog search index failed; keeping the current one")
+        # Unchanged (or unreadable): keep the index, check again after the next write or TTL
+        _current = (index, version, fingerprint, time.monotonic())
+    finally:
+        _refreshing = False
+
+
+metrics.register("catalog_search", lambda: dict(_stats))
@@ -0,0 +1,176 @@
+"""
+Batch computation of Credit Master deductions (EMD, guarantees, TDS, ...).
+
+The `library_master` rows of the Credit Master library (CREDIT_LIBRARY_ID,
+default 5) are the rules: `value_type` "%" is a percentage of the bill's
+gross amount, any other non-empty `value` a flat amount per bill. Rules
+without a value ("Net Payment") name the result rather than a deduction.
+Rules in ADDITION_RULES ("GST Return") are paid to the vendor on top of the
+gross instead of being withheld.
+
+`CreditEngine` turns the rules into one rate vector and one flat-amount
+vector, so a batch of N bills is a single (rules x N) NumPy expression
+instead of N * rules Python operations:
+
+    amounts = round_half_up(rates[:, None] * gross) + flat[:, None]
+    net     = gross + signs @ amounts          (signs: -1 deduction, +1 addition)
+
+The arithmetic is in integer paise (rates in millionths), so each amount is
+rounded half up to the paisa exactly, with no binary floating-point ties,
+and the net always equals the gross less the listed deductions (plus
+additions).
+
+The engine is loaded once and reused until the catalog version changes
+(any library/library_master write in this process) or CATALOG_CACHE_TTL
+passes, like the catalog responses.
+"""
+import datetime
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from sql_app.library import crud, models
+from utils.catalog_cache import CATALOG_CACHE_TTL, catalog_cache
+
+CREDIT_LIBRARY_ID = int(os.getenv("CREDIT_LIBRARY_ID", "5"))
+ADDITION_RULES = {"GST Return"}
+
+
+class CreditEngine:
+    def __init__(self, rules: Iterable[dict]):
+        self.rules: List[dict] = []
+        # Percentages as parts per million of the gross, flat amounts in paise
+        rates, flat, signs = [], [], []
+        for rule in rules:
+            value = _number(rule.get("value"))
+            if value is None:
+                continue
+            percent = (rule.get("value_type") or "").strip() == "%"
+            self.rules.append({
+                "id": rule.get("id"),
+                "name": rule["name"],
+                "variant": rule.get("variant"),
+                "value": value,
+                "value_type": "%" if percent else "flat",
+                "kind": "addition" if rule["name"] in ADDITION_RULES else "deduction",
+            })
+            rates.append(round(value * 10_000) if percent else 0)
+            flat.append(0 if percent else round(value * 100))
+            signs.append(1 if rule["name"] in ADDITION_RULES else -1)
+        self.names = [rule["name"] for rule in self.rules]
+        self.rates = np.array(rates, dtype=np.int64)
+        self.flat = np.array(flat, dtype=np.int64)
+        self.signs = np.array(signs, dtype=np.int64)
+
+    @classmethod
+    def load(cls, db: Session) -> "CreditEngine":
+        Master = models.LibraryMaster
+        rows = db.execute(
+            select(Master.id, Master.name, Master.variant, Master.value, Master.value_type)
+            .where(Master.library_id == CREDIT_LIBRARY_ID, Master.status == "active")
+            .order_by(Master.id)
+        ).mappings().all()
+        return cls(rows)
+
+    def compute(self, gross) -> Dict[str, np.ndarray]:
+        """
+        Deductions and net payment for every bill in `gross` (array-like of
+        gross amounts). Returns 1-D float64 arrays: `gross`, one per rule name,
+        and `net`.
+        """
+        paise = np.rint(np.asarray(gross, dtype=np.float64) * 100).astype(np.int64)
+        # One contiguous row per rule, so each column serializes without a copy
+        amounts = np.sign(paise) * ((self.rates[:, None] * np.abs(paise) + 500_000) // 1_000_000) + self.flat[:, None]
+        net = paise + self.signs @ amounts
+        return {
+            "gross": paise / 100,
+            **{name: amounts[index] / 100 for index, name in enumerate(self.names)},
+            "net": net / 100,
+        }
+
+
+def _number(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+_engine: Optional[CreditEngine] = None
+_engine_key = None
+_engine_lock = threading.Lock()
+
+
+def get_engine(db: Session) -> CreditEngine:
+    """The engine for the current Credit Master rules, loaded once per catalog version."""
+    global _engine, _engine_key
+    version, loaded_at = _engine_key or (None, 0.0)
+    if _engine is not None and version == catalog_cache.version and time.monotonic() - loaded_at < CATALOG_CACHE_TTL:
+        return _engine
+    with _engine_lock:
+        # Read before loading, so a write that lands mid-load forces another reload
+        version = catalog_cache.version
+        _engine = CreditEngine.load(db)
+        _engine_key = (version, time.monotonic())
+        return _engine
+
+
+def bills_from_payload(payload) -> np.ndarray:
+    """
+    Gross amounts from a columnar request body: `{"gross": [...]}` or
+    `{"quantity": [...], "price": [...]}`. Raises ValueError on anything else.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("Body must be a JSON object")
+    try:
+        if "gross" in payload:
+            gross = np.asarray(payload["gross"], dtype=np.float64)
+        else:
+            quantity = np.asarray(payload["quantity"], dtype=np.float64)
+            price = np.asarray(payload["price"], dtype=np.float64)
+            if quantity.shape != price.shape:
+                raise ValueError("`quantity` and `price` must have the same length")
+            gross = quantity * price
+    except KeyError:
+        raise ValueError("Body needs `gross`, or `quantity` and `price`")
+    except TypeError:
+        raise ValueError("Amounts must be numbers")
+    if gross.ndim != 1:
+        raise ValueError("Amounts must be flat arrays")
+    if not np.isfinite(gross).all():
+        raise ValueError("Amounts must be finite numbers")
+    return gross
+
+
+def totals(result: Dict[str, np.ndarray]) -> Dict[str, float]:
+    return {name: round(float(column.sum()), 2) for name, column in result.items()}
+
+
+def compute_ledger(db: Session, site_id: int, vendor_id: int = None, date_from: datetime.datetime = None,
+                   date_to: datetime.datetime = None) -> dict:
+    """
+    Deductions for a site's ledger entries (the current revision of each,
+    optionally for one vendor and `[date_from, date_to)`), each entry's
+    quantity * price being one bill. Credit Master entries themselves are not
+    bills and are skipped.
+
+    Reads only `id` and the amount, straight into arrays. Meant for Celery
+    jobs and reports; returns the per-rule totals and the bill count.
+    """
+    Data = models.LibraryMasterData
+    stmt = (
+        select(Data.id, crud.ledger_amount())
+        .where(*crud.library_master_data_filters(site_id=site_id, date_from=date_from, date_to=date_to, latest=True))
+        .where(Data.library_id != CREDIT_LIBRARY_ID)
+        .order_by(Data.id)
+    )
+    if vendor_id:
+        stmt = stmt.where(Data.vendor_id == vendor_id)
+    rows = db.execute(stmt).all()
+    gross = np.fromiter((amount for _, amount in rows), dtype=np.float64, count=len(rows))
+    return { "bills": len(rows), "totals": totals(get_engine(db).compute(gross)) }
@@ -0,0 +1,186 @@
+"""
+Local verification of Google Sign-In ID tokens.
+
+An ID token is a JWT signed (RS256) by one of Google's rotating keys,
+published as a JSON Web Key Set at GOOGLE_JWKS_URL. Instead of asking the
+`tokeninfo` endpoint about every login, the key set is fetched once and
+kept in process:
+
+- Google's `Cache-Control: max-age` (less `Age`) decides when the keys
+  expire. Within JWKS_REFRESH_MARGIN seconds of that, the next login starts
+  a background refresh and carries on with the current keys.
+- Only an expired key set, or a token signed with a key id the set does not
+  know yet (a rotation), waits for a fetch. Unknown key ids refetch at most
+  once per JWKS_MIN_REFETCH_INTERVAL seconds, so forged `kid`s cannot make
+  every request call Google.
+- When a refresh fails, the previous keys stay in use and the refresh is
+  retried after JWKS_MIN_REFETCH_INTERVAL.
+
+The token's signature, `exp`/`iat`, audience (one of GOOGLE_CLIENT_IDS, the
+app's OAuth client ids) and issuer are checked locally. A login costs no
+network round trip once the keys are cached.
+"""
+import email.utils
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+import jwt
+
+from utils import metrics
+from utils.http_client import get_client
+
+logger = logging.getLogger("google_auth")
+
+GOOGLE_JWKS_URL = os.getenv("GOOGLE_JWKS_URL", "https://www.googleapis.com/oauth2/v3/certs")
+# Comma-separated OAuth client ids (web, Android, iOS) tokens may be issued for
+GOOGLE_CLIENT_IDS = [client_id.strip() for client_id in os.getenv("GOOGLE_CLIENT_IDS", "").split(",") if client_id.strip()]
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+JWKS_FETCH_TIMEOUT = float(os.getenv("GOOGLE_JWKS_TIMEOUT", "5"))
+JWKS_DEFAULT_MAX_AGE = 3600
+JWKS_REFRESH_MARGIN = 300
+JWKS_MIN_REFETCH_INTERVAL = 30
+# Clock skew tolerated on `exp`/`iat`, in seconds
+TOKEN_LEEWAY = 60
+
+_max_age = re.compile(r"max-age=(\d+)")
+
+
+class InvalidGoogleToken(Exception):
+    """The token is malformed, expired, not signed by Google or not meant for this app."""
+
+
+class GoogleKeysUnavailable(Exception):
+    """Google's keys could not be fetched and none are cached."""
+
+
+class GoogleKeySet:
+    def __init__(self, url: str = GOOGLE_JWKS_URL, timeout: float = JWKS_FETCH_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        self._expires_at = 0.0
+        self._last_attempt = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._stats = { "fetches": 0, "failures": 0, "background_refreshes": 0 }
+
+    def get_key(self, kid: str) -> jwt.PyJWK:
+        now = time.monotonic()
+        key = self._keys.get(kid)
+        if key is not None and now < self._expires_at:
+            if now > self._expires_at - JWKS_REFRESH_MARGIN:
+                self.refresh_in_background()
+            return key
+        with self._lock:
+            # Another request may have refreshed while this one waited
+            key = self._keys.get(kid)
+            stale = time.monotonic() >= self._expires_at
+            if key is None or stale:
+                # An unknown kid only forces a fetch when the last one is not too recent
+                if stale or time.monotonic() - self._last_attempt >= JWKS_MIN_REFETCH_INTERVAL:
+                    self._refresh_locked()
+                key = self._keys.get(kid)
+        if key is None:
+            if not self._keys:
+                raise GoogleKeysUnavailable("Google signing keys are unavailable")
+            raise InvalidGoogleToken(f"Unknown signing key {kid!r}")
+        return key
+
+    def refresh(self):
+        with self._lock:
+            self._refresh_locked()
+
+    def refresh_in_background(self):
+        """Start one refresh thread unless one is already running."""
+        with self._lock:
+            if self._refreshing or time.monotonic() - self._last_attempt < JWKS_MIN_REFETCH_INTERVAL:
+                return
+            self._refreshing = True
+        self._stats["background_refreshes"] += 1
+        threading.Thread(target=self._background_refresh, name="google-jwks-refresh", daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        finally:
+            self._refreshing = False
+
+    def _refresh_locked(self):
+        self._last_attempt = time.monotonic()
+        self._stats["fetches"] += 1
+        try:
+            resp = get_client("google").get(self.url, timeout=self.timeout)
+            resp.raise_for_status()
+            keys = {
+                jwk["kid"]: jwt.PyJWK(jwk)
+                for jwk in resp.json()["keys"]
+                if jwk.get("kid") and jwk.get("use", "sig") == "sig"
+            }
+        except Exception as exc:
+            self._stats["failures"] += 1
+            if self._keys:
+                # Keep serving the keys we have; Google overlaps old and new keys for days
+                logger.warning("Refreshing Google keys failed, keeping %d cached keys: %s", len(self._keys), exc)
+                self._expires_at = max(self._expires_at, time.monotonic() + JWKS_MIN_REFETCH_INTERVAL)
+            else:
+                logger.error("Fetching Google keys failed: %s", exc)
+            return
+        self._keys = keys
+        self._expires_at = time.monotonic() + cache_lifetime(resp.headers)
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "keys": len(self._keys),
+            "expires_in": round(self._expires_at - time.monotonic(), 1) if self._keys else None,
+        }
+
+
+def cache_lifetime(headers) -> float:
+    """Seconds the key set may be cached: `Cache-Control: max-age` less `Age`, else `Expires`, else an hour."""
+    match = _max_age.search(headers.get("Cache-Control", ""))
+    if match:
+        return max(int(match.group(1)) - int(headers.get("Age", "0") or 0), 0)
+    if headers.get("Expires"):
+        try:
+            return max(email.utils.parsedate_to_datetime(headers["Expires"]).timestamp() - time.time(), 0)
+        except (TypeError, ValueError):
+            pass
+    return JWKS_DEFAULT_MAX_AGE
+
+
+key_set = GoogleKeySet()
+
+
+def verify_id_token(token: str, audience: Optional[List[str]] = None, keys: GoogleKeySet = None) -> dict:
+    """
+    The claims of a valid Google ID token. Raises InvalidGoogleToken when the
+    token does not verify, GoogleKeysUnavailable when it cannot be checked.
+    """
+    audience = audience or GOOGLE_CLIENT_IDS
+    if not audience:
+        raise InvalidGoogleToken("GOOGLE_CLIENT_IDS is not configured")
+    try:
+        header = jwt.get_unverified_header(token)
+    except jwt.InvalidTokenError as exc:
+        raise InvalidGoogleToken(str(exc))
+    if header.get("alg") != "RS256" or not header.get("kid"):
+        raise InvalidGoogleToken("Not a Google ID token")
+    key = (keys or key_set).get_key(header["kid"])
+    try:
+        claims = jwt.decode(
+            token, key.key, algorithms=["RS256"], audience=audience, leeway=TOKEN_LEEWAY,
+            options={"require": ["exp", "iat", "iss", "aud", "sub"]},
+        )
+    except jwt.InvalidTokenError as exc:
+        raise InvalidGoogleToken(str(exc))
+    if claims["iss"] not in GOOGLE_ISSUERS:
+        raise InvalidGoogleToken("Invalid issuer")
+    return claims
+
+
+metrics.register("google_jwks", lambda: key_set.stats())
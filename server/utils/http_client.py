@@ -0,0 +1,230 @@
+"""
+Shared HTTP clients for third-party providers (FCM, Twilio, Meta, Google,
+Facebook).
+
+Module-level `requests.get/post` open a new TCP + TLS connection for every
+call. Here each provider gets one long-lived `httpx.Client`, fetched with
+`get_client(name)`:
+
+- Connections to each host are pooled and kept alive (HTTP_POOL_SIZE per
+  provider, idle ones closed after HTTP_KEEPALIVE_EXPIRY seconds). With
+  HTTP_HTTP2=True (needs the `h2` package) requests share one HTTP/2
+  connection per host.
+- Every request has a timeout: HTTP_CONNECT_TIMEOUT to connect,
+  HTTP_TIMEOUT for the rest, unless the call passes its own.
+- A circuit breaker per provider opens after HTTP_BREAKER_FAILURES
+  consecutive failures (connection errors, timeouts, 429 and 5xx). While it
+  is open, calls fail at once with CircuitOpenError instead of tying up a
+  worker for a full timeout. After HTTP_BREAKER_RESET seconds one trial
+  request is let through, and it closes the breaker again if it succeeds.
+- Request counts, errors, breaker state and latency percentiles per
+  provider are published under `http_clients` in `GET /api/metrics`.
+
+Clients are created on first use in each process, and again after a fork
+(Celery prefork workers), so pooled connections are never shared between
+processes.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import httpx
+
+from utils import metrics
+
+logger = logging.getLogger("http_client")
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_HTTP2 = os.getenv("HTTP_HTTP2", "False") == "True"
+HTTP_BREAKER_FAILURES = int(os.getenv("HTTP_BREAKER_FAILURES", "5"))
+HTTP_BREAKER_RESET = float(os.getenv("HTTP_BREAKER_RESET", "30"))
+
+
+class CircuitOpenError(Exception):
+    """The provider's circuit breaker is open; the request was not sent."""
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failures: int = HTTP_BREAKER_FAILURES, reset_after: float = HTTP_BREAKER_RESET):
+        self.failures = failures
+        self.reset_after = reset_after
+        self.state = self.CLOSED
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_after:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial:
+                # One trial request at a time decides whether to close again
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._trial = False
+            self.state = self.CLOSED
+
+    def release_trial(self):
+        """End a trial request that neither succeeded nor failed (the call raised before reaching the provider)."""
+        with self._lock:
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            self._trial = False
+            if self.state == self.HALF_OPEN or self._consecutive >= self.failures:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class RequestStats:
+    """Counts and latencies of one provider's requests."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+        self.statuses: Dict[str, int] = {}
+
+    def record(self, elapsed: float, status: Optional[int] = None, error: bool = False):
+        with self._lock:
+            self.requests += 1
+            self.errors += error
+            key = f"{status // 100}xx" if status else "transport_error"
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+            self._recent.append(elapsed)
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = sorted(self._recent)
+            counts = { "requests": self.requests, "errors": self.errors, "rejected": self.rejected, "statuses": dict(self.statuses) }
+        percentile = lambda pct: round(recent[min(len(recent) - 1, int(len(recent) * pct / 100))] * 1000, 1) if recent else None
+        return {
+            **counts,
+            # Over the last `window` requests
+            "latency_ms_p50": percentile(50),
+            "latency_ms_p99": percentile(99),
+            "latency_ms_max": round(recent[-1] * 1000, 1) if recent else None,
+        }
+
+
+class ProviderClient:
+    def __init__(self, name: str, timeout: float = HTTP_TIMEOUT, connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+                 pool_size: int = HTTP_POOL_SIZE, http2: bool = HTTP_HTTP2, breaker: CircuitBreaker = None):
+        self.name = name
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size,
+                                   keepalive_expiry=HTTP_KEEPALIVE_EXPIRY)
+        self.http2 = http2
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = RequestStats()
+        self._client: Optional[httpx.Client] = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    self._client = httpx.Client(timeout=self.timeout, limits=self.limits, http2=self._http2_available())
+                    self._pid = os.getpid()
+        return self._client
+
+    def _http2_available(self) -> bool:
+        if not self.http2:
+            return False
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("HTTP/2 requested for %s but the h2 package is not installed; using HTTP/1.1", self.name)
+            return False
+        return True
+
+    def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Send a request through the provider's pool. Raises CircuitOpenError
+        while the breaker is open and `httpx.HTTPError` on transport errors;
+        HTTP error statuses are returned, as with `requests`.
+        """
+        if not self.breaker.allow():
+            self.stats.reject()
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        started = time.perf_counter()
+        try:
+            resp = self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.stats.record(time.perf_counter() - started, error=True)
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # e.g. httpx.InvalidURL, which is not an HTTPError: the caller's fault, not the
+            # provider's, but a half-open breaker must not keep waiting for this trial
+            self.stats.record(time.perf_counter() - started, error=True)
+            self.breaker.release_trial()
+            raise
+        failed = resp.status_code == 429 or resp.status_code >= 500
+        self.stats.record(time.perf_counter() - started, status=resp.status_code, error=resp.status_code >= 400)
+        if failed:
+            self.breaker.record_failure()
+        else:
+            # 4xx other than 429 are the caller's fault, not a sign the provider is down
+            self.breaker.record_success()
+        return resp
+
+    def get(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+            self._client = None
+
+    def snapshot(self) -> dict:
+        return { **self.stats.snapshot(), "breaker": self.breaker.state, "breaker_opened": self.breaker.opened }
+
+
+_clients: Dict[str, ProviderClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name: str) -> ProviderClient:
+    """The shared client for provider `name` ("fcm", "twilio", ...), created on first use."""
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.setdefault(name, ProviderClient(name))
+    return client
+
+
+metrics.register("http_clients", lambda: {name: client.snapshot() for name, client in list(_clients.items())})
@@ -0,0 +1,294 @@
+"""
+Monthly range partitions of `library_master_data` on `createdon`.
+
+Each calendar month is its own table, `library_master_data_y2025m02` for
+February 2025, and `library_master_data_default` catches rows outside every
+attached month. Queries bounded on `createdon` (the listings' `from`/`to`,
+keyset pages, exports) only touch the months they cover, and vacuum and
+index maintenance work per month instead of on one ever-growing table.
+
+- `ensure_partitions` first gives every month still held by the default
+  partition its own partition (a table built by `create_all` starts with all
+  of its history there), one month per transaction, then creates the
+  partitions from the current month through LEDGER_PARTITION_MONTHS_AHEAD
+  months ahead. Rows that already landed in the default partition for a new
+  month are moved into it. It runs nightly from the `ensure_ledger_partitions`
+  beat task and is safe to repeat.
+- `archive_partitions` writes each month before a cutoff to
+  `<ARCHIVE_ROOT>/<partition>.csv.gz` (gzip CSV with a header row, one
+  `COPY`) while it is still attached, locking only that month against
+  writes. Only then is it detached, recorded in `ledger_partition_archives`
+  and dropped in a short transaction, so the rest of the ledger is never
+  blocked for the length of the copy. `library_cost_rollups` (and the
+  balances built on them) keep the archived months' totals; reconciling
+  stops at the archive horizon.
+
+Command line, from `server/`:
+
+    python -m utils.ledger_partitions list
+    python -m utils.ledger_partitions ensure [--ahead 3] [--since 2023-01]
+    python -m utils.ledger_partitions archive --before 2024-01 [--dir upload/archive/library_master_data]
+
+An archive restores with `\\copy library_master_data FROM PROGRAM 'gunzip -c <file>' WITH (FORMAT csv, HEADER)`;
+the rows go to the default partition unless their month is attached again.
+"""
+import argparse
+import datetime
+import gzip
+import logging
+import os
+import re
+from pathlib import Path
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from config import Paths
+from sql_app.library import models
+
+logger = logging.getLogger("ledger_partitions")
+
+PARENT = "library_master_data"
+DEFAULT_PARTITION = f"{PARENT}_default"
+LEDGER_PARTITION_MONTHS_AHEAD = int(os.getenv("LEDGER_PARTITION_MONTHS_AHEAD", "3"))
+# How long archiving waits for the parent table's lock before giving up on a month
+LEDGER_ARCHIVE_LOCK_TIMEOUT = os.getenv("LEDGER_ARCHIVE_LOCK_TIMEOUT", "5s")
+ARCHIVE_ROOT = Paths.data / "archive" / PARENT
+
+_monthly = re.compile(rf"^{PARENT}_y(\d{{4}})m(\d{{2}})$")
+
+
+def month_start(day: datetime.date) -> datetime.date:
+    return datetime.date(day.year, day.month, 1)
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime.date) -> str:
+    return f"{PARENT}_y{month.year}m{month.month:02d}"
+
+
+def partition_month(name: str) -> Optional[datetime.date]:
+    """The month a partition name stands for, or None for the default partition and foreign names."""
+    match = _monthly.match(name)
+    return datetime.date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def list_partitions(db: Session) -> List[str]:
+    """Names of the partitions attached to `library_master_data`, oldest month first (default last)."""
+    names = db.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:parent)"
+        ),
+        {"parent": PARENT},
+    ).scalars().all()
+    return sorted(names, key=lambda name: (partition_month(name) is None, name))
+
+
+def create_partition(db: Session, month: datetime.date):
+    """
+    Create and attach the partition for `month`, moving any of its rows out of
+    the default partition first (Postgres refuses to attach a range the
+    default partition still holds rows for). Does not commit.
+    """
+    name = partition_name(month)
+    bounds = {"lower": datetime.datetime.combine(month, datetime.time.min),
+              "upper": datetime.datetime.combine(add_months(month, 1), datetime.time.min)}
+    db.execute(text(f"CREATE TABLE IF NOT EXISTS {name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    db.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE createdon >= :lower AND createdon < :upper RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ),
+        bounds,
+    )
+    # Literal bounds: partition bounds cannot be bound parameters
+    db.execute(text(
+        f"ALTER TABLE {PARENT} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{bounds['lower']:%Y-%m-%d}') TO ('{bounds['upper']:%Y-%m-%d}')"
+    ))
+
+
+def default_partition_months(db: Session, since: datetime.date = None) -> List[datetime.date]:
+    """Months with rows in the default partition, from `since` on and after the archive horizon, oldest first."""
+    horizon = db.execute(text("SELECT max(month_to) FROM ledger_partition_archives")).scalar()
+    lower = max(filter(None, [month_start(since) if since else None, horizon]), default=None)
+    months = db.execute(
+        text(
+            f"SELECT DISTINCT date_trunc('month', createdon)::date FROM {DEFAULT_PARTITION} "
+            "WHERE CAST(:lower AS date) IS NULL OR createdon >= :lower ORDER BY 1"
+        ),
+        {"lower": lower},
+    ).scalars().all()
+    return list(months)
+
+
+def split_default_partition(db: Session, since: datetime.date = None) -> List[str]:
+    """
+    Create a partition for every month the default partition holds rows of
+    and move them there, committing after each month. Months up to the
+    archive horizon stay where they are, so an archived month is never
+    partitioned (and archived) a second time. Returns the names created.
+    """
+    created = []
+    for month in default_partition_months(db, since=since):
+        try:
+            create_partition(db, month)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        logger.info("moved %s out of %s", partition_name(month), DEFAULT_PARTITION)
+        created.append(partition_name(month))
+    return created
+
+
+def ensure_partitions(db: Session, ahead: int = LEDGER_PARTITION_MONTHS_AHEAD, today: datetime.date = None, since: datetime.date = None) -> List[str]:
+    """
+    Split the months held by the default partition (from `since`, if given)
+    into their own partitions, then create the missing partitions from this
+    month through `ahead` months ahead. Commits. Returns the names created.
+    """
+    current = month_start(today or datetime.date.today())
+    created = split_default_partition(db, since=since)
+    try:
+        attached = set(list_partitions(db))
+        for offset in range(ahead + 1):
+            month = add_months(current, offset)
+            if partition_name(month) not in attached:
+                create_partition(db, month)
+                created.append(partition_name(month))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return created
+
+
+def _fingerprint(db: Session, name: str):
+    """Row count and a hash sum over the whole rows of a partition, to tell whether it changed after its copy."""
+    return tuple(db.execute(text(f"SELECT count(*), coalesce(sum(hashtext(t::text)::bigint), 0) FROM {name} AS t")).one())
+
+
+def _copy_partition(db: Session, name: str, partial: Path) -> int:
+    """COPY a partition to a gzip CSV and return the row count. Runs in the session's transaction."""
+    cursor = db.connection().connection.cursor()
+    with gzip.open(partial, "wb") as out:
+        cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", out)
+    return cursor.rowcount
+
+
+def _detach_partition(db: Session, name: str):
+    """
+    Detach a partition and commit. `DETACH ... CONCURRENTLY` (Postgres 14+)
+    never blocks the parent, but Postgres refuses it while a default partition
+    exists; otherwise the plain detach, a catalog change, gives up after
+    LEDGER_ARCHIVE_LOCK_TIMEOUT rather than queue every ledger query behind it.
+    """
+    concurrent = (
+        db.execute(text("SELECT current_setting('server_version_num')::int")).scalar() >= 140000
+        and DEFAULT_PARTITION not in list_partitions(db)
+    )
+    db.commit()
+    if concurrent:
+        # Not allowed inside a transaction block
+        with db.get_bind().connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name} CONCURRENTLY"))
+        return
+    try:
+        db.execute(text("SELECT set_config('lock_timeout', :timeout, true)"), {"timeout": LEDGER_ARCHIVE_LOCK_TIMEOUT})
+        db.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def archive_partitions(db: Session, before: datetime.date, directory: Path = ARCHIVE_ROOT) -> List[dict]:
+    """
+    Archive every monthly partition that ends on or before the month of
+    `before`, oldest first. Each month is:
+
+    1. copied to `<directory>/<partition>.csv.gz` while still attached, with
+       only that month locked against writes (reads go on);
+    2. detached (see `_detach_partition`);
+    3. checked against its copy (and copied again, now detached, if a write
+       slipped in between), recorded and dropped in one transaction.
+
+    A failure before the detach leaves the month attached; one after it
+    attaches the month again. Returns one summary per month.
+    """
+    before = month_start(before)
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    archived = []
+    for name in list_partitions(db):
+        month = partition_month(name)
+        if month is None or month >= before:
+            continue
+        path = directory / f"{name}.csv.gz"
+        partial = path.with_name(path.name + ".partial")
+        try:
+            db.execute(text(f"LOCK TABLE {name} IN SHARE MODE"))
+            fingerprint = _fingerprint(db, name)
+            rows = _copy_partition(db, name, partial)
+            db.commit()
+        except Exception:
+            db.rollback()
+            partial.unlink(missing_ok=True)
+            raise
+        _detach_partition(db, name)
+        try:
+            if _fingerprint(db, name) != fingerprint:
+                logger.info("%s changed while it was copied, copying it again", name)
+                rows = _copy_partition(db, name, partial)
+            partial.replace(path)
+            db.add(models.LedgerPartitionArchive(
+                partition=name, month_from=month, month_to=add_months(month, 1), rows=rows, path=str(path)
+            ))
+            db.execute(text(f"DROP TABLE {name}"))
+            db.commit()
+        except Exception:
+            db.rollback()
+            partial.unlink(missing_ok=True)
+            # Back under the parent, taking along any rows of the month written meanwhile
+            create_partition(db, month)
+            db.commit()
+            raise
+        logger.info("archived %s: %d rows to %s", name, rows, path)
+        archived.append({ "partition": name, "rows": rows, "path": str(path) })
+    return archived
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="print the attached partitions")
+    ensure = commands.add_parser("ensure", help="split the months out of the default partition, create this month's and the coming months' partitions")
+    ensure.add_argument("--ahead", type=int, default=LEDGER_PARTITION_MONTHS_AHEAD)
+    ensure.add_argument("--since", type=lambda value: datetime.date.fromisoformat(value + "-01"), help="YYYY-MM, first month split out of the default partition (default: all)")
+    archive = commands.add_parser("archive", help="detach, compress and drop the months before --before")
+    archive.add_argument("--before", required=True, type=lambda value: datetime.date.fromisoformat(value + "-01"), help="YYYY-MM, first month kept")
+    archive.add_argument("--dir", type=Path, default=ARCHIVE_ROOT)
+    args = parser.parse_args()
+
+    from sql_app.database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    with SessionLocal() as db:
+        if args.command == "list":
+            print("\n".join(list_partitions(db)))
+        elif args.command == "ensure":
+            print(ensure_partitions(db, ahead=args.ahead, since=args.since))
+        else:
+            for summary in archive_partitions(db, args.before, directory=args.dir):
+                print(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Columnar (Parquet / Arrow IPC) snapshots of the ledger for analytics.
+
+Snapshots are written per site and per day under `Paths.data`, in a
+hive-style layout that pandas / pyarrow.dataset / DuckDB read directly:
+
+    upload/snapshots/library_master_data/site_id=501/date=2024-04-13/part-0.parquet
+
+`site_id` and `date` come from the directory names (hive partitioning), so
+they are not repeated inside the files.
+
+Names joined from `library_master` (material, variant, site, vendor) repeat
+on nearly every row, so they are written as dictionary-encoded columns.
+
+Exports are incremental. A per-site manifest stores a fingerprint (row count,
+max id, amount total and a hash sum over the whole rows and their joined
+names) for every exported day. Each run re-exports only the days whose
+fingerprint changed, which covers new days, late edits to any column and
+renamed catalog entries, and skips the rest.
+"""
+import datetime
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet as pq
+from sqlalchemy import func, literal_column, select
+from sqlalchemy.orm import Session, aliased
+
+from config import Paths
+from sql_app.library import models
+
+logger = logging.getLogger("ledger_snapshot")
+
+SNAPSHOT_ROOT = Paths.data / "snapshots" / "library_master_data"
+SITE_LIBRARY_ID = int(os.getenv("SITE_LIBRARY_ID", "6"))
+FORMATS = {"parquet": "parquet", "arrow": "arrow"}
+
+DICTIONARY_COLUMNS = ["status", "site_name", "vendor_name", "library_name", "material_name", "material_variant"]
+
+SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("createdon", pa.timestamp("us")),
+    ("quantity", pa.float64()),
+    ("price", pa.float64()),
+    ("amount", pa.float64()),
+    ("version", pa.int32()),
+    ("parent_id", pa.int64()),
+    ("status", pa.dictionary(pa.int32(), pa.string())),
+    ("site_name", pa.dictionary(pa.int32(), pa.string())),
+    ("vendor_id", pa.int64()),
+    ("vendor_name", pa.dictionary(pa.int32(), pa.string())),
+    ("library_id", pa.int64()),
+    ("library_name", pa.dictionary(pa.int32(), pa.string())),
+    ("library_master_id", pa.int64()),
+    ("material_name", pa.dictionary(pa.int32(), pa.string())),
+    ("material_variant", pa.dictionary(pa.int32(), pa.string())),
+])
+
+
+def _catalog_names():
+    """
+    The joined catalog name columns a snapshot carries, and a function that
+    adds their LEFT OUTER JOINs to a statement over `library_master_data`.
+    """
+    Data = models.LibraryMasterData
+    Site = aliased(models.LibraryMaster)
+    Vendor = aliased(models.LibraryMaster)
+    Material = aliased(models.LibraryMaster)
+    names = [
+        Site.name.label("site_name"), Vendor.name.label("vendor_name"), models.Library.name.label("library_name"),
+        Material.name.label("material_name"), Material.variant.label("material_variant"),
+    ]
+
+    def join(stmt):
+        return (
+            stmt.outerjoin(Site, Site.id == Data.site_id)
+            .outerjoin(Vendor, Vendor.id == Data.vendor_id)
+            .outerjoin(Material, Material.id == Data.library_master_id)
+            .outerjoin(models.Library, models.Library.id == Data.library_id)
+        )
+    return names, join
+
+
+def _day_fingerprints(db: Session, site_id: int, since: Optional[datetime.date], until: datetime.date) -> Dict[str, list]:
+    """Per-day `[count, max_id, amount, digest]` for a site's rows in `[since, until)`, from one grouped query."""
+    Data = models.LibraryMasterData
+    day = func.date(Data.createdon)
+    names, join = _catalog_names()
+    # Order-independent sum of each exported row's hash: the whole ledger row and
+    # its joined names, so an edit to any column or a renamed catalog entry changes it
+    row_text = func.concat_ws("|", literal_column(f"{Data.__tablename__}::text"), *(name.element for name in names))
+    digest = func.coalesce(func.sum(func.hashtext(row_text)), 0)
+    stmt = join(
+        select(day, func.count(), func.max(Data.id), func.coalesce(func.sum(Data.quantity * Data.price), 0), digest)
+        .where(Data.site_id == site_id, Data.createdon < datetime.datetime.combine(until, datetime.time.min))
+        .group_by(day)
+    )
+    if since:
+        stmt = stmt.where(Data.createdon >= datetime.datetime.combine(since, datetime.time.min))
+    return {str(d): [count, max_id, round(float(amount), 4), int(digest)] for d, count, max_id, amount, digest in db.execute(stmt)}
+
+
+def _day_rows(db: Session, site_id: int, day: datetime.date):
+    Data = models.LibraryMasterData
+    names, join = _catalog_names()
+    start = datetime.datetime.combine(day, datetime.time.min)
+    stmt = join(
+        select(
+            Data.id, Data.createdon, Data.quantity, Data.price,
+            (Data.quantity * Data.price).label("amount"),
+            Data.version, Data.parent_id, Data.status,
+            Data.vendor_id, Data.library_id, Data.library_master_id,
+            *names,
+        )
+        .where(Data.site_id == site_id, Data.createdon >= start, Data.createdon < start + datetime.timedelta(days=1))
+        .order_by(Data.createdon, Data.id)
+    )
+    return db.execute(stmt).mappings().all()
+
+
+def _to_table(rows) -> pa.Table:
+    columns = {}
+    for field in SCHEMA:
+        values = [row[field.name] for row in rows]
+        if field.name in DICTIONARY_COLUMNS:
+            columns[field.name] = pa.array(values, pa.string()).dictionary_encode()
+        else:
+            columns[field.name] = pa.array(values, field.type)
+    return pa.table(columns, schema=SCHEMA)
+
+
+def _write(table: pa.Table, path: Path, fmt: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    if fmt == "arrow":
+        options = pa.ipc.IpcWriteOptions(compression="zstd")
+        with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+    else:
+        pq.write_table(table, tmp, compression="zstd", use_dictionary=DICTIONARY_COLUMNS)
+    # Readers never see a half-written partition
+    os.replace(tmp, path)
+
+
+def _site_dir(site_id: int) -> Path:
+    return SNAPSHOT_ROOT / f"site_id={site_id}"
+
+
+def _load_manifest(site_id: int) -> dict:
+    path = _site_dir(site_id) / "_manifest.json"
+    if path.exists():
+        return json.loads(path.read_text())
+    return {"days": {}}
+
+
+def _save_manifest(site_id: int, manifest: dict):
+    path = _site_dir(site_id) / "_manifest.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+    os.replace(tmp, path)
+
+
+def export_site(db: Session, site_id: int, since: Optional[datetime.date] = None, until: Optional[datetime.date] = None,
+                fmt: str = "parquet") -> dict:
+    """
+    Bring a site's snapshot up to date for the days in `[since, until)`.
+
+    `since` defaults to the beginning of the ledger and `until` to today, so
+    the current, still-changing day is never exported.
+
+    Returns which days were written, removed and skipped.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported snapshot format: {fmt}")
+    until = until or datetime.date.today()
+    manifest = _load_manifest(site_id)
+    if manifest.get("format", fmt) != fmt:
+        # Switching format rewrites everything once
+        manifest = {"days": {}}
+    exported = manifest["days"]
+    current = _day_fingerprints(db, site_id, since, until)
+
+    written: List[str] = []
+    for day, fingerprint in sorted(current.items()):
+        if exported.get(day) == fingerprint:
+            continue
+        rows = _day_rows(db, site_id, datetime.date.fromisoformat(day))
+        _write(_to_table(rows), _site_dir(site_id) / f"date={day}" / f"part-0.{FORMATS[fmt]}", fmt)
+        exported[day] = fingerprint
+        written.append(day)
+
+    in_range = lambda day: (not since or day >= since.isoformat()) and day < until.isoformat()
+    removed = [day for day in exported if in_range(day) and day not in current]
+    for day in removed:
+        (_site_dir(site_id) / f"date={day}" / f"part-0.{FORMATS[fmt]}").unlink(missing_ok=True)
+        del exported[day]
+
+    manifest.update({"format": fmt, "days": exported})
+    _save_manifest(site_id, manifest)
+    logger.info("Snapshot for site %s: %s days written, %s removed", site_id, len(written), len(removed))
+    return {"site_id": site_id, "written": written, "removed": removed, "unchanged": len(current) - len(written)}
+
+
+def export_all_sites(db: Session, since: Optional[datetime.date] = None, until: Optional[datetime.date] = None,
+                     fmt: str = "parquet") -> List[dict]:
+    """Run `export_site` for every site in the Site Master library."""
+    site_ids = db.execute(
+        select(models.LibraryMaster.id).where(models.LibraryMaster.library_id == SITE_LIBRARY_ID).order_by(models.LibraryMaster.id)
+    ).scalars().all()
+    return [export_site(db, site_id, since=since, until=until, fmt=fmt) for site_id in site_ids]
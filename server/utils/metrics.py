@@ -0,0 +1,35 @@
+"""
+In-process metrics registry.
+
+Modules that keep counters (caches, pools, provider clients) register a
+callable returning a JSON-serialisable dict; `GET /api/metrics` returns a
+snapshot of every registered source. Values are per process.
+"""
+import logging
+import threading
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger("server.metrics")
+
+_sources: Dict[str, Callable[[], Dict[str, Any]]] = {}
+_lock = threading.Lock()
+
+
+def register(name: str, source: Callable[[], Dict[str, Any]]):
+    """Register (or replace) the metrics source published under `name`."""
+    with _lock:
+        _sources[name] = source
+
+
+def snapshot() -> Dict[str, Any]:
+    """Collect the current values of all registered sources."""
+    with _lock:
+        sources = dict(_sources)
+    result = {}
+    for name, source in sources.items():
+        try:
+            result[name] = source()
+        except Exception as exc:
+            logger.exception("Metrics source %s failed", name)
+            result[name] = {"error": str(exc)}
+    return result
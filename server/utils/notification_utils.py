@@ -1,12 +1,14 @@
 import os
 import time
+import heapq
 import logging
-from typing import Optional, Dict, Any, List
-import requests
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional, Dict, Any, List, Callable
 
 from sqlalchemy.orm import Session
 
 from sql_app.notifications import crud as notifications_crud
+from utils.http_client import get_client
 
 logger = logging.getLogger("notification_utils")
 logger.setLevel(logging.INFO)
@@ -16,6 +18,14 @@ NOTIFICATION_PROVIDER = os.getenv("NOTIFICATION_PROVIDER", "mock").lower()
 FCM_SERVER_KEY = os.getenv("FCM_SERVER_KEY")
 DEFAULT_RETRIES = int(os.getenv("NOTIFICATION_RETRIES", "3"))
 DEFAULT_BACKOFF = float(os.getenv("NOTIFICATION_BACKOFF", "0.5"))
+# Device tokens of one notification sent at the same time; keep at or below HTTP_POOL_SIZE
+NOTIFICATION_CONCURRENCY = int(os.getenv("NOTIFICATION_CONCURRENCY", "8"))
+# Tokens per FCM multicast request in a broadcast
+FCM_MULTICAST_SIZE = int(os.getenv("FCM_MULTICAST_SIZE", "500"))
+# Batches handed to the dispatcher at a time (one Celery group) while the token query streams
+BROADCAST_DISPATCH_GROUP = int(os.getenv("BROADCAST_DISPATCH_GROUP", "20"))
+# FCM errors after which a token will never be delivered to again
+FCM_DEAD_TOKEN_ERRORS = {"NotRegistered", "InvalidRegistration"}
 
 
 def _send_via_fcm(token: str, title: str, body: str, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
@@ -32,7 +42,26 @@ def _send_via_fcm(token: str, title: str, body: str, data: Optional[Dict[str, An
         "notification": {"title": title, "body": body},
         "data": data or {},
     }
-    resp = requests.post(url, json=payload, headers=headers, timeout=10)
+    resp = get_client("fcm").post(url, json=payload, headers=headers)
+    resp.raise_for_status()
+    return resp.json()
+
+
+def _send_multicast_via_fcm(tokens: List[str], title: str, body: str, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    if not FCM_SERVER_KEY:
+        raise RuntimeError("FCM_SERVER_KEY not configured")
+
+    url = "https://fcm.googleapis.com/fcm/send"
+    headers = {
+        "Authorization": f"key={FCM_SERVER_KEY}",
+        "Content-Type": "application/json",
+    }
+    payload = {
+        "registration_ids": tokens,
+        "notification": {"title": title, "body": body},
+        "data": data or {},
+    }
+    resp = get_client("fcm").post(url, json=payload, headers=headers)
     resp.raise_for_status()
     return resp.json()
 
@@ -42,10 +71,70 @@ def _send_mock(token: str, title: str, body: str, data: Optional[Dict[str, Any]]
     return {"success": True, "message_id": f"mock-{int(time.time()*1000)}"}
 
 
+def _send(token: str, title: str, body: str, data: Optional[Dict[str, Any]] = None):
+    """One attempt at one device token with the configured provider. Returns (message_id, raw response)."""
+    if NOTIFICATION_PROVIDER == "fcm":
+        resp = _send_via_fcm(token, title, body, data)
+        # FCM legacy returns 'message_id' or 'success'
+        return resp.get("message_id") or resp.get("results", [{}])[0].get("message_id"), resp
+    resp = _send_mock(token, title, body, data)
+    return resp.get("message_id"), resp
+
+
+def send_to_tokens(
+    tokens: List[str],
+    title: str,
+    body: str,
+    data: Optional[Dict[str, Any]] = None,
+    send: Callable = None,
+    retries: int = DEFAULT_RETRIES,
+    backoff: float = DEFAULT_BACKOFF,
+    concurrency: int = NOTIFICATION_CONCURRENCY,
+) -> List[Dict[str, Any]]:
+    """Send to every token concurrently, up to `concurrency` at a time, with `retries` attempts each.
+
+    A failed attempt is queued again `backoff * attempt` seconds later in a heap
+    ordered by due time; nothing sleeps, so the other tokens keep going while
+    one waits for its retry. `send` defaults to the configured provider.
+    Returns one result per token, in the order of `tokens`.
+    """
+    send = send or _send
+    results: Dict[int, Dict[str, Any]] = {}
+    # (due, attempt, index) of attempts waiting to start; all first attempts are due now
+    pending = [(0.0, 1, index) for index in range(len(tokens))]
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(tokens))), thread_name_prefix="notify") as pool:
+        while pending or in_flight:
+            now = time.monotonic()
+            while pending and pending[0][0] <= now and len(in_flight) < concurrency:
+                _, attempt, index = heapq.heappop(pending)
+                in_flight[pool.submit(send, tokens[index], title, body, data)] = (attempt, index)
+            # Wake for the first finished send, or when the next retry is due if a slot is free
+            timeout = None
+            if pending and len(in_flight) < concurrency:
+                timeout = max(pending[0][0] - now, 0)
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                attempt, index = in_flight.pop(future)
+                token = tokens[index]
+                try:
+                    message_id, resp = future.result()
+                except Exception as exc:
+                    logger.exception("Error sending notification to %s (attempt %s): %s", token, attempt, exc)
+                    if attempt < retries:
+                        heapq.heappush(pending, (time.monotonic() + backoff * attempt, attempt + 1, index))
+                    else:
+                        results[index] = {"token": token, "success": False, "error": str(exc)}
+                    continue
+                results[index] = {"token": token, "success": True, "message_id": message_id, "raw": resp}
+    return [results[index] for index in range(len(tokens))]
+
+
 def sendMobileNotification(db: Optional[Session], userId: int, title: str, body: str, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """Send push notification to all device tokens for a user.
 
-    If db is provided, logs will be stored in notifications table and device tokens looked up from DB.
+    Tokens are sent concurrently (see send_to_tokens). If db is provided, logs
+    will be stored in notifications table and device tokens looked up from DB.
     Returns a summary dict.
     """
     tokens: List[str] = []
@@ -56,44 +145,70 @@ def sendMobileNotification(db: Optional[Session], userId: int, title: str, body:
         logger.info("No device tokens for user %s", userId)
         return {"success": False, "error": "no_device_tokens"}
 
-    results = []
-    last_exc = None
-    for token in tokens:
-        for attempt in range(1, DEFAULT_RETRIES + 1):
+    results = send_to_tokens(tokens, title, body, data)
+
+    # store notification logs; the session is only used from this thread
+    if db is not None:
+        for result in results:
             try:
-                if NOTIFICATION_PROVIDER == "fcm":
-                    resp = _send_via_fcm(token, title, body, data)
-                    # FCM legacy returns 'message_id' or 'success'
-                    message_id = resp.get("message_id") or resp.get("results", [{}])[0].get("message_id")
-                    status = "sent"
+                if result["success"]:
+                    notifications_crud.create_notification(db, user_id=userId, title=title, message=body, status="sent", notification_id=result["message_id"])
                 else:
-                    resp = _send_mock(token, title, body, data)
-                    message_id = resp.get("message_id")
-                    status = "sent"
-
-                # store notification log
-                if db is not None:
-                    notifications_crud.create_notification(db, user_id=userId, title=title, message=body, status=status, notification_id=message_id)
-
-                results.append({"token": token, "success": True, "message_id": message_id, "raw": resp})
-                break
-            except Exception as exc:
-                logger.exception("Error sending notification to %s (attempt %s): %s", token, attempt, exc)
-                last_exc = exc
-                time.sleep(DEFAULT_BACKOFF * attempt)
-        else:
-            # all attempts failed for this token
-            if db is not None:
-                try:
                     notifications_crud.create_notification(db, user_id=userId, title=title, message=body, status="failed", notification_id=None)
-                except Exception:
-                    logger.exception("Failed to log failed notification")
-            results.append({"token": token, "success": False, "error": str(last_exc)})
+            except Exception:
+                logger.exception("Failed to log notification")
 
     overall_success = all(r.get("success") for r in results)
     return {"success": overall_success, "results": results}
 
 
+def send_multicast(tokens: List[str], title: str, body: str, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """One provider request for up to FCM_MULTICAST_SIZE tokens. Returns sent/failed counts and the dead tokens."""
+    if NOTIFICATION_PROVIDER == "fcm":
+        resp = _send_multicast_via_fcm(tokens, title, body, data)
+        # FCM legacy returns one result per token, in the order sent
+        dead_tokens = [token for token, result in zip(tokens, resp.get("results") or []) if result.get("error") in FCM_DEAD_TOKEN_ERRORS]
+        return {"sent": resp.get("success", 0), "failed": resp.get("failure", 0), "dead_tokens": dead_tokens}
+    logger.info("[MOCK] Sending notification to %d tokens: %s - %s", len(tokens), title, body)
+    return {"sent": len(tokens), "failed": 0, "dead_tokens": []}
+
+
+def plan_broadcast(db: Session, broadcast, dispatch: Callable[[List[List[str]]], None], group_size: int = BROADCAST_DISPATCH_GROUP) -> int:
+    """Stream a broadcast's tokens from one query and dispatch them in multicast batches as they arrive.
+
+    Batches of FCM_MULTICAST_SIZE tokens are handed to `dispatch` `group_size`
+    at a time, so memory stays bounded however many users match. The totals
+    are recorded after the last dispatch; a failure marks the broadcast failed.
+    Returns the number of batches.
+    """
+    tokens = batches = 0
+    pending: List[List[str]] = []
+    try:
+        for batch in notifications_crud.iter_broadcast_token_batches(db, broadcast.filters, FCM_MULTICAST_SIZE):
+            pending.append(batch)
+            tokens += len(batch)
+            batches += 1
+            if len(pending) >= group_size:
+                dispatch(pending)
+                pending = []
+        if pending:
+            dispatch(pending)
+    except Exception as exc:
+        db.rollback()
+        notifications_crud.fail_broadcast(db, broadcast.id, str(exc))
+        raise
+    # Ends the streaming query's transaction too
+    notifications_crud.finish_dispatch(db, broadcast.id, tokens=tokens, batches=batches)
+    return batches
+
+
+def record_broadcast_batch(db: Session, broadcast_id: int, result: Dict[str, Any]):
+    """Add a batch's counts to its broadcast and forget the tokens FCM no longer knows."""
+    notifications_crud.record_broadcast_batch(db, broadcast_id, sent=result["sent"], failed=result["failed"])
+    if result.get("dead_tokens"):
+        notifications_crud.delete_device_tokens(db, result["dead_tokens"])
+
+
 def notifyAppEvent(db: Optional[Session], userId: int, eventType: str, data: dict) -> Dict[str, Any]:
     """Map application events to notification text and call sendMobileNotification.
 
@@ -0,0 +1,44 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Cursors are opaque, URL-safe tokens built from the `(createdon, id)` of the
+last row on a page. The next page is then fetched with a row-value comparison
+on the same columns, so every page costs the same index range scan no matter
+how deep the client has paged.
+"""
+import base64
+import datetime
+import json
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+
+
+def encode_cursor(createdon: datetime.datetime, id: int) -> str:
+    """Encode the sort key of the last row on a page as an opaque token."""
+    if isinstance(createdon, datetime.datetime):
+        createdon = createdon.isoformat()
+    raw = json.dumps([createdon, id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[datetime.datetime, int]:
+    """Decode a token produced by `encode_cursor`. Raises 400 on garbage input."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        createdon, id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.datetime.fromisoformat(createdon), int(id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def date_range_bounds(date_from: Optional[datetime.date], date_to: Optional[datetime.date]):
+    """
+    Turn inclusive `from`/`to` dates into `[start, end)` datetime bounds.
+
+    `to` is inclusive of the whole day, so the upper bound is midnight of the
+    following day.
+    """
+    start = datetime.datetime.combine(date_from, datetime.time.min) if date_from else None
+    end = datetime.datetime.combine(date_to + datetime.timedelta(days=1), datetime.time.min) if date_to else None
+    return start, end
@@ -0,0 +1,94 @@
+"""
+Fast JSON responses for lists of ORM rows.
+
+`JSONResponse({"result": jsonable_encoder(rows)})` walks every row's
+`__dict__` recursively in pure Python (including the JSON `info` blobs),
+then `json.dumps` walks the result again. Here each model's column keys are
+resolved once, rows become plain dicts through one `attrgetter` call, and
+orjson encodes the whole payload natively in a single pass. The output is
+the same JSON document (same keys and values) as before.
+
+See benchmarks/bench_serialization.py for the comparison.
+"""
+from functools import lru_cache
+from operator import attrgetter
+from typing import Any, Callable, Iterable, List, Optional
+
+import orjson
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from sqlalchemy import inspect
+
+from sql_app.database import Base
+
+
+@lru_cache(maxsize=None)
+def _columns(model) -> tuple:
+    keys = tuple(attr.key for attr in inspect(model).column_attrs)
+    getter = attrgetter(*keys)
+    # attrgetter with a single key returns the bare value rather than a tuple
+    return keys, (lambda obj: (getter(obj),)) if len(keys) == 1 else getter
+
+
+def row_to_dict(row) -> dict:
+    keys, getter = _columns(type(row))
+    return dict(zip(keys, getter(row)))
+
+
+def to_jsonable(value: Any) -> Any:
+    """ORM rows (and lists of them) to column dicts; Core rows to mappings; anything else through `jsonable_encoder`."""
+    if isinstance(value, list):
+        if value and isinstance(value[0], Base):
+            keys, getter = _columns(type(value[0]))
+            return [dict(zip(keys, getter(row))) for row in value]
+        if value and hasattr(value[0], "_mapping"):
+            return [dict(row._mapping) for row in value]
+        return [to_jsonable(item) for item in value]
+    if isinstance(value, Base):
+        return row_to_dict(value)
+    if hasattr(value, "_mapping"):
+        return dict(value._mapping)
+    if isinstance(value, (dict, str, int, float, bool)) or value is None:
+        return value
+    return jsonable_encoder(value)
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str], what: str = "fields") -> Optional[List[str]]:
+    """
+    Parse a sparse fieldset (`fields=quantity,price,createdon`) into column names.
+
+    Returns None when no fields were requested. Raises 400 on names outside `allowed`.
+    """
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown {what}: {', '.join(unknown)}. Allowed: {', '.join(allowed)}")
+    return names or None
+
+
+def expand_rows(rows: list, relations: Iterable[str], summarize: Callable[[Any], dict]) -> List[dict]:
+    """Column dicts of ORM `rows`, each with `summarize(related)` (or None) inlined under every name in `relations`."""
+    if not rows:
+        return []
+    keys, getter = _columns(type(rows[0]))
+    result = []
+    for row in rows:
+        item = dict(zip(keys, getter(row)))
+        for name in relations:
+            related = getattr(row, name)
+            item[name] = summarize(related) if related is not None else None
+        result.append(item)
+    return result
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def result_response(result: Any, status_code: int = 200, headers: dict = None, **extra) -> Response:
+    """`{"result": result, **extra}` as an application/json response, encoded with orjson."""
+    return Response(content=dumps({ "result": to_jsonable(result), **extra }), status_code=status_code,
+                    media_type="application/json", headers=headers)
@@ -2,11 +2,11 @@ import os
 import time
 import logging
 from typing import Optional, Dict, Any
-import requests
 
 from sqlalchemy.orm import Session
 
 from sql_app.whatsapp import crud as whatsapp_crud
+from utils.http_client import get_client
 
 logger = logging.getLogger("whatsapp_utils")
 logger.setLevel(logging.INFO)
@@ -36,7 +36,7 @@ def _send_via_twilio(to: str, message: str, media_url: Optional[str] = None) ->
     if media_url:
         data["MediaUrl"] = media_url
 
-    resp = requests.post(url, data=data, auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN), timeout=10)
+    resp = get_client("twilio").post(url, data=data, auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN))
     resp.raise_for_status()
     return resp.json()
 
@@ -71,7 +71,7 @@ def _send_via_meta(to: str, message: str, template_id: Optional[str] = None, med
                 "document": {"link": media_url, "caption": message},
             }
 
-    resp = requests.post(url, json=payload, headers=headers, timeout=10)
+    resp = get_client("meta").post(url, json=payload, headers=headers)
     resp.raise_for_status()
     return resp.json()
 